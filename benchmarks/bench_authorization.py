@@ -0,0 +1,107 @@
+"""
+Сравнение прежней проверки доступа к файлу (abspath + startswith по каждой
+папке каждой группы, проверка скрытых папок перебором) с предкомпилированным
+main.authorization.PathAuthorizer на наборе синтетических путей.
+
+Запуск: python benchmarks/bench_authorization.py [--paths 20000] [--groups 8] [--folders 20] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main.authorization import VIEW, PathAuthorizer  # noqa: E402
+from main.config import ConfigSnapshot  # noqa: E402
+from main.hidden_folders import HiddenFolders  # noqa: E402
+
+
+def legacy_check_file_access(file_path, files_root, snapshot, hidden, current_user):
+    """Копия прежней проверки из file_view: первая группа пользователя, затем скрытые папки."""
+    abs_file_path = os.path.abspath(file_path)
+    if not abs_file_path.startswith(files_root):
+        return False
+    if current_user == snapshot.superadmin:
+        return True
+    groups = snapshot.groups_for(current_user)
+    if not groups:
+        return False
+    allowed_folders = snapshot.folders_for(groups[0])
+    if allowed_folders:
+        for folder in allowed_folders:
+            allowed_path = os.path.abspath(os.path.join(files_root, folder))
+            if abs_file_path.startswith(allowed_path):
+                break
+        else:
+            return False
+    rel_path = os.path.relpath(abs_file_path, files_root)
+    for hidden_path in hidden:
+        if rel_path == hidden_path or rel_path.startswith(hidden_path + os.sep):
+            return False
+    return True
+
+
+def make_snapshot(groups, folders_per_group):
+    # Имена папок одной длины: прежний startswith без разделителя путал бы folder1 и folder10
+    group_folders = {
+        f"group{g}": [f"area{g}/folder{n:03d}" for n in range(folders_per_group)] for g in range(groups)
+    }
+    user_groups = {"user": [f"group{g}" for g in range(groups)]}
+    return ConfigSnapshot({}, {"user": 3}, (), (), "admin", user_groups, group_folders)
+
+
+def make_paths(files_root, count, groups, folders_per_group):
+    rnd = random.Random(1)
+    paths = []
+    for _ in range(count):
+        g = rnd.randrange(groups)
+        n = rnd.randrange(folders_per_group * 2)
+        depth = rnd.randrange(1, 5)
+        parts = [f"area{g}", f"folder{n:03d}"] + [f"sub{rnd.randrange(10)}" for _ in range(depth)]
+        paths.append(os.path.join(files_root, *parts, "file.txt"))
+    return paths
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paths", type=int, default=20000)
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--folders", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    files_root = os.path.abspath(os.path.join(os.sep, "srv", "KOD OS 1.5"))
+    snapshot = make_snapshot(args.groups, args.folders)
+    # Прежняя проверка учитывала только первую группу — для честного сравнения оставляем одну
+    single = make_snapshot(1, args.folders)
+    hidden = frozenset(f"area0/folder{n:03d}/sub1" for n in range(args.folders))
+    paths = make_paths(files_root, args.paths, 1, args.folders)
+
+    print(f"{args.paths} путей, {args.folders} папок в группе, {len(hidden)} скрытых папок")
+    legacy_time, legacy = best_of(
+        args.repeat, lambda: [legacy_check_file_access(p, files_root, single, hidden, "user") for p in paths])
+    authorizer = PathAuthorizer(files_root, single, HiddenFolders(hidden))
+    new_time, new = best_of(args.repeat, lambda: [authorizer.may("user", VIEW, p) for p in paths])
+    assert legacy == new, "результаты проверок различаются"
+    print(f"legacy check:          {legacy_time * 1000:9.1f} ms")
+    print(f"PathAuthorizer.may:    {new_time * 1000:9.1f} ms  (x{legacy_time / new_time:.1f})")
+
+    paths = make_paths(files_root, args.paths, args.groups, args.folders)
+    authorizer = PathAuthorizer(files_root, snapshot, HiddenFolders(hidden))
+    many_time, _ = best_of(args.repeat, lambda: [authorizer.may("user", VIEW, p) for p in paths])
+    print(f"{args.groups} групп, PathAuthorizer.may: {many_time * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Сравнение прежнего build_file_tree (os.listdir + двойной os.path.isdir,
+перечитывание hidden_folders.json и config.ini на каждом уровне) с новым
+движком main.file_tree.scan_tree на синтетическом дереве.
+
+Запуск: python benchmarks/bench_file_tree.py [--dirs 2000] [--files 10] [--repeat 5]
+"""
+import argparse
+import configparser
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main.file_tree import scan_tree  # noqa: E402
+
+
+def legacy_build_file_tree(path, files_root, hidden_file, config_path, current_user=None):
+    """Копия прежней реализации build_file_tree из main/views.py."""
+    try:
+        with open(hidden_file, "r", encoding="utf-8") as f:
+            hidden = set(json.load(f))
+    except Exception:
+        hidden = set()
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    superadmin = None
+    if config.has_section("folder_visibility") and config.has_option("folder_visibility", "superadmin"):
+        superadmin = config.get("folder_visibility", "superadmin").strip()
+    tree = []
+    try:
+        items = os.listdir(path)
+        items.sort(key=lambda x: (0 if os.path.isdir(os.path.join(path, x)) else 1, x.lower()))
+        for item in items:
+            full_path = os.path.join(path, item)
+            if os.path.isdir(full_path):
+                rel_path = os.path.relpath(full_path, files_root)
+                if current_user != superadmin and rel_path in hidden:
+                    continue
+                node = {
+                    "name": item,
+                    "type": "dir",
+                    "full_path": full_path,
+                    "children": legacy_build_file_tree(full_path, files_root, hidden_file, config_path, current_user),
+                }
+                if current_user == superadmin:
+                    node["is_hidden"] = rel_path in hidden
+                tree.append(node)
+            else:
+                tree.append({"name": item, "type": "file", "path": full_path})
+    except Exception as e:
+        print("Ошибка при построении дерева:", e)
+    return tree
+
+
+def make_tree(root, dirs, files_per_dir, fanout=8):
+    """Создаёт dirs каталогов (ширина ветвления fanout) по files_per_dir файлов в каждом."""
+    created = [root]
+    index = 0
+    while len(created) - 1 < dirs:
+        parent = created[index // fanout]
+        path = os.path.join(parent, f"dir_{index:05d}")
+        os.mkdir(path)
+        for n in range(files_per_dir):
+            with open(os.path.join(path, f"file_{n:03d}.txt"), "w") as f:
+                f.write("x")
+        created.append(path)
+        index += 1
+    return created[1:]
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dirs", type=int, default=2000)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        files_root = os.path.join(tmp, "KOD OS 1.5")
+        os.mkdir(files_root)
+        dirs = make_tree(files_root, args.dirs, args.files)
+        hidden = {os.path.relpath(d, files_root) for d in dirs[::50]}
+        hidden_file = os.path.join(tmp, "hidden_folders.json")
+        with open(hidden_file, "w", encoding="utf-8") as f:
+            json.dump(sorted(hidden), f)
+        config_path = os.path.join(tmp, "config.ini")
+        with open(config_path, "w", encoding="utf-8") as f:
+            f.write("[folder_visibility]\nsuperadmin = admin\n")
+
+        entries = args.dirs * (args.files + 1)
+        print(f"Синтетическое дерево: {args.dirs} папок, {entries} элементов")
+        legacy_time, legacy_tree = best_of(
+            args.repeat, lambda: legacy_build_file_tree(files_root, files_root, hidden_file, config_path, "user"))
+        new_time, new_tree = best_of(
+            args.repeat, lambda: scan_tree(files_root, files_root, frozenset(hidden), False))
+        assert legacy_tree == [node.as_dict() for node in new_tree], "деревья различаются"
+        print(f"legacy build_file_tree: {legacy_time * 1000:9.1f} ms")
+        print(f"scan_tree:              {new_time * 1000:9.1f} ms  (x{legacy_time / new_time:.1f})")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Пропускная способность общего кэша main.cache_backends.SQLiteCache при
+работе из 1, 4 и 8 процессов (как WSGI-процессы с общими сессиями).
+Каждый процесс выполняет смесь операций, похожую на нагрузку приложения:
+чтение сессии, запись сессии и счётчик ограничения частоты (add + incr).
+В конце проверяется, что общий счётчик не потерял ни одного incr.
+
+Запуск: python benchmarks/bench_shared_cache.py [--ops 5000] [--workers 1 4 8]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main.cache_backends import SQLiteCache  # noqa: E402
+
+SESSIONS = 200
+SESSION = {"logged_in": True, "login": "user1", "login_groups": ["group1"], "_csrftoken": "x" * 64}
+
+
+def worker(path, ops, seed, start_event):
+    cache = SQLiteCache(path, {"OPTIONS": {"MAX_ENTRIES": 100000}})
+    rnd = random.Random(seed)
+    start_event.wait()
+    for _ in range(ops):
+        roll = rnd.random()
+        key = f"session:{rnd.randrange(SESSIONS)}"
+        if roll < 0.7:
+            cache.get(key)
+        elif roll < 0.9:
+            cache.set(key, SESSION, timeout=1209600)
+        else:
+            cache.add("counter", 0, timeout=None)
+            cache.incr("counter")
+
+
+def run(path, workers, ops):
+    cache = SQLiteCache(path, {})
+    cache.clear()
+    context = multiprocessing.get_context("fork")
+    start_event = context.Event()
+    processes = [context.Process(target=worker, args=(path, ops, n, start_event)) for n in range(workers)]
+    for process in processes:
+        process.start()
+    started = time.perf_counter()
+    start_event.set()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+    return workers * ops / elapsed, cache.get("counter", 0)
+
+
+def expected_incrs(workers, ops):
+    total = 0
+    for seed in range(workers):
+        rnd = random.Random(seed)
+        for _ in range(ops):
+            roll = rnd.random()
+            rnd.randrange(SESSIONS)
+            total += roll >= 0.9
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=5000, help="операций на процесс")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "cache.sqlite3")
+        print(f"{args.ops} операций на процесс (70% get, 20% set, 10% add+incr)")
+        for workers in args.workers:
+            throughput, counter = run(path, workers, args.ops)
+            assert counter == expected_incrs(workers, args.ops), "потеряны инкременты"
+            print(f"{workers} процесс(ов): {throughput:10.0f} оп/с, счётчик {counter}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Память, занимаемая деревом файлов: прежние узлы-словари с полными путями
+против компактных FileNode/DirNode (пути восстанавливаются из TreeLevel.path)
+и полного содержимого TreeCache.
+
+Запуск: python benchmarks/bench_tree_memory.py [--dirs 10000] [--files 9]
+(по умолчанию около 100 000 элементов)
+"""
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_file_tree import make_tree  # noqa: E402
+from main.file_tree import TreeCache, scan_tree  # noqa: E402
+
+
+def measure(build):
+    """Возвращает (результат, объём удерживаемой им памяти в байтах)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dirs", type=int, default=10000)
+    parser.add_argument("--files", type=int, default=9)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        files_root = os.path.join(tmp, "KOD OS 1.5")
+        os.mkdir(files_root)
+        make_tree(files_root, args.dirs, args.files)
+        entries = args.dirs * (args.files + 1)
+        print(f"Синтетическое дерево: {entries} элементов")
+
+        compact, compact_bytes = measure(lambda: scan_tree(files_root, files_root))
+        # Прежний формат: словари с полными путями в каждом узле
+        legacy, legacy_bytes = measure(lambda: [node.as_dict() for node in compact])
+        del legacy
+        cache = TreeCache()
+        _, cache_bytes = measure(lambda: (cache, cache.get_tree(files_root, files_root)))
+
+        mib = 1024 * 1024
+        print(f"узлы-словари (прежние):  {legacy_bytes / mib:8.1f} MiB, {legacy_bytes / entries:6.0f} B/элемент")
+        print(f"FileNode/DirNode:        {compact_bytes / mib:8.1f} MiB, {compact_bytes / entries:6.0f} B/элемент "
+              f"(x{legacy_bytes / compact_bytes:.1f} меньше)")
+        print(f"TreeCache целиком:       {cache_bytes / mib:8.1f} MiB, {cache_bytes / entries:6.0f} B/элемент")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
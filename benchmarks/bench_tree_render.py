@@ -0,0 +1,170 @@
+"""
+Сравнение отрисовки дерева прежним рекурсивным {% include "main/file_tree.html" %}
+и новым render_tree_html (холодный кэш фрагментов и повторная отрисовка из кэша
+уровней; в конце — статистика пространства имён fragments:).
+
+Запуск: python benchmarks/bench_tree_render.py [--dirs 1500] [--files 8] [--repeat 3]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import caches  # noqa: E402
+from django.template import Context, Engine  # noqa: E402
+
+from main.file_tree import TreeLevel  # noqa: E402
+from main.node_handles import make_handle  # noqa: E402
+from main.templatetags import file_tree_tags  # noqa: E402
+from main.templatetags.file_tree_tags import render_tree_html  # noqa: E402
+
+# Прежний рекурсивный шаблон дерева (без блока со скриптами); ссылки, как и в
+# render_tree_html, передают дескрипторы узлов (?node=...) вместо путей
+LEGACY_TEMPLATE = """{% load static %}<ul id="file-tree">
+{% for node in tree %}
+    <li style="margin-bottom: 5px;">
+    {% if node.type == "dir" %}
+        <div class="folder-header">
+            {% if current_user == superadmin and node.is_hidden %}
+                <span class="folder" data-folder="{{ node.handle }}" style="color: red;" onclick="toggleFolder(this); playSelectionSound();">
+                    {{ node.name }}
+                </span>
+            {% else %}
+                <span class="folder" data-folder="{{ node.handle }}" onclick="toggleFolder(this); playSelectionSound();">
+                    {{ node.name }}
+                </span>
+            {% endif %}
+            {% if current_user == superadmin %}
+                <a href="{% url 'toggle_folder_visibility' %}?node={{ node.handle }}" title="Скрыть/Показать папку" style="color:#0F0; margin-left:5px;">[toggle]</a>
+            {% endif %}
+            {% if access_level|default:1 >= 2 %}
+                <a href="{% url 'create_file' %}?node={{ node.handle }}" title="Создать файл" style="color:#0F0; margin-left:5px;">
+                    <img src="{% static 'images/file_add.png' %}" alt="Создать файл" style="width:16px;height:16px; background-color: transparent;">
+                </a>
+                <a href="{% url 'create_folder' %}?node={{ node.handle }}" title="Создать папку" style="color:#0F0; margin-left:5px;">
+                    <img src="{% static 'images/folder_add.png' %}" alt="Создать папку" style="width:16px;height:16px; background-color: transparent;">
+                </a>
+            {% endif %}
+            {% if access_level|default:1 >= 3 %}
+                <a href="{% url 'delete_folder' %}?node={{ node.handle }}" title="Удалить папку" style="color:#F00; margin-left:5px;">
+                    <img src="{% static 'images/folder_delete.png' %}" alt="Удалить папку" style="width:16px;height:16px; background-color: transparent;">
+                </a>
+            {% endif %}
+            {% if access_level|default:1 >= 2 %}
+                <button class="move-dest-btn" data-folder-node="{{ node.handle }}" title="Переместить сюда" style="display:none; margin-left:5px; background-color: transparent; border: none;">
+                    <img src="{% static 'images/move_dest.png' %}" alt="Переместить сюда" style="width:16px;height:16px; background-color: transparent;">
+                </button>
+            {% endif %}
+        </div>
+        {% if node.children %}
+            <div class="children" style="display:none; margin-left:20px;">
+                {% include "legacy_tree.html" with tree=node.children current_user=current_user superadmin=superadmin access_level=access_level %}
+            </div>
+        {% endif %}
+    {% else %}
+        <div class="file-entry">
+            <a href="{% url 'file_view' %}?node={{ node.handle }}" style="color:#0F0;" onclick="playSelectionSound();">
+                {{ node.name }}
+            </a>
+            {% if access_level|default:1 >= 2 %}
+                <button class="move-file-btn" data-file-node="{{ node.handle }}" title="Переместить файл" style="margin-left:5px; background-color: transparent; border: none;">
+                    <img src="{% static 'images/move_file.png' %}" alt="Переместить файл" style="width:16px;height:16px; background-color: transparent;">
+                </button>
+            {% endif %}
+            {% if access_level|default:1 >= 3 %}
+                <a href="{% url 'delete_file' %}?node={{ node.handle }}" title="Удалить файл" style="color:#F00; margin-left:5px;">
+                    <img src="{% static 'images/file_delete.png' %}" alt="Удалить файл" style="width:16px;height:16px; background-color: transparent;">
+                </a>
+            {% endif %}
+        </div>
+    {% endif %}
+    </li>
+{% endfor %}
+</ul>"""
+
+
+def make_tree(prefix, dirs, files_per_dir, fanout=8):
+    """Синтетическое дерево в памяти: dirs папок по files_per_dir файлов."""
+    levels = [TreeLevel()]
+    paths = [prefix]
+    created = 0
+    index = 0
+    while created < dirs:
+        parent_level, parent_path = levels[index // fanout], paths[index // fanout]
+        path = f"{parent_path}/dir_{index:05d}"
+        children = TreeLevel({"name": f"file_{n:03d}.txt", "type": "file", "path": f"{path}/file_{n:03d}.txt",
+                              "handle": make_handle(f"{path}/file_{n:03d}.txt")}
+                             for n in range(files_per_dir))
+        parent_level.insert(len([n for n in parent_level if n["type"] == "dir"]), {
+            "name": f"dir_{index:05d}", "type": "dir", "full_path": path, "handle": make_handle(path),
+            "children": children,
+        })
+        levels.append(children)
+        paths.append(path)
+        created += 1
+        index += 1
+    return levels[0]
+
+
+def normalize(markup):
+    """Убирает комментарии и пробелы; id="file-tree" оставляет только у корневого <ul>."""
+    markup = re.sub(r"<!--.*?-->", "", markup, flags=re.S)
+    markup = re.sub(r"\s+", "", markup)
+    head, sep, rest = markup.partition('<ulid="file-tree">')
+    return head + sep + rest.replace('<ulid="file-tree">', "<ul>")
+
+
+def best_of(repeat, func, before=None):
+    timings = []
+    for _ in range(repeat):
+        if before:
+            before()
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dirs", type=int, default=1500)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tree = make_tree("/srv/KOD OS 1.5", args.dirs, args.files)
+    nodes = args.dirs * (args.files + 1)
+    print(f"Синтетическое дерево: {nodes} узлов")
+
+    engine = Engine(
+        loaders=[("django.template.loaders.locmem.Loader", {"legacy_tree.html": LEGACY_TEMPLATE})],
+        libraries={"static": "django.templatetags.static"},
+    )
+    legacy = engine.get_template("legacy_tree.html")
+    context = {"tree": tree, "current_user": "admin", "superadmin": "admin", "access_level": 3}
+
+    fragments = caches[file_tree_tags.FRAGMENT_CACHE_ALIAS]
+    legacy_time, legacy_html = best_of(args.repeat, lambda: legacy.render(Context(context)))
+    cold_time, new_html = best_of(args.repeat, lambda: render_tree_html(tree, 3, True), before=fragments.clear)
+    warm_time, _ = best_of(args.repeat, lambda: render_tree_html(tree, 3, True))
+    assert normalize(legacy_html) == normalize(new_html), "разметка различается"
+    stats = fragments.stats()["namespaces"]["fragments:"]
+
+    print(f"{{% include %}} (прежний):    {legacy_time * 1000:9.1f} ms, {len(legacy_html) // 1024} KiB")
+    print(f"render_tree_html, холодный: {cold_time * 1000:9.1f} ms  (x{legacy_time / cold_time:.1f}), "
+          f"{len(new_html) // 1024} KiB")
+    print(f"render_tree_html, из кэша:  {warm_time * 1000:9.1f} ms  (x{cold_time / warm_time:.1f} к холодному)")
+    print(f"Фрагменты: {stats['entries']} записей, {stats['bytes'] // 1024} KiB из {stats['budget'] // 1024} KiB, "
+          f"попаданий {stats['hits']}, промахов {stats['misses']}, вытеснений {stats['evictions']}, "
+          f"отклонено {stats['rejected']}")
+
+if __name__ == "__main__":
+    main()
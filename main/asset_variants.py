@@ -0,0 +1,228 @@
+import json
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+# MIME-типы вариантов по расширению файла
+CONTENT_TYPES = {".gif": "image/gif", ".png": "image/png", ".webp": "image/webp"}
+# Форматы, которые понимает любой браузер: из них выбирается <img src> и запасной фон
+UNIVERSAL_TYPES = ("image/gif", "image/png")
+# Оптимизированные варианты лежат в подпапке optimized рядом с исходниками
+OUTPUT_FOLDER = "optimized"
+
+
+def _variant(path, size):
+    return {"path": path, "type": CONTENT_TYPES.get(os.path.splitext(path)[1].lower()), "bytes": size}
+
+
+class AssetVariants:
+    """
+    Неизменяемый индекс манифеста оптимизированных изображений (см. optimize_assets).
+    Для исходного файла (путь относительно статики, например
+    "images/background_default.gif") хранит варианты самого изображения и
+    кадра-заставки — списки {"path", "type", "bytes"}, отсортированные по
+    размеру. Для файла без записи в манифесте единственный вариант — он сам.
+    """
+    __slots__ = ("assets", "signature")
+
+    def __init__(self, assets=None, signature=None):
+        self.assets = assets or {}
+        self.signature = signature
+
+    def variants(self, name):
+        entry = self.assets.get(name)
+        return entry["variants"] if entry else [_variant(name, None)]
+
+    def poster(self, name):
+        entry = self.assets.get(name)
+        return entry.get("poster", []) if entry else []
+
+    def fallback(self, name):
+        """Самый маленький вариант в формате, который понимает любой браузер."""
+        for variant in self.variants(name):
+            if variant["type"] in UNIVERSAL_TYPES:
+                return variant
+        return _variant(name, None)
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def load_manifest(path, signature=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            assets = json.load(f)
+    except (OSError, ValueError):
+        assets = {}
+    return AssetVariants(assets, signature)
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_asset_variants():
+    """
+    Актуальный индекс манифеста settings.ASSET_VARIANTS_MANIFEST. Файл
+    перечитывается, только если изменилась его подпись, — проверка стоит один stat.
+    Без манифеста (команда optimize_assets не запускалась) индекс пуст.
+    """
+    global _index
+    path = settings.ASSET_VARIANTS_MANIFEST
+    signature = _file_signature(path)
+    index = _index
+    if index is None or index.signature != signature:
+        with _lock:
+            index = _index
+            if index is None or index.signature != signature:
+                index = _index = load_manifest(path, signature)
+    return index
+
+
+# ---------------------- Оптимизация (manage.py optimize_assets) ----------------------
+
+def optimize_assets(source_dir, manifest_path, static_prefix="images", colors=64, quality=75, force=False,
+                    log=print):
+    """
+    Создаёт оптимизированные варианты фонов групп (background_*.gif) и логотипов
+    (logo_*.png) из source_dir в source_dir/optimized и записывает манифест.
+    Для анимаций: анимированный WebP, GIF с палитрой из colors цветов и
+    кадр-заставка (первый кадр анимации) в PNG и WebP; для логотипов — пережатый без
+    потерь PNG и WebP без потерь. Вариант сохраняется, только если он меньше
+    исходника. Неизменившиеся исходники (тот же размер и mtime) пропускаются,
+    если не задан force.
+    Нужен Pillow; без него выбрасывается ImportError.
+    """
+    from PIL import features
+
+    output_dir = os.path.join(source_dir, OUTPUT_FOLDER)
+    os.makedirs(output_dir, exist_ok=True)
+    previous = load_manifest(manifest_path).assets
+    webp = features.check("webp")
+
+    def relative(path):
+        return f"{static_prefix}/{OUTPUT_FOLDER}/{os.path.basename(path)}"
+
+    assets = {}
+    for filename in sorted(os.listdir(source_dir)):
+        lower = filename.lower()
+        if lower.startswith("background_") and lower.endswith(".gif"):
+            optimize = _optimize_animation
+        elif lower.startswith("logo_") and lower.endswith(".png"):
+            optimize = _optimize_image
+        else:
+            continue
+        source = os.path.join(source_dir, filename)
+        name = f"{static_prefix}/{filename}"
+        st = os.stat(source)
+        stamp = {"bytes": st.st_size, "mtime_ns": st.st_mtime_ns}
+        entry = previous.get(name)
+        if (not force and entry is not None and entry.get("source") == stamp
+                and all(os.path.exists(os.path.join(source_dir, os.path.relpath(v["path"], static_prefix)))
+                        for v in entry["variants"] + entry.get("poster", []))):
+            assets[name] = entry
+            log(f"{name}: без изменений")
+            continue
+        stem = os.path.join(output_dir, os.path.splitext(filename)[0])
+        entry = optimize(source, stem, colors=colors, quality=quality, webp=webp)
+        entry["source"] = stamp
+        entry["variants"] = sorted(
+            [_variant(relative(path), os.path.getsize(path)) for path in entry.pop("outputs")]
+            + [_variant(name, st.st_size)],
+            key=lambda variant: variant["bytes"],
+        )
+        entry["poster"] = sorted(
+            (_variant(relative(path), os.path.getsize(path)) for path in entry.pop("posters")),
+            key=lambda variant: variant["bytes"],
+        )
+        assets[name] = entry
+        log(f"{name}: {st.st_size} -> {entry['variants'][0]['bytes']} байт ({entry['variants'][0]['path']})")
+    _save_manifest(manifest_path, assets)
+    return assets
+
+
+def _keep_if_smaller(path, limit):
+    """Оставляет файл path, только если он меньше limit байт."""
+    if os.path.getsize(path) < limit:
+        return [path]
+    os.remove(path)
+    return []
+
+
+def _optimize_animation(source, stem, colors, quality, webp):
+    from PIL import Image
+
+    limit = os.path.getsize(source)
+    frames = []
+    durations = []
+    with Image.open(source) as image:
+        loop = image.info.get("loop", 0)
+        for index in range(getattr(image, "n_frames", 1)):
+            image.seek(index)
+            frames.append(image.convert("RGB"))
+            durations.append(image.info.get("duration", 100))
+    outputs = []
+    if webp:
+        path = stem + ".webp"
+        frames[0].save(path, "WEBP", save_all=True, append_images=frames[1:], duration=durations, loop=loop,
+                       quality=quality, method=6)
+        outputs += _keep_if_smaller(path, limit)
+    path = stem + ".gif"
+    palette = [frame.quantize(colors=colors) for frame in frames]
+    palette[0].save(path, "GIF", save_all=True, append_images=palette[1:], duration=durations, loop=loop,
+                    optimize=True)
+    outputs += _keep_if_smaller(path, limit)
+    # Заставка показывается, пока грузится анимация; у однокадрового GIF она повторяла бы сам фон
+    posters = []
+    if len(frames) > 1:
+        path = stem + ".poster.png"
+        frames[0].save(path, "PNG", optimize=True)
+        posters += _keep_if_smaller(path, limit)
+        if webp:
+            path = stem + ".poster.webp"
+            frames[0].save(path, "WEBP", quality=quality, method=6)
+            posters += _keep_if_smaller(path, limit)
+    return {"frames": len(frames), "width": frames[0].width, "height": frames[0].height,
+            "outputs": outputs, "posters": posters}
+
+
+def _optimize_image(source, stem, colors, quality, webp):
+    from PIL import Image
+
+    limit = os.path.getsize(source)
+    with Image.open(source) as image:
+        image.load()
+        outputs = []
+        path = stem + ".png"
+        image.save(path, "PNG", optimize=True)
+        outputs += _keep_if_smaller(path, limit)
+        if webp:
+            path = stem + ".webp"
+            image.save(path, "WEBP", lossless=True, method=6)
+            outputs += _keep_if_smaller(path, limit)
+        return {"frames": 1, "width": image.width, "height": image.height, "outputs": outputs, "posters": []}
+
+
+def _save_manifest(path, assets):
+    """Атомарная запись манифеста (как save_hidden_folders)."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".manifest.", suffix=".tmp", dir=directory)
+    try:
+        os.chmod(tmp, 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(assets, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,189 @@
+import os
+import threading
+
+from .hidden_folders import HiddenFolders
+
+# Действия над путями
+VIEW = "view"
+EDIT = "edit"
+CREATE = "create"
+CREATE_FOLDER = "create_folder"
+MOVE = "move"
+MOVE_TO = "move_to"
+DELETE = "delete"
+DELETE_FOLDER = "delete_folder"
+
+# Действие -> (минимальный уровень доступа, что проверять по [restrictions]:
+# имя файла, имя папки или ничего). CREATE — создание файла в папке,
+# CREATE_FOLDER — создание папки в папке, MOVE — перемещаемый файл,
+# MOVE_TO — папка, в которую он перемещается
+ACTIONS = {
+    VIEW: (1, None),
+    EDIT: (1, "file"),
+    CREATE: (2, "folder"),
+    CREATE_FOLDER: (2, None),
+    MOVE: (2, "file"),
+    MOVE_TO: (2, None),
+    DELETE: (3, "file"),
+    DELETE_FOLDER: (3, "folder"),
+}
+
+# Результаты проверки
+ALLOWED = "allowed"        # разрешено
+OUTSIDE = "outside"        # путь вне папки с файлами
+FORBIDDEN = "forbidden"    # вне папок групп пользователя или в скрытой папке
+RESTRICTED = "restricted"  # файл или папка из [restrictions]
+LEVEL = "level"            # недостаточный уровень доступа
+
+# Метка в узле префиксного дерева пользователя: здесь начинается разрешённая папка
+_ROOT = None
+
+
+class UserPolicy:
+    """
+    Права одного пользователя, скомпилированные из снимка конфигурации:
+    уровень доступа, префиксное дерево корней разрешённых папок по
+    компонентам пути относительно папки с файлами и индекс скрытых папок
+    (None — скрытые папки пользователю доступны). Проверка пути — один
+    проход по его компонентам в каждом из деревьев.
+    """
+    __slots__ = ("level", "is_superadmin", "trie", "hidden")
+
+    def __init__(self, level, is_superadmin, roots, hidden=None):
+        self.level = level
+        self.is_superadmin = is_superadmin
+        self.hidden = hidden
+        trie = {}
+        for parts in roots:
+            node = trie
+            for part in parts:
+                node = node.setdefault(part, {})
+            node[_ROOT] = True
+        self.trie = trie
+
+    def scope(self, parts):
+        """ALLOWED, если путь внутри одной из разрешённых папок и не в скрытой, иначе FORBIDDEN."""
+        if self.hidden is not None and self.hidden.is_hidden(parts):
+            return FORBIDDEN
+        node = self.trie
+        if _ROOT in node:
+            return ALLOWED
+        for part in parts:
+            node = node.get(part)
+            if node is None:
+                return FORBIDDEN
+            if _ROOT in node:
+                return ALLOWED
+        return FORBIDDEN
+
+
+def _split(rel_path):
+    rel_path = os.path.normpath(rel_path)
+    return () if rel_path == os.curdir else tuple(rel_path.split(os.sep))
+
+
+class PathAuthorizer:
+    """
+    Проверка прав «может ли пользователь U выполнить действие A над путём P».
+    Строится для одного поколения конфигурации и набора скрытых папок
+    (см. get_authorizer); права каждого пользователя компилируются один раз
+    при первом обращении.
+
+    Папки групп задают, где пользователь может что-либо делать: суперадмин —
+    во всей папке с файлами, пользователь без групп — нигде, группы без папок —
+    во всей папке с файлами (как в file_manager). Скрытые папки и всё внутри
+    них недоступны никому, кроме суперадмина.
+    """
+
+    def __init__(self, files_root, snapshot, hidden=None):
+        self.source = (files_root, snapshot, hidden)
+        self.files_root = os.path.abspath(files_root)
+        self._prefix = os.path.join(self.files_root, "")
+        self._snapshot = snapshot
+        self._hidden = hidden if hidden is not None else HiddenFolders()
+        self._policies = {}
+        self._lock = threading.Lock()
+
+    def matches(self, files_root, snapshot, hidden):
+        """Построен ли объект по этим же данным (снимки сравниваются по идентичности)."""
+        source = self.source
+        return source[1] is snapshot and source[2] is hidden and source[0] == files_root
+
+    def locate(self, path):
+        """
+        Компоненты пути относительно папки с файлами или None, если путь вне её.
+        Путь нормализуется один раз; "/files_root_other" не считается вложенным в "/files_root".
+        """
+        if not path:
+            return None
+        abs_path = os.path.normpath(path) if os.path.isabs(path) else os.path.abspath(path)
+        if abs_path == self.files_root:
+            return ()
+        if not abs_path.startswith(self._prefix):
+            return None
+        return tuple(abs_path[len(self._prefix):].split(os.sep))
+
+    def policy(self, user):
+        policy = self._policies.get(user)
+        if policy is None:
+            policy = self._compile(user)
+            with self._lock:
+                self._policies[user] = policy
+        return policy
+
+    def _compile(self, user):
+        snapshot = self._snapshot
+        level = snapshot.access_levels.get(user, 1)
+        if user == snapshot.superadmin:
+            return UserPolicy(level, True, [()])
+        groups = snapshot.groups_for(user)
+        if not groups:
+            return UserPolicy(level, False, ())
+        folders = [folder for group in groups for folder in snapshot.folders_for(group)]
+        roots = [_split(folder) for folder in folders] if folders else [()]
+        return UserPolicy(level, False, roots, self._hidden)
+
+    def check(self, user, action, path):
+        """Результат проверки: ALLOWED или причина отказа (OUTSIDE, FORBIDDEN, RESTRICTED, LEVEL)."""
+        parts = self.locate(path)
+        if parts is None:
+            return OUTSIDE
+        policy = self.policy(user)
+        result = policy.scope(parts)
+        if result is not ALLOWED:
+            return result
+        min_level, restriction = ACTIONS[action]
+        if restriction and parts:
+            name = parts[-1].strip()
+            if restriction == "file" and name.lower() in self._snapshot.restricted_files:
+                return RESTRICTED
+            if restriction == "folder" and name.upper() in self._snapshot.restricted_folders:
+                return RESTRICTED
+        if policy.level < min_level:
+            return LEVEL
+        return ALLOWED
+
+    def may(self, user, action, path):
+        return self.check(user, action, path) == ALLOWED
+
+
+_authorizer = None
+_authorizer_lock = threading.Lock()
+
+
+def get_authorizer(files_root, snapshot, hidden):
+    """
+    PathAuthorizer для текущих снимков конфигурации и скрытых папок
+    (hidden — HiddenFolders из get_hidden_folders).
+    Пересобирается, только если сменился один из снимков или папка с файлами.
+    """
+    global _authorizer
+    current = _authorizer
+    if current is not None and current.matches(files_root, snapshot, hidden):
+        return current
+    with _authorizer_lock:
+        current = _authorizer
+        if current is None or not current.matches(files_root, snapshot, hidden):
+            current = PathAuthorizer(files_root, snapshot, hidden)
+            _authorizer = current
+    return current
@@ -0,0 +1,408 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache (expires);
+"""
+
+# Просроченные ключи и лишние записи вычищаются примерно раз в CULL_EVERY записей
+CULL_EVERY = 200
+
+
+def _encode(value):
+    # Целые числа (счётчики incr) хранятся как INTEGER, без pickle
+    if type(value) is int:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(value):
+    if isinstance(value, int):
+        return value
+    return pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кэш Django в файле SQLite (режим WAL), общий для всех процессов на машине:
+    годится и для CACHES, и для сессий (SESSION_ENGINE = cache), поэтому
+    приложение можно запускать в несколько WSGI-процессов без внешних служб.
+
+    LOCATION — путь к файлу базы. Срок жизни хранится в столбце expires
+    (абсолютное время, NULL — бессрочно): просроченный ключ не виден сразу,
+    а удаляется при периодической чистке вместе с самыми старыми записями,
+    если их больше MAX_ENTRIES. add и incr атомарны между процессами:
+    add — один INSERT ... ON CONFLICT, incr — транзакция BEGIN IMMEDIATE.
+    Каждый поток каждого процесса работает через своё соединение.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = None  # pid процесса, в котором создана схема
+
+    def _connection(self):
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, "pid", None) != pid:
+            # После fork соединение родителя использовать нельзя
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if self._initialized != pid:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = pid
+            local.conn, local.pid, local.writes = conn, pid, 0
+        return local.conn
+
+    def _expiry(self, timeout):
+        # get_backend_timeout возвращает абсолютное время истечения или None (бессрочно)
+        return self.get_backend_timeout(timeout)
+
+    def _wrote(self, conn):
+        local = self._local
+        local.writes += 1
+        if local.writes % CULL_EVERY == 0:
+            self._cull(conn)
+
+    def _cull(self, conn):
+        now = time.time()
+        conn.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+        count = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self._max_entries:
+            # Как и в стандартных бэкендах, удаляется 1/CULL_FREQUENCY записей — те, что истекают раньше всех
+            excess = count // self._cull_frequency if self._cull_frequency else count
+            conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)", (excess,))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        cursor = conn.execute(
+            "INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+            "WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            (key, _encode(value), self._expiry(timeout), time.time()))
+        self._wrote(conn)
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time())).fetchone()
+        return default if row is None else _decode(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                     (key, _encode(value), self._expiry(timeout)))
+        self._wrote(conn)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            "UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (self._expiry(timeout), key, time.time()))
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time())).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        # BEGIN IMMEDIATE сразу берёт блокировку записи: чтение и запись
+        # нового значения не перемежаются с incr из других процессов
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, time.time())).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = _decode(row[0]) + delta
+            conn.execute("UPDATE cache SET value = ? WHERE key = ?", (_encode(value), key))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        placeholders = ",".join("?" * len(key_map))
+        rows = self._connection().execute(
+            f"SELECT key, value FROM cache WHERE key IN ({placeholders}) AND (expires IS NULL OR expires > ?)",
+            (*key_map, time.time())).fetchall()
+        return {key_map[key]: _decode(value) for key, value in rows}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expiry(timeout)
+        rows = [(self.make_and_validate_key(key, version=version), _encode(value), expires)
+                for key, value in data.items()]
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._wrote(conn)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            placeholders = ",".join("?" * len(keys))
+            self._connection().execute(f"DELETE FROM cache WHERE key IN ({placeholders})", keys)
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+
+# Приблизительные накладные расходы на одну запись в памяти (кортеж, ключи словарей, узлы LRU), байт
+ENTRY_OVERHEAD = 200
+# Пространство имён для ключей, не подходящих ни под один префикс из NAMESPACES
+OTHER_NAMESPACE = "other"
+
+
+class _Namespace:
+    __slots__ = ("name", "budget", "keys", "bytes", "hits", "misses", "evictions", "expired", "rejected")
+
+    def __init__(self, name, budget):
+        self.name = name
+        self.budget = budget
+        self.keys = OrderedDict()  # порядок LRU внутри пространства имён
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.expired = self.rejected = 0
+
+    def stats(self):
+        return {
+            "entries": len(self.keys), "bytes": self.bytes, "budget": self.budget,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "expired": self.expired, "rejected": self.rejected,
+        }
+
+
+class _MemoryStore:
+    """Данные одного BoundedMemoryCache (общие для всех потоков процесса, как у LocMemCache)."""
+
+    def __init__(self, max_bytes, budgets):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.data = OrderedDict()  # ключ -> (pickle значения, expires, пространство имён, размер); общий LRU
+        self.bytes = 0
+        # Префиксы проверяются от длинных к коротким
+        self.prefixes = sorted(budgets, key=len, reverse=True)
+        self.namespaces = {name: _Namespace(name, budget) for name, budget in budgets.items()}
+        self.namespaces[OTHER_NAMESPACE] = _Namespace(OTHER_NAMESPACE, None)
+
+
+_memory_stores = {}
+_memory_stores_lock = threading.Lock()
+
+
+class BoundedMemoryCache(BaseCache):
+    """
+    Кэш Django в памяти процесса с ограничением по байтам, а не по числу записей.
+
+    Значение хранится в pickle, размер записи — длина pickle и ключа плюс
+    ENTRY_OVERHEAD. OPTIONS:
+    - MAX_BYTES — общий бюджет кэша;
+    - NAMESPACES — {префикс ключа: бюджет в байтах}; ключ относится к
+      пространству имён с самым длинным совпавшим префиксом, остальные —
+      к "other", ограниченному только общим бюджетом.
+    Вытеснение — настоящий LRU: при нехватке места в пространстве имён
+    удаляются его давно не использованные записи, при нехватке общего
+    бюджета — давно не использованные записи всего кэша. Запись больше
+    бюджета не сохраняется (счётчик rejected).
+    stats() возвращает попадания, промахи, вытеснения и объём по пространствам имён.
+    Экземпляры с одинаковым LOCATION в разных потоках работают с одними данными.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.location = location
+        with _memory_stores_lock:
+            store = _memory_stores.get(location)
+            if store is None:
+                store = _memory_stores[location] = _MemoryStore(
+                    options.get("MAX_BYTES", 32 * 1024 * 1024), dict(options.get("NAMESPACES", {})))
+        self._store = store
+
+    def _namespace(self, raw_key):
+        store = self._store
+        for prefix in store.prefixes:
+            if raw_key.startswith(prefix):
+                return store.namespaces[prefix]
+        return store.namespaces[OTHER_NAMESPACE]
+
+    def _remove(self, key):
+        store = self._store
+        _, _, namespace, size = store.data.pop(key)
+        del namespace.keys[key]
+        namespace.bytes -= size
+        store.bytes -= size
+
+    def _live(self, key, now):
+        """Запись по ключу или None; просроченная запись удаляется. Вызывается под блокировкой."""
+        entry = self._store.data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            entry[2].expired += 1
+            self._remove(key)
+            return None
+        return entry
+
+    def _store_value(self, key, raw_key, value, timeout):
+        """Сохраняет значение и вытесняет LRU-записи. Вызывается под блокировкой."""
+        store = self._store
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        size = len(pickled) + len(key) + ENTRY_OVERHEAD
+        namespace = self._namespace(raw_key)
+        if key in store.data:
+            self._remove(key)
+        if size > store.max_bytes or (namespace.budget is not None and size > namespace.budget):
+            namespace.rejected += 1
+            return False
+        if namespace.budget is not None:
+            while namespace.bytes + size > namespace.budget:
+                victim = next(iter(namespace.keys))
+                self._remove(victim)
+                namespace.evictions += 1
+        while store.bytes + size > store.max_bytes:
+            victim = next(iter(store.data))
+            victim_namespace = store.data[victim][2]
+            self._remove(victim)
+            victim_namespace.evictions += 1
+        store.data[key] = (pickled, self.get_backend_timeout(timeout), namespace, size)
+        namespace.keys[key] = None
+        namespace.bytes += size
+        store.bytes += size
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw_key = key
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            if self._live(key, time.time()) is not None:
+                return False
+            return self._store_value(key, raw_key, value, timeout)
+
+    def get(self, key, default=None, version=None):
+        raw_key = key
+        key = self.make_and_validate_key(key, version=version)
+        store = self._store
+        with store.lock:
+            entry = self._live(key, time.time())
+            if entry is None:
+                self._namespace(raw_key).misses += 1
+                return default
+            store.data.move_to_end(key)
+            entry[2].keys.move_to_end(key)
+            entry[2].hits += 1
+            pickled = entry[0]
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw_key = key
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            self._store_value(key, raw_key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        store = self._store
+        with store.lock:
+            entry = self._live(key, time.time())
+            if entry is None:
+                return False
+            store.data[key] = (entry[0], self.get_backend_timeout(timeout), entry[2], entry[3])
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        raw_key = key
+        key = self.make_and_validate_key(key, version=version)
+        store = self._store
+        with store.lock:
+            entry = self._live(key, time.time())
+            if entry is None:
+                raise ValueError("Key '%s' not found" % raw_key)
+            value = pickle.loads(entry[0]) + delta
+            expires = entry[1]
+            self._store_value(key, raw_key, value, None)
+            if key in store.data:
+                # Срок жизни при incr не меняется
+                new = store.data[key]
+                store.data[key] = (new[0], expires, new[2], new[3])
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            return self._live(key, time.time()) is not None
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._store.lock:
+            if key not in self._store.data:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self):
+        store = self._store
+        with store.lock:
+            store.data.clear()
+            store.bytes = 0
+            for namespace in store.namespaces.values():
+                namespace.keys.clear()
+                namespace.bytes = 0
+
+    def stats(self):
+        """Сводка по кэшу: общий объём и бюджет, счётчики по пространствам имён."""
+        store = self._store
+        with store.lock:
+            namespaces = {name: namespace.stats() for name, namespace in store.namespaces.items()}
+            return {
+                "entries": len(store.data),
+                "bytes": store.bytes,
+                "max_bytes": store.max_bytes,
+                "hits": sum(ns["hits"] for ns in namespaces.values()),
+                "misses": sum(ns["misses"] for ns in namespaces.values()),
+                "evictions": sum(ns["evictions"] for ns in namespaces.values()),
+                "namespaces": namespaces,
+            }
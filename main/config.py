@@ -0,0 +1,138 @@
+import os
+import configparser
+import threading
+from types import MappingProxyType
+
+# Базовая директория проекта
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Путь к конфигурационному файлу
+CONFIG_PATH = os.path.join(BASE_DIR, "config.ini")
+
+
+class ConfigSnapshot:
+    """
+    Неизменяемый снимок config.ini.
+    Хранит учётные данные, уровни доступа, ограничения, логин суперадмина,
+    индекс пользователь -> группы и группа -> папки.
+    Поле signature — (mtime_ns, size) файла, по которому снимок был построен;
+    generation увеличивается при каждом перечитывании файла.
+    """
+    __slots__ = (
+        "credentials", "access_levels", "restricted_files", "restricted_folders",
+        "superadmin", "user_groups", "group_folders", "signature", "generation",
+    )
+
+    def __init__(self, credentials, access_levels, restricted_files, restricted_folders,
+                 superadmin, user_groups, group_folders, signature=None, generation=0):
+        set_ = object.__setattr__
+        set_(self, "credentials", MappingProxyType(dict(credentials)))
+        set_(self, "access_levels", MappingProxyType(dict(access_levels)))
+        set_(self, "restricted_files", frozenset(restricted_files))
+        set_(self, "restricted_folders", frozenset(restricted_folders))
+        set_(self, "superadmin", superadmin)
+        set_(self, "user_groups", MappingProxyType({u: tuple(g) for u, g in user_groups.items()}))
+        set_(self, "group_folders", MappingProxyType({g: tuple(f) for g, f in group_folders.items()}))
+        set_(self, "signature", signature)
+        set_(self, "generation", generation)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ConfigSnapshot is immutable")
+
+    def groups_for(self, user):
+        """Группы пользователя в порядке их объявления в секции [groups]."""
+        return self.user_groups.get(user, ())
+
+    def folders_for(self, group):
+        """Разрешённые папки группы из секции [group_folders]."""
+        if not group:
+            return ()
+        # configparser приводит имена опций к нижнему регистру
+        return self.group_folders.get(group.lower(), ())
+
+
+def _split(value):
+    return [x.strip() for x in value.split(",") if x.strip()]
+
+
+def parse_config(path, signature=None, generation=0):
+    """Разбирает config.ini один раз и возвращает ConfigSnapshot."""
+    config = configparser.ConfigParser()
+    config.read(path)
+
+    if config.has_section("accounts"):
+        credentials = dict(config.items("accounts"))
+    else:
+        login_value = config.get("credentials", "login", fallback="admin")
+        password_value = config.get("credentials", "password", fallback="secret")
+        credentials = {login_value: password_value}
+
+    access_levels = {}
+    if config.has_section("access_levels"):
+        for user, level in config.items("access_levels"):
+            try:
+                access_levels[user.strip()] = int(level.strip())
+            except ValueError:
+                access_levels[user.strip()] = 1
+
+    restricted_files = set()
+    restricted_folders = set()
+    if config.has_section("restrictions"):
+        if config.has_option("restrictions", "restricted_files"):
+            restricted_files = set(x.lower() for x in _split(config.get("restrictions", "restricted_files")))
+        if config.has_option("restrictions", "restricted_folders"):
+            restricted_folders = set(x.upper() for x in _split(config.get("restrictions", "restricted_folders")))
+
+    superadmin = None
+    if config.has_section("folder_visibility") and config.has_option("folder_visibility", "superadmin"):
+        superadmin = config.get("folder_visibility", "superadmin").strip()
+
+    user_groups = {}
+    if config.has_section("groups"):
+        for group in config.options("groups"):
+            for user in _split(config.get("groups", group)):
+                groups = user_groups.setdefault(user, [])
+                if group not in groups:
+                    groups.append(group)
+
+    group_folders = {}
+    if config.has_section("group_folders"):
+        for group in config.options("group_folders"):
+            group_folders[group] = _split(config.get("group_folders", group))
+
+    return ConfigSnapshot(
+        credentials, access_levels, restricted_files, restricted_folders,
+        superadmin, user_groups, group_folders, signature, generation,
+    )
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_config():
+    """
+    Возвращает актуальный снимок конфигурации.
+    Файл перечитывается только при изменении его mtime или размера;
+    новый снимок подменяет старый одним присваиванием, поэтому
+    параллельные запросы всегда видят целостное состояние.
+    """
+    global _snapshot
+    signature = _file_signature(CONFIG_PATH)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.signature == signature:
+        return snapshot
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.signature != signature:
+            generation = snapshot.generation + 1 if snapshot is not None else 1
+            snapshot = parse_config(CONFIG_PATH, signature, generation)
+            _snapshot = snapshot
+    return snapshot
@@ -1,62 +1,186 @@
+from django.conf import settings
 from django.core.cache import cache
-from django.http import HttpResponseForbidden
+from django.http import HttpResponseForbidden, JsonResponse
+from django.urls import reverse
 from functools import wraps
+import hashlib
 import time
 
-def rate_limit(key_prefix, max_attempts=5, timeout=300):
+
+class RateLimitPolicy:
     """
-    Rate limiting decorator that limits the number of attempts within a time window.
-    
+    Sliding-window rate limit stored in the Django cache.
+
+    Each client (IP address + user agent) gets one counter per fixed window
+    of `window` seconds; passing `subject` (e.g. the submitted login) keys a
+    separate counter for that client and subject. The sliding estimate is the current window's count
+    plus the previous window's count weighted by how much of it still
+    overlaps the last `window` seconds. Counters are bumped with cache.add +
+    cache.incr (and taken back with cache.decr), which are atomic in every
+    Django cache backend, and the session is never touched.
+
+    Limits can be overridden per policy name in settings.RATE_LIMITS:
+    {"login": (5, 300)} means 5 hits per 300 seconds.
+    """
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self._limit = limit
+        self._window = window
+
+    @property
+    def limit(self):
+        return getattr(settings, "RATE_LIMITS", {}).get(self.name, (self._limit, self._window))[0]
+
+    @property
+    def window(self):
+        return getattr(settings, "RATE_LIMITS", {}).get(self.name, (self._limit, self._window))[1]
+
+    def client_key(self, request, subject=None):
+        # Hash keeps keys short and safe for memcached whatever the user agent or subject contains
+        ip = request.META.get('REMOTE_ADDR', '')
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        raw = f"{ip}\n{user_agent}" if subject is None else f"{ip}\n{user_agent}\n{subject}"
+        return hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()
+
+    def _keys(self, request, now, subject=None):
+        window = self.window
+        index = int(now // window)
+        client = self.client_key(request, subject)
+        current = f"rl:{self.name}:{client}:{index}"
+        previous = f"rl:{self.name}:{client}:{index - 1}"
+        return current, previous, (now % window) / window
+
+    def count(self, request, now=None, subject=None):
+        """Sliding-window estimate of hits in the last `window` seconds."""
+        now = time.time() if now is None else now
+        current, previous, elapsed = self._keys(request, now, subject)
+        counts = cache.get_many([current, previous])
+        return counts.get(current, 0) + counts.get(previous, 0) * (1 - elapsed)
+
+    def is_limited(self, request, now=None, subject=None):
+        return self.count(request, now, subject) >= self.limit
+
+    def hit(self, request, now=None, subject=None):
+        """Counts one hit. Returns the new sliding-window estimate."""
+        now = time.time() if now is None else now
+        current, previous, elapsed = self._keys(request, now, subject)
+        # Counter lives for two windows: it is still needed as "previous" in the next one
+        cache.add(current, 0, timeout=2 * self.window)
+        try:
+            value = cache.incr(current)
+        except ValueError:
+            # Evicted between add and incr
+            cache.set(current, 1, timeout=2 * self.window)
+            value = 1
+        return value + (cache.get(previous) or 0) * (1 - elapsed)
+
+    def refund(self, request, now=None, subject=None):
+        """Takes back one hit counted with the same `now` (e.g. a request that turned out not to count)."""
+        now = time.time() if now is None else now
+        current, _, _ = self._keys(request, now, subject)
+        try:
+            cache.decr(current)
+        except ValueError:
+            # Counter already expired or was reset
+            pass
+
+    def reset(self, request, now=None, subject=None):
+        now = time.time() if now is None else now
+        current, previous, _ = self._keys(request, now, subject)
+        cache.delete_many([current, previous])
+
+    def retry_after(self):
+        return self.window
+
+
+# Reusable policies; limits can be tuned via settings.RATE_LIMITS
+LOGIN_POLICY = RateLimitPolicy("login", 5, 300)
+LOGIN_CLIENT_POLICY = RateLimitPolicy("login_client", 20, 300)
+MOVE_FILE_POLICY = RateLimitPolicy("move_file", 30, 60)
+GLITCH_STATE_POLICY = RateLimitPolicy("glitch_state", 60, 60)
+
+
+def rate_limit(key_prefix, max_attempts=5, timeout=300, client_policy=None):
+    """
+    Rate limiting decorator for login-style views: only failed attempts are
+    counted. The main policy counts failures per client and submitted login,
+    and a successful login (redirect to file_manager) resets only that login's
+    counter. client_policy, if given, counts every failure of the client
+    whatever the login and is never reset, so one valid account cannot be
+    used to clear the limit between guesses at other accounts.
+    Logged-in users are not limited.
+
+    A submitted attempt is counted before the view runs and the decision is
+    taken from the returned count, as in throttle, so concurrent attempts
+    cannot all slip under the limit. Attempts that are blocked or turn out
+    to be successful logins are refunded afterwards.
+
     Args:
-        key_prefix (str): Prefix for the cache key
-        max_attempts (int): Maximum number of attempts allowed
+        key_prefix (str or RateLimitPolicy): Policy or its name
+        max_attempts (int): Maximum number of failed attempts allowed
         timeout (int): Time window in seconds
+        client_policy (RateLimitPolicy): Client-wide limit on failed attempts
     """
+    policy = key_prefix if isinstance(key_prefix, RateLimitPolicy) else RateLimitPolicy(key_prefix, max_attempts, timeout)
+
+    def forbidden(limited):
+        return HttpResponseForbidden(
+            f'Too many login attempts. Please try again in {limited.window // 60} minutes.'
+        )
+
     def decorator(view_func):
         @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
-            # Get the IP address and user agent
-            ip = request.META.get('REMOTE_ADDR', '')
-            user_agent = request.META.get('HTTP_USER_AGENT', '')
-            
-            # Create a unique key using both IP and user agent
-            session_key = f'{key_prefix}_attempts_{ip}_{user_agent}'
-            timestamp_key = f'{key_prefix}_timestamp_{ip}_{user_agent}'
-            
-            # If user is already logged in, clear any rate limit
             if request.session.get('logged_in'):
-                request.session.pop(session_key, None)
-                request.session.pop(timestamp_key, None)
                 return view_func(request, *args, **kwargs)
-            
-            # Get the current attempts and timestamp
-            attempts = request.session.get(session_key, 0)
-            last_attempt = request.session.get(timestamp_key, 0)
-            current_time = time.time()
-            
-            # Reset attempts if timeout has passed
-            if current_time - last_attempt > timeout:
-                attempts = 0
-                request.session[timestamp_key] = current_time
-            
-            # If too many attempts, return error
-            if attempts >= max_attempts:
-                return HttpResponseForbidden(
-                    f'Too many login attempts. Please try again in {timeout//60} minutes.'
-                )
-            
-            # Call the view
+
+            # Page views are not attempts: they are only checked against the client-wide limit
+            if request.method != "POST":
+                if client_policy is not None and client_policy.is_limited(request):
+                    return forbidden(client_policy)
+                return view_func(request, *args, **kwargs)
+
+            login = request.POST.get('login', '')
+            # One timestamp for hit and refund so both touch the same window's counter
+            now = time.time()
+            counted = [(policy, login)]
+            if client_policy is not None:
+                counted.append((client_policy, None))
+            limited = None
+            for counter, subject in counted:
+                if counter.hit(request, now, subject=subject) > counter.limit and limited is None:
+                    limited = counter
+            if limited is not None:
+                for counter, subject in counted:
+                    counter.refund(request, now, subject=subject)
+                return forbidden(limited)
+
             response = view_func(request, *args, **kwargs)
-            
-            # If login was successful, clear the attempts
-            if response.status_code == 302 and 'file_manager' in response.url:
-                request.session.pop(session_key, None)
-                request.session.pop(timestamp_key, None)
-            else:
-                # Increment attempts if login failed
-                request.session[session_key] = attempts + 1
-                request.session[timestamp_key] = current_time
-            
+
+            # A successful login is not a failure: clear that login's counter only and refund the client-wide hit
+            if response.status_code == 302 and response.url == reverse('file_manager'):
+                policy.reset(request, subject=login)
+                if client_policy is not None:
+                    client_policy.refund(request, now)
             return response
         return _wrapped_view
-    return decorator 
\ No newline at end of file
+    return decorator
+
+
+def throttle(policy):
+    """
+    Rate limiting decorator for API endpoints: every request counts.
+    Over the limit the view is not called and a 429 JSON response
+    with Retry-After is returned.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if policy.hit(request) > policy.limit:
+                response = JsonResponse({"success": False, "error": "Слишком много запросов."}, status=429)
+                response['Retry-After'] = str(policy.retry_after())
+                return response
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+# Строка журнала: "[2013-05-01 10:00:00] OPENED: user='user1', file='a.txt'"
+_LINE_RE = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] (\w+): (.*)$", re.S)
+# Поля сообщения вида key='value'
+_FIELD_RE = re.compile(r"(\w+)='([^']*)'")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    user TEXT,
+    message TEXT NOT NULL,
+    fields TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_user_ts ON events (user, ts);
+CREATE INDEX IF NOT EXISTS idx_events_type_ts ON events (event_type, ts);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON events (ts);
+"""
+
+
+def parse_line(line):
+    """
+    Разбирает строку журнала в событие: (время, тип, пользователь, сообщение, поля)
+    или None, если строка не похожа на событие. Пользователь берётся из поля
+    user=..., а для входа в систему — из login=....
+    """
+    match = _LINE_RE.match(line.rstrip("\n"))
+    if not match:
+        return None
+    ts, event_type, message = match.groups()
+    fields = dict(_FIELD_RE.findall(message))
+    user = fields.get("user", fields.get("login"))
+    return ts, event_type, user, message, fields
+
+
+class EventStore:
+    """
+    Структурированная копия журнала событий в SQLite с индексами по
+    (пользователь, время), (тип, время) и времени. Таблица только пополняется.
+    Каждый поток работает через своё соединение; база в режиме WAL, поэтому
+    чтение не ждёт записи фонового потока журнала.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = None  # pid процесса, в котором создана схема
+
+    def _connection(self):
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, "pid", None) != pid:
+            # После fork (например, воркеры gunicorn с --preload) соединение родителя использовать нельзя
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if self._initialized != pid:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = pid
+            local.conn, local.pid = conn, pid
+        return local.conn
+
+    def append_lines(self, lines):
+        """Добавляет события из готовых строк журнала одной транзакцией; прочие строки пропускаются."""
+        rows = []
+        for line in lines:
+            event = parse_line(line)
+            if event is not None:
+                ts, event_type, user, message, fields = event
+                rows.append((ts, event_type, user, message, json.dumps(fields, ensure_ascii=False)))
+        if not rows:
+            return
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT INTO events (ts, event_type, user, message, fields) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def import_lines(self, lines):
+        """
+        Добавляет события из строк журнала, которых ещё нет в базе, — для
+        переноса журнала, записанного до появления базы (см. import_audit_log).
+        Событие определяется временем, типом и сообщением; одинаковые события
+        учитываются по числу, поэтому повторный импорт ничего не дублирует.
+        Возвращает число добавленных событий.
+        """
+        wanted = Counter()
+        events = {}
+        for line in lines:
+            event = parse_line(line)
+            if event is not None:
+                key = (event[0], event[1], event[3])
+                wanted[key] += 1
+                events[key] = event
+        if not wanted:
+            return 0
+        conn = self._connection()
+        present = Counter(conn.execute(
+            "SELECT ts, event_type, message FROM events WHERE ts BETWEEN ? AND ?",
+            (min(key[0] for key in wanted), max(key[0] for key in wanted)),
+        ).fetchall())
+        rows = []
+        for key, count in wanted.items():
+            ts, event_type, user, message, fields = events[key]
+            row = (ts, event_type, user, message, json.dumps(fields, ensure_ascii=False))
+            rows.extend([row] * (count - present[key]))
+        if rows:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO events (ts, event_type, user, message, fields) VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def query(self, user=None, event_type=None, since=None, until=None, before=None, limit=50):
+        """
+        События от новых к старым с фильтрами по пользователю, типу и интервалу
+        времени [since, until]. Постраничный вывод — по курсору before=(ts, id)
+        последнего события предыдущей страницы, поэтому глубокие страницы
+        не требуют пропуска строк через OFFSET.
+        Возвращает (события, курсор следующей страницы или None).
+        """
+        where = []
+        params = []
+        for column, value in (("user", user), ("event_type", event_type)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if since:
+            where.append("ts >= ?")
+            params.append(since)
+        if until:
+            where.append("ts <= ?")
+            params.append(until)
+        if before:
+            where.append("(ts < ? OR (ts = ? AND id < ?))")
+            params.extend((before[0], before[0], before[1]))
+        sql = "SELECT id, ts, event_type, user, message, fields FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        rows = self._connection().execute(sql, params).fetchall()
+        events = [
+            {"id": row[0], "ts": row[1], "event_type": row[2], "user": row[3], "message": row[4],
+             "fields": json.loads(row[5])}
+            for row in rows[:limit]
+        ]
+        cursor = (events[-1]["ts"], events[-1]["id"]) if len(rows) > limit else None
+        return events, cursor
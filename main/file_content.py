@@ -0,0 +1,258 @@
+import html
+import mmap
+import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Экранированные последовательности, которые встречаются в текстах терминала: \uXXXX и \n
+_UNICODE_ESCAPE_RE = re.compile(r"\\u([0-9a-fA-F]{4})")
+# Ссылки на изображения превращаются в <img>
+_IMAGE_URL_RE = re.compile(r'(https?://[^\s]+\.(?:jpg|jpeg|png|gif)(?:\?[^\s]+)?)(?=$|\s|[\'"<>])', re.IGNORECASE)
+
+
+class RangeNotSatisfiable(Exception):
+    """Запрошенный диапазон лежит за пределами файла (ответ 416)."""
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range для файла размером size.
+    Возвращает (start, end) включительно или None, если заголовка нет,
+    он некорректен или содержит несколько диапазонов — тогда отдаётся весь файл.
+    Для диапазона за пределами файла бросает RangeNotSatisfiable.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N — последние N байт
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = int(last) if last else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path, start, end, chunk_size=64 * 1024):
+    """Читает байты [start, end] файла частями по chunk_size, не загружая файл целиком."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def tokenize_content(text):
+    """
+    Готовит текст файла к выводу за один проход: раскрывает \\uXXXX и \\n
+    и выделяет ссылки на изображения. Возвращает кортеж фрагментов:
+    строки — обычный текст (выводится как текст, без разбора HTML),
+    {"img": url} — изображение. Пустые фрагменты не создаются.
+    """
+    text = _UNICODE_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 16)), text)
+    text = text.replace("\\n", "\n")
+    chunks = []
+    pos = 0
+    for match in _IMAGE_URL_RE.finditer(text):
+        if match.start() > pos:
+            chunks.append(text[pos:match.start()])
+        chunks.append({"img": match.group(1)})
+        pos = match.end()
+    if pos < len(text):
+        chunks.append(text[pos:])
+    return tuple(chunks)
+
+
+def is_blank(chunks):
+    """Во фрагментах нет ничего, кроме пробельных символов."""
+    return all(isinstance(chunk, str) and not chunk.strip() for chunk in chunks)
+
+
+def chunks_to_html(chunks):
+    """HTML для фрагментов: текст экранируется, изображения становятся <img>."""
+    parts = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            parts.append(html.escape(chunk, quote=False))
+        else:
+            parts.append(f'<img src="{html.escape(chunk["img"])}" alt="Image" style="max-width:100%; margin:5px 0;">')
+    return "".join(parts)
+
+
+# Сколько индексов строк держать в памяти одновременно
+LINE_INDEX_CACHE_SIZE = 32
+
+_line_indexes = OrderedDict()  # абсолютный путь -> ((mtime_ns, размер), LineIndex)
+_line_indexes_lock = threading.Lock()
+
+
+class LineIndex:
+    """
+    Смещения начала строк файла: offsets[i] — байтовое смещение строки i
+    (нумерация с нуля). Строится одним проходом по отображённому в память
+    файлу, после чего любая строка находится без чтения предыдущих.
+    """
+    __slots__ = ("offsets", "size")
+
+    def __init__(self, offsets, size):
+        self.offsets = offsets
+        self.size = size
+
+    @property
+    def line_count(self):
+        return len(self.offsets)
+
+    def span(self, first, count):
+        """Байтовый диапазон [start, end) строк first .. first + count - 1."""
+        start = self.offsets[first] if first < len(self.offsets) else self.size
+        last = first + count
+        end = self.offsets[last] if last < len(self.offsets) else self.size
+        return start, end
+
+
+def build_line_index(path):
+    """Сканирует файл через mmap и собирает смещения начала строк."""
+    offsets = array("Q")
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return LineIndex(offsets, 0)
+        offsets.append(0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            find = mm.find
+            append = offsets.append
+            pos = find(b"\n")
+            while pos != -1 and pos + 1 < size:
+                append(pos + 1)
+                pos = find(b"\n", pos + 1)
+    return LineIndex(offsets, size)
+
+
+def get_line_index(path):
+    """
+    Индекс строк файла из кэша. Ключ проверки — (mtime_ns, размер):
+    изменённый файл индексируется заново.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    with _line_indexes_lock:
+        cached = _line_indexes.get(path)
+        if cached is not None and cached[0] == signature:
+            _line_indexes.move_to_end(path)
+            return cached[1]
+    index = build_line_index(path)
+    with _line_indexes_lock:
+        _line_indexes[path] = (signature, index)
+        _line_indexes.move_to_end(path)
+        while len(_line_indexes) > LINE_INDEX_CACHE_SIZE:
+            _line_indexes.popitem(last=False)
+    return index
+
+
+def read_lines(path, first, count):
+    """
+    Возвращает (текст строк first .. first + count - 1, всего строк в файле).
+    Нужный кусок читается одним seek + read по индексу строк.
+    """
+    index = get_line_index(path)
+    start, end = index.span(first, count)
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return data.decode("utf-8", errors="replace"), index.line_count
+
+
+class ContentCache:
+    """
+    LRU-кэш содержимого текстовых файлов для file_view.
+
+    Хранится результат render(текст) — по умолчанию сам текст; file_view
+    кэширует сразу готовые фрагменты (см. tokenize_content).
+    Запись действительна, пока у файла прежние (mtime_ns, размер) — это
+    проверяется одним stat при каждом чтении. Общий объём ограничен
+    max_bytes, файлы больше max_entry_bytes не кэшируются. Объём считается
+    приближённо, по размеру файлов на диске: сами фрагменты в памяти
+    занимают больше (заголовки объектов Python, до 4 байт на символ
+    в строках). Представления, изменяющие файлы, вызывают invalidate().
+    """
+
+    def __init__(self, max_bytes, max_entry_bytes, render=None):
+        self.max_bytes = max_bytes
+        self.render = render
+        self.max_entry_bytes = max_entry_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # абсолютный путь -> (mtime_ns, размер, содержимое)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def read(self, path):
+        """Текст файла (UTF-8), обработанный render, из кэша или с диска."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        if self.render is not None:
+            content = self.render(content)
+        if st.st_size <= self.max_entry_bytes:
+            with self._lock:
+                self._remove(path)
+                self._entries[path] = (st.st_mtime_ns, st.st_size, content)
+                self._bytes += st.st_size
+                while self._bytes > self.max_bytes and len(self._entries) > 1:
+                    _, (_, size, _) = self._entries.popitem(last=False)
+                    self._bytes -= size
+                    self.evictions += 1
+        return content
+
+    def invalidate(self, path):
+        """Файл path изменён, перемещён или удалён."""
+        with self._lock:
+            self._remove(os.path.abspath(path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _remove(self, path):
+        cached = self._entries.pop(path, None)
+        if cached is not None:
+            self._bytes -= cached[1]
@@ -0,0 +1,373 @@
+import hashlib
+import itertools
+import os
+import threading
+import time
+
+from .node_handles import make_handle
+
+# Счётчик поколений уровней дерева: каждый собранный уровень получает новый номер
+_generations = itertools.count(1)
+
+
+class TreeLevel(list):
+    """
+    Список узлов одного уровня дерева — содержимое каталога path.
+    Полный путь каталога хранится один раз на уровень, узлы восстанавливают
+    свои пути из него по требованию.
+    generation уникален для каждой сборки уровня: пока уровень не пересобран,
+    номер не меняется. По нему кэшируется отрисованный HTML уровня без
+    вложенных уровней (см. main/templatetags/file_tree_tags.py).
+    """
+    __slots__ = ("generation", "path")
+
+    def __init__(self, nodes=(), path=""):
+        super().__init__(nodes)
+        self.generation = next(_generations)
+        self.path = path
+
+
+class FileNode:
+    """
+    Компактный узел-файл: только имя и ссылка на уровень-родитель.
+    Поддерживает и прежний доступ как к словарю: node["name"], node["path"].
+    """
+    __slots__ = ("name", "level")
+    type = "file"
+
+    def __init__(self, name, level):
+        self.name = name
+        self.level = level
+
+    @property
+    def path(self):
+        return os.path.join(self.level.path, self.name)
+
+    # Для папок и файлов полный путь вычисляется одинаково
+    full_path = path
+
+    @property
+    def handle(self):
+        """Дескриптор узла для URL (см. main/node_handles.py)."""
+        return make_handle(self.path)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def as_dict(self):
+        """Узел в прежнем формате словаря (для JSON и отладки)."""
+        return {"name": self.name, "type": "file", "path": self.path}
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.path!r}>"
+
+
+class DirNode(FileNode):
+    """
+    Узел-папка. children — TreeLevel с содержимым папки или пустой кортеж,
+    если содержимое не загружено (lazy=True). is_hidden заполняется только
+    в режиме суперадмина.
+    """
+    __slots__ = ("children", "is_hidden", "lazy")
+    type = "dir"
+
+    def __init__(self, name, level, children=(), is_hidden=False, lazy=False):
+        super().__init__(name, level)
+        self.children = children
+        self.is_hidden = is_hidden
+        self.lazy = lazy
+
+    def as_dict(self):
+        node = {"name": self.name, "type": "dir", "full_path": self.full_path,
+                "children": [child.as_dict() for child in self.children]}
+        if self.lazy:
+            node["lazy"] = True
+        return node
+
+
+def _list_dir(path):
+    """
+    Читает каталог за один проход os.scandir.
+    Возвращает (папки, файлы) — кортежи имён, отсортированные по имени
+    без учёта регистра. Тип элемента берётся из кэша DirEntry.
+    """
+    dirs = []
+    files = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            (dirs if is_dir else files).append(entry.name)
+    dirs.sort(key=str.lower)
+    files.sort(key=str.lower)
+    return tuple(dirs), tuple(files)
+
+
+def _rel_prefix(path, files_root):
+    rel = os.path.relpath(path, files_root)
+    return "" if rel == os.curdir else rel + os.sep
+
+
+def _assemble(path, rel_prefix, hidden, show_hidden, listdir, children=None, lazy=False):
+    """
+    Собирает узлы одного уровня; listdir(path) возвращает (папки, файлы).
+    children(full_path, rel_prefix) строит содержимое вложенной папки
+    (по умолчанию — рекурсивно этой же функцией).
+    При lazy=True читается только один уровень: у папок пустой список children
+    и флаг lazy — их содержимое клиент запрашивает отдельно.
+    """
+    tree = TreeLevel(path=path)
+    try:
+        dirs, files = listdir(path)
+    except Exception as e:
+        print("Ошибка при построении дерева:", e)
+        return tree
+    if children is None:
+        def children(child_path, child_prefix):
+            return _assemble(child_path, child_prefix, hidden, show_hidden, listdir)
+
+    for name in dirs:
+        rel_path = rel_prefix + name
+        is_hidden = rel_path in hidden
+        if is_hidden and not show_hidden:
+            continue  # обычные пользователи не видят скрытые папки
+        if lazy:
+            node = DirNode(name, tree, lazy=True)
+        else:
+            node = DirNode(name, tree, children(os.path.join(path, name), rel_path + os.sep))
+        node.is_hidden = show_hidden and is_hidden
+        tree.append(node)
+    tree.extend(FileNode(name, tree) for name in files)
+    return tree
+
+
+def scan_tree(path, files_root, hidden=frozenset(), show_hidden=False):
+    """
+    Строит дерево файлов и папок за один проход os.scandir на каталог.
+    Тип элемента берётся из кэша DirEntry, поэтому лишних stat-вызовов нет.
+    hidden — набор скрытых папок (пути относительно files_root), загруженный
+    один раз на всё построение; show_hidden=True — режим суперадмина:
+    скрытые папки остаются в дереве и помечаются флагом is_hidden.
+    Относительные пути наращиваются по мере спуска, без os.path.relpath.
+    Узлы — FileNode/DirNode, полные пути вычисляются по требованию.
+    """
+    return _assemble(path, _rel_prefix(path, files_root), hidden, show_hidden, _list_dir)
+
+
+def dedupe_roots(paths):
+    """
+    Нормализует корневые папки и убирает повторы и вложенные корни:
+    папка внутри другого корня уже входит в его дерево.
+    Порядок первых вхождений сохраняется.
+    """
+    normalized = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if path not in normalized:
+            normalized.append(path)
+    return [path for path in normalized
+            if not any(path.startswith(other + os.sep) for other in normalized if other != path)]
+
+
+def _tree_dirs(tree):
+    """Полные пути всех папок дерева."""
+    stack = [tree]
+    while stack:
+        for node in stack.pop():
+            if node.type == "dir":
+                yield node.full_path
+                stack.append(node.children)
+
+
+class TreeCache:
+    """
+    Кэш деревьев файлов в памяти процесса.
+
+    Хранит три уровня:
+    - содержимое каждого прочитанного каталога вместе с его mtime;
+    - собранный уровень дерева для каждого каталога (TreeLevel);
+    - собранные деревья по ключу (корень, режим суперадмина).
+
+    Представления, изменяющие файлы, вызывают invalidate()/forget() для
+    затронутого каталога: перечитывается только он, а пересобираются только
+    он и его предки — уровни соседних поддеревьев переиспользуются вместе
+    с их generation. Изменения в обход приложения ловятся проверкой mtime
+    всех каталогов дерева, но не чаще раза в validate_interval секунд.
+    Если задана таблица handles (NodeHandles), каждый собранный уровень
+    регистрирует в ней дескрипторы своих узлов.
+    По version и signature строятся валидаторы ETag файлового менеджера.
+    """
+
+    def __init__(self, validate_interval=2.0, handles=None):
+        self.validate_interval = validate_interval
+        self.handles = handles
+        self._lock = threading.Lock()
+        self._listings = {}  # путь каталога -> (mtime_ns, папки, файлы)
+        self._levels = {}    # (путь каталога, show_hidden, lazy) -> (hidden, TreeLevel)
+        self._trees = {}     # (корень, show_hidden) -> (дерево, hidden, время проверки)
+
+    def get_tree(self, path, files_root, hidden=frozenset(), show_hidden=False):
+        path = os.path.abspath(path)
+        key = (path, show_hidden)
+        hidden = frozenset(hidden)
+        cached = self._trees.get(key)
+        now = time.monotonic()
+        if cached is not None and cached[1] == hidden:
+            tree, _, checked_at = cached
+            if now - checked_at < self.validate_interval:
+                return tree
+            if self._validate(itertools.chain((path,), _tree_dirs(tree))):
+                self._trees[key] = (tree, hidden, now)
+                return tree
+
+        tree = self._level(path, _rel_prefix(path, files_root), hidden, show_hidden)
+        with self._lock:
+            self._trees[key] = (tree, hidden, now)
+        return tree
+
+    def get_level(self, path, files_root, hidden=frozenset(), show_hidden=False):
+        """
+        Один уровень дерева для path (см. lazy в _assemble).
+        mtime каталога проверяется при каждом вызове — это один stat.
+        """
+        path = os.path.abspath(path)
+        if path in self._listings:
+            self._validate((path,))
+        return self._level(path, _rel_prefix(path, files_root), frozenset(hidden), show_hidden, lazy=True)
+
+    def version(self, paths):
+        """
+        Версия первого уровня деревьев с корнями paths (ленивый режим) — без
+        построения деревьев: mtime самих корней, одинаковые во всех процессах.
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        self._validate([path for path in paths if path in self._listings])
+        mtimes = []
+        for path in paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def signature(self, paths, tree):
+        """
+        Подпись содержимого полного дерева tree с корнями paths: хэш путей и
+        mtime корней и всех папок дерева. Любое изменение в дереве меняет mtime
+        какой-нибудь из этих папок, поэтому подпись зависит только от
+        содержимого и одинакова во всех процессах, а не от истории кэша.
+        """
+        dirs = sorted({os.path.abspath(path) for path in paths}.union(_tree_dirs(tree)))
+        digest = hashlib.blake2b(digest_size=12)
+        for path in dirs:
+            cached = self._listings.get(path)
+            if cached is not None:
+                mtime = cached[0]
+            else:
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    mtime = None
+            digest.update(repr((path, mtime)).encode())
+        return digest.hexdigest()
+
+    def _level(self, path, rel_prefix, hidden, show_hidden, lazy=False):
+        key = (path, show_hidden, lazy)
+        cached = self._levels.get(key)
+        if cached is not None and (cached[0] is hidden or cached[0] == hidden):
+            return cached[1]
+
+        def children(child_path, child_prefix):
+            return self._level(child_path, child_prefix, hidden, show_hidden)
+
+        level = _assemble(path, rel_prefix, hidden, show_hidden, self._listing, children, lazy)
+        if self.handles is not None:
+            self.handles.register_level(level)
+        if path in self._listings:
+            with self._lock:
+                self._levels[key] = (hidden, level)
+        return level
+
+    def _listing(self, path):
+        cached = self._listings.get(path)
+        if cached is not None:
+            return cached[1], cached[2]
+        # mtime снимается до чтения, чтобы не пропустить изменения во время чтения
+        mtime = os.stat(path).st_mtime_ns
+        dirs, files = _list_dir(path)
+        with self._lock:
+            self._listings[path] = (mtime, dirs, files)
+        return dirs, files
+
+    def _validate(self, dirs):
+        """Проверяет mtime каталогов дерева; изменившиеся сбрасывает."""
+        valid = True
+        for path in dirs:
+            cached = self._listings.get(path)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if cached is None or cached[0] != mtime:
+                self.invalidate(path)
+                valid = False
+        return valid
+
+    def invalidate(self, path):
+        """Содержимое каталога path изменилось (создан, удалён или перемещён элемент)."""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._listings.pop(path, None)
+            self._drop_levels(path)
+            self._drop_trees(path)
+
+    def invalidate_visibility(self, path):
+        """Изменилась видимость папки path: содержимое каталогов прежнее, сбрасываются только деревья."""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._drop_trees(path)
+
+    def forget(self, path):
+        """Каталог path удалён или перемещён: сбрасываются он сам и всё его поддерево."""
+        path = os.path.abspath(path)
+        prefix = path + os.sep
+        with self._lock:
+            for cached_path in [p for p in self._listings if p == path or p.startswith(prefix)]:
+                del self._listings[cached_path]
+            for key in [k for k in self._levels if k[0].startswith(prefix)]:
+                del self._levels[key]
+            self._drop_levels(path)
+            self._drop_trees(path)
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+            self._levels.clear()
+            self._trees.clear()
+
+    def _drop_levels(self, path):
+        # Уровень каталога содержит уровни всех вложенных папок,
+        # поэтому вместе с ним сбрасываются уровни всех его предков
+        while True:
+            for show_hidden in (False, True):
+                for lazy in (False, True):
+                    self._levels.pop((path, show_hidden, lazy), None)
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+
+    def _drop_trees(self, path):
+        # Сбрасываются деревья, в которые входит path, и деревья с корнем внутри path
+        for key in list(self._trees):
+            root = key[0]
+            if path == root or path.startswith(root + os.sep) or root.startswith(path + os.sep):
+                del self._trees[key]
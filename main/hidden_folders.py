@@ -0,0 +1,130 @@
+import json
+import os
+import tempfile
+import threading
+
+# Базовая директория проекта
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Файл со списком скрытых папок (пути относительно FILES_FOLDER)
+HIDDEN_FOLDERS_PATH = os.path.join(BASE_DIR, "hidden_folders.json")
+
+# Ключ-метка в узле префиксного дерева: папка с этим путём скрыта
+_HIDDEN = None
+
+
+class HiddenFolders:
+    """
+    Неизменяемый индекс скрытых папок.
+    paths — frozenset относительных путей (для точной проверки и для TreeCache),
+    рядом префиксное дерево по компонентам пути: проверка «скрыта ли папка
+    или любой её предок» проходит путь один раз, за O(глубины).
+    signature — (inode, mtime_ns, size) файла, по которому построен индекс.
+    """
+    __slots__ = ("paths", "signature", "generation", "_trie")
+
+    def __init__(self, paths=(), signature=None, generation=0):
+        self.paths = frozenset(os.path.normpath(p) for p in paths)
+        self.signature = signature
+        self.generation = generation
+        trie = {}
+        for path in self.paths:
+            node = trie
+            for part in path.split(os.sep):
+                node = node.setdefault(part, {})
+            node[_HIDDEN] = True
+        self._trie = trie
+
+    def __contains__(self, rel_path):
+        return rel_path in self.paths
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def is_hidden(self, rel_path):
+        """
+        Скрыта ли папка rel_path или любая из папок, в которые она вложена.
+        rel_path — путь относительно FILES_FOLDER или кортеж его компонентов.
+        """
+        if isinstance(rel_path, str):
+            rel_path = os.path.normpath(rel_path).split(os.sep)
+        node = self._trie
+        for part in rel_path:
+            node = node.get(part)
+            if node is None:
+                return False
+            if _HIDDEN in node:
+                return True
+        return False
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    # inode меняется при каждой атомарной замене файла — запись одинакового
+    # размера в пределах одной отметки mtime тоже будет замечена
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def load_hidden_folders(path, signature=None, generation=0):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            paths = json.load(f)
+    except Exception:
+        paths = []
+    return HiddenFolders(paths, signature, generation)
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_hidden_folders():
+    """
+    Актуальный индекс скрытых папок. Файл перечитывается, только если
+    изменилась его подпись (см. _file_signature), — проверка стоит один stat.
+    """
+    global _index
+    signature = _file_signature(HIDDEN_FOLDERS_PATH)
+    index = _index
+    if index is not None and index.signature == signature:
+        return index
+    with _lock:
+        index = _index
+        if index is None or index.signature != signature:
+            generation = index.generation + 1 if index is not None else 1
+            index = load_hidden_folders(HIDDEN_FOLDERS_PATH, signature, generation)
+            _index = index
+    return index
+
+
+def save_hidden_folders(paths):
+    """
+    Сохраняет список скрытых папок атомарно: запись во временный файл в той
+    же папке и os.replace поверх старого. Другие процессы читают либо старый,
+    либо новый файл целиком, но никогда не недописанный.
+    """
+    global _index
+    directory = os.path.dirname(HIDDEN_FOLDERS_PATH)
+    fd, tmp = tempfile.mkstemp(prefix=".hidden_folders.", suffix=".tmp", dir=directory)
+    try:
+        os.chmod(tmp, 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(sorted(paths), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, HIDDEN_FOLDERS_PATH)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    with _lock:
+        generation = _index.generation + 1 if _index is not None else 1
+        _index = HiddenFolders(paths, _file_signature(HIDDEN_FOLDERS_PATH), generation)
+    return _index
@@ -0,0 +1,260 @@
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
+
+# Строка события начинается с метки времени: "[2013-05-01 10:00:00] OPENED: ..."
+_EVENT_RE = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] ")
+_SEGMENT_RE = re.compile(r"\.(\d{6})\.gz$")
+
+
+def _event_time(line):
+    match = _EVENT_RE.match(line)
+    return match.group(1) if match else None
+
+
+def _split_events(text):
+    """
+    Делит текст журнала на события. Сообщение может содержать переводы строк
+    (после раскрытия \\n), поэтому строки без метки времени относятся к предыдущему событию.
+    """
+    events = []
+    for line in text.splitlines():
+        if events and _event_time(line) is None:
+            events[-1] += "\n" + line
+        else:
+            events.append(line)
+    return events
+
+
+def segment_path(path, number):
+    return f"{path}.{number:06d}.gz"
+
+
+def index_path(segment):
+    return segment[:-len(".gz")] + ".idx"
+
+
+def list_segments(path):
+    """Номера архивных сегментов журнала path по возрастанию (1 — самый старый)."""
+    directory, name = os.path.split(path)
+    numbers = []
+    try:
+        entries = os.listdir(directory or os.curdir)
+    except OSError:
+        return numbers
+    for entry in entries:
+        if entry.startswith(name + "."):
+            match = _SEGMENT_RE.search(entry)
+            if match and entry == os.path.basename(segment_path(name, int(match.group(1)))):
+                numbers.append(int(match.group(1)))
+    return sorted(numbers)
+
+
+def read_index(segment):
+    try:
+        with open(index_path(segment), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json_atomic(path, data):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def rotate(path, max_segments=None):
+    """
+    Переносит текущий журнал в новый сжатый сегмент path.NNNNNN.gz и пишет
+    рядом индекс path.NNNNNN.idx: метки времени первого и последнего события,
+    смещение сегмента в общем потоке журнала (в байтах несжатого текста),
+    его размер и число событий. Сегменты сверх max_segments удаляются, начиная
+    со старых. Возвращает путь нового сегмента или None, если журнал пуст.
+    """
+    # Журнал сначала атомарно переименовывается: запись в path можно сразу продолжать
+    pending = f"{path}.rotating{os.getpid()}"
+    try:
+        os.rename(path, pending)
+    except FileNotFoundError:
+        return None
+    with open(pending, "r", encoding="utf-8", errors="replace") as f:
+        events = _split_events(f.read())
+    if not events:
+        os.remove(pending)
+        return None
+    numbers = list_segments(path)
+    offset = 0
+    if numbers:
+        previous = read_index(segment_path(path, numbers[-1]))
+        if previous:
+            offset = previous["offset"] + previous["size"]
+    number = (numbers[-1] if numbers else 0) + 1
+    # Номер сегмента занимается через O_EXCL — на случай ротации из нескольких процессов
+    while True:
+        segment = segment_path(path, number)
+        try:
+            fd = os.open(segment, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            break
+        except FileExistsError:
+            number += 1
+    with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as gz, open(pending, "rb") as src:
+        shutil.copyfileobj(src, gz)
+    _write_json_atomic(index_path(segment), {
+        "first": _event_time(events[0]),
+        "last": _event_time(events[-1]),
+        "offset": offset,
+        "size": os.path.getsize(pending),
+        "events": len(events),
+    })
+    # Переименованный журнал удаляется только после записи сегмента: при ошибке сжатия он остаётся на диске
+    os.remove(pending)
+    if max_segments:
+        for old in list_segments(path)[:-max_segments]:
+            old_segment = segment_path(path, old)
+            for leftover in (old_segment, index_path(old_segment)):
+                try:
+                    os.remove(leftover)
+                except FileNotFoundError:
+                    pass
+    return segment
+
+
+def _as_timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+class LogReader:
+    """
+    Чтение журнала вместе с архивными сегментами.
+    Метки времени — строки "ГГГГ-ММ-ДД ЧЧ:ММ:СС" (как в журнале, со сдвигом
+    на 12 лет) или datetime. По индексам сегментов открываются только те,
+    что пересекаются с запрошенным интервалом.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def segments(self):
+        """[(путь сегмента, индекс)] от старых к новым; сегменты без индекса пропускаются."""
+        result = []
+        for number in list_segments(self.path):
+            segment = segment_path(self.path, number)
+            index = read_index(segment)
+            if index is not None:
+                result.append((segment, index))
+        return result
+
+    def _segment_events(self, segment):
+        with gzip.open(segment, "rt", encoding="utf-8", errors="replace") as f:
+            return _split_events(f.read())
+
+    def _current_events(self):
+        try:
+            with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+                return _split_events(f.read())
+        except FileNotFoundError:
+            return []
+
+    def batches(self):
+        """[(источник, события)] всего журнала: по пачке на сегмент от старых к новым, затем текущий файл."""
+        for segment, _ in self.segments():
+            yield segment, self._segment_events(segment)
+        yield self.path, self._current_events()
+
+    def read_range(self, start=None, end=None):
+        """События с меткой времени в интервале [start, end]; None — без ограничения."""
+        start, end = _as_timestamp(start), _as_timestamp(end)
+
+        def in_range(ts):
+            return ts is not None and (start is None or ts >= start) and (end is None or ts <= end)
+
+        events = []
+        for segment, index in self.segments():
+            if (end is not None and index["first"] and index["first"] > end) or \
+                    (start is not None and index["last"] and index["last"] < start):
+                continue
+            events.extend(e for e in self._segment_events(segment) if in_range(_event_time(e)))
+        events.extend(e for e in self._current_events() if in_range(_event_time(e)))
+        return events
+
+    def tail(self, count):
+        """Последние count событий: сегменты читаются от новых к старым, пока событий не хватает."""
+        if count <= 0:
+            return []
+        parts = [self._current_events()]
+        collected = len(parts[0])
+        for segment, index in reversed(self.segments()):
+            if collected >= count:
+                break
+            parts.append(self._segment_events(segment))
+            collected += len(parts[-1])
+        events = [event for part in reversed(parts) for event in part]
+        return events[-count:]
+
+    def _base_offset(self):
+        """Смещение начала текущего файла в общем потоке журнала (конец последнего сегмента)."""
+        numbers = list_segments(self.path)
+        if not numbers:
+            return 0
+        index = read_index(segment_path(self.path, numbers[-1]))
+        return index["offset"] + index["size"] if index else 0
+
+    def end_cursor(self):
+        """Курсор конца журнала: смещение в байтах от начала общего потока."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            size = 0
+        return self._base_offset() + size
+
+    def read_from(self, cursor, max_bytes=1024 * 1024):
+        """
+        События, дописанные после курсора cursor (смещение в общем потоке
+        журнала, см. end_cursor). Возвращает (события, новый курсор).
+        Курсор переживает ротацию: то, что успело уйти в сжатый сегмент,
+        дочитывается из него. Если курсор указывает за конец журнала (файл
+        обрезали в обход ротации), чтение начинается с начала текущего файла.
+        Возвращаются только целые строки; из текущего файла за раз читается
+        не больше max_bytes.
+        """
+        for _ in range(2):
+            base = self._base_offset()
+            start = None
+            chunks = []
+            if cursor < base:
+                for segment, index in self.segments():
+                    segment_end = index["offset"] + index["size"]
+                    if segment_end <= cursor:
+                        continue
+                    position = max(cursor, index["offset"])
+                    if start is None:
+                        start = position
+                    with gzip.open(segment, "rb") as f:
+                        f.seek(position - index["offset"])
+                        chunks.append(f.read())
+            try:
+                with open(self.path, "rb") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    position = max(cursor - base, 0)
+                    if position > size:
+                        position = 0
+                    if start is None:
+                        start = base + position
+                    f.seek(position)
+                    chunks.append(f.read(max_bytes))
+            except FileNotFoundError:
+                if start is None:
+                    start = base
+            # Если во время чтения прошла ротация, читаем заново уже по новым сегментам
+            if self._base_offset() == base:
+                break
+        data = b"".join(chunks)
+        cut = data.rfind(b"\n") + 1
+        return _split_events(data[:cut].decode("utf-8", errors="replace")), start + cut
@@ -0,0 +1,144 @@
+import atexit
+import codecs
+import os
+import queue
+import threading
+import time
+
+from .log_rotation import rotate
+
+# Что делать, если очередь записи заполнена
+OVERFLOW_BLOCK = "block"  # ждать, пока фоновый поток освободит место
+OVERFLOW_DROP = "drop"    # отбросить строку и увеличить счётчик dropped
+OVERFLOW_SYNC = "sync"    # записать строку сразу, в потоке запроса
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP, OVERFLOW_SYNC)
+
+_STOP = object()
+
+
+def decode_escapes(line):
+    """Раскрывает escape-последовательности (\\uXXXX, \\n) так же, как прежний log_event."""
+    try:
+        return codecs.decode(line, "unicode_escape")
+    except Exception:
+        return line
+
+
+class LogWriter:
+    """
+    Буферизованная запись строк журнала в файл фоновым потоком.
+
+    write() только кладёт строку в ограниченную очередь. Фоновый поток
+    забирает строки пачками и дописывает их в файл одним открытием:
+    пачка сбрасывается, когда набралось batch_size строк или прошло
+    flush_interval секунд. При завершении процесса (atexit) очередь
+    дописывается до конца. prepare(line) применяется к строке уже в
+    фоновом потоке. Поведение при заполненной очереди задаёт overflow
+    (см. OVERFLOW_POLICIES). Если задан max_bytes, файл, доросший до этого
+    размера, переносится в сжатый сегмент (см. main/log_rotation.py);
+    хранится не больше max_segments сегментов. Каждый sink из sinks получает
+    записанную пачку строк (например, EventStore.append_lines).
+    """
+
+    def __init__(self, path, max_queue=10000, batch_size=500, flush_interval=1.0,
+                 overflow=OVERFLOW_BLOCK, prepare=decode_escapes, max_bytes=None, max_segments=None,
+                 sinks=()):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {overflow!r}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.prepare = prepare
+        self.max_bytes = max_bytes
+        self.max_segments = max_segments
+        self.sinks = tuple(sinks)
+        self.dropped = 0
+        self._queue = queue.Queue(max_queue)
+        self._file_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def write(self, line):
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(line)
+            return
+        except queue.Full:
+            pass
+        if self.overflow == OVERFLOW_BLOCK:
+            self._queue.put(line)
+        elif self.overflow == OVERFLOW_SYNC:
+            self._write_batch([line])
+        else:
+            self.dropped += 1
+
+    def flush(self):
+        """Дожидается, пока все поставленные в очередь строки будут записаны."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """Дописывает очередь и останавливает фоновый поток."""
+        thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        thread.join()
+        self._thread = None
+
+    def _ensure_thread(self):
+        # После fork поток родителя в дочернем процессе не существует — запускаем свой
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        get = self._queue.get
+        while True:
+            batch = [get()]
+            deadline = time.monotonic() + self.flush_interval
+            stop = batch[0] is _STOP
+            while not stop and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                stop = item is _STOP
+            lines = [line for line in batch if line is not _STOP]
+            if lines:
+                self._write_batch(lines)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, lines):
+        if self.prepare:
+            lines = [self.prepare(line) for line in lines]
+        data = "".join(lines)
+        try:
+            with self._file_lock:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(data)
+                    size = f.tell()
+                if self.max_bytes and size >= self.max_bytes:
+                    rotate(self.path, self.max_segments)
+        except Exception as e:
+            print("Log write error:", e)
+        for sink in self.sinks:
+            try:
+                sink(lines)
+            except Exception as e:
+                print("Log sink error:", e)
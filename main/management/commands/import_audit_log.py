@@ -0,0 +1,29 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main.event_store import EventStore
+from main.log_rotation import LogReader
+
+
+class Command(BaseCommand):
+    help = (
+        "Переносит в базу аудита (EVENT_STORE_PATH) события из журнала logs.txt и его сжатых "
+        "сегментов, записанные до её появления. События, которые уже есть в базе, пропускаются, "
+        "поэтому команду можно запускать повторно."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=os.path.join(settings.BASE_DIR, "logs", "logs.txt"),
+                            help="путь к журналу (сегменты ищутся рядом с ним)")
+
+    def handle(self, *args, **options):
+        os.makedirs(os.path.dirname(settings.EVENT_STORE_PATH), exist_ok=True)
+        store = EventStore(settings.EVENT_STORE_PATH)
+        total = 0
+        for source, events in LogReader(options["log"]).batches():
+            added = store.import_lines(events)
+            total += added
+            self.stdout.write(f"{os.path.basename(source)}: {len(events)} событий, добавлено {added}")
+        self.stdout.write(f"Всего добавлено: {total}")
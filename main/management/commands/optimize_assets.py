@@ -0,0 +1,36 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main.asset_variants import optimize_assets
+
+
+class Command(BaseCommand):
+    help = (
+        "Создаёт оптимизированные варианты фонов групп (background_*.gif) и логотипов (logo_*.png): "
+        "анимированный WebP, GIF с урезанной палитрой, кадр-заставку и пережатые PNG, "
+        "и записывает их в манифест ASSET_VARIANTS_MANIFEST. Нужен Pillow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", default=os.path.join(settings.STATICFILES_DIRS[0], "images"),
+                            help="папка с исходными изображениями")
+        parser.add_argument("--colors", type=int, default=64, help="число цветов палитры GIF (2-256)")
+        parser.add_argument("--quality", type=int, default=75, help="качество WebP с потерями (1-100)")
+        parser.add_argument("--force", action="store_true", help="пересоздать варианты неизменившихся файлов")
+
+    def handle(self, *args, **options):
+        if not 2 <= options["colors"] <= 256:
+            raise CommandError("--colors должно быть от 2 до 256")
+        if not 1 <= options["quality"] <= 100:
+            raise CommandError("--quality должно быть от 1 до 100")
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise CommandError("Для оптимизации изображений нужен Pillow: pip install Pillow")
+        optimize_assets(
+            options["source"], settings.ASSET_VARIANTS_MANIFEST,
+            colors=options["colors"], quality=options["quality"], force=options["force"],
+            log=self.stdout.write,
+        )
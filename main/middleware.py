@@ -1,13 +1,25 @@
+import mimetypes
+import os
+import threading
+
 from django.shortcuts import redirect
 from django.urls import reverse
-from django.core.cache import cache
 from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.functional import SimpleLazyObject
+
+from .static_storage import ENCODINGS
+from .user_context import get_user_context
 
 class LoginRequiredMiddleware:
     """
     Если пользователь не авторизован (нет сессионного ключа 'logged_in'),
     то разрешён только доступ к URL логина и URL, начинающимся на /static/ (для статики).
     Все остальные запросы перенаправляются на страницу логина.
+    Запросу добавляется request.user_context (см. main/user_context.py) —
+    он вычисляется при первом обращении, один раз на запрос.
     """
     def __init__(self, get_response):
         self.get_response = get_response
@@ -18,7 +30,9 @@ class LoginRequiredMiddleware:
         # Разрешаем доступ к статическим файлам (если URL начинается с /static/)
         if request.path.startswith("/static/"):
             return self.get_response(request)
-        
+
+        request.user_context = SimpleLazyObject(lambda: get_user_context(request.session))
+
         # Если пользователь не авторизован и запрашиваемый путь не является разрешённым, редирект на логин
         if not request.session.get("logged_in") and request.path not in self.allowed_paths:
             return redirect("login")
@@ -26,24 +40,91 @@ class LoginRequiredMiddleware:
         response = self.get_response(request)
         return response
 
-class ClearRateLimitMiddleware:
+
+class StaticFile:
+    """Файл статики в индексе StaticFilesMiddleware: путь, заголовки и сжатые варианты."""
+    __slots__ = ("path", "content_type", "etag", "cache_control", "variants")
+
+    def __init__(self, path, content_type, etag, cache_control, variants):
+        self.path = path
+        self.content_type = content_type
+        self.etag = etag
+        self.cache_control = cache_control
+        self.variants = variants  # [(кодировка, путь)] в порядке предпочтения
+
+
+class StaticFilesMiddleware:
+    """
+    Отдаёт статику из STATIC_ROOT (собранную collectstatic с
+    CompressedManifestStaticFilesStorage) до сессий и представлений:
+    - файлы с хэшем содержимого в имени (значения манифеста) получают
+      Cache-Control: public, max-age=STATIC_MAX_AGE, immutable — браузер
+      не запрашивает их повторно;
+    - остальные файлы — Cache-Control: no-cache и ETag (перепроверка ответом 304);
+    - если клиент принимает br или gzip, отдаётся заранее сжатый вариант.
+    Индекс файлов строится при первом запросе: STATIC_ROOT меняется только
+    при развёртывании, вместе с перезапуском процессов.
+    Включается настройкой STATIC_PIPELINE; при разработке статику отдаёт runserver.
+    """
     def __init__(self, get_response):
+        if not getattr(settings, "STATIC_PIPELINE", False):
+            raise MiddlewareNotUsed
         self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self._files = None
+        self._lock = threading.Lock()
 
     def __call__(self, request):
-        # Get the IP address and user agent
-        ip = request.META.get('REMOTE_ADDR', '')
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-        
-        # Clear rate limit in these cases:
-        # 1. When accessing login page with GET request
-        # 2. When session is not active
-        if (request.path == '/login/' and request.method == 'GET') or \
-           not request.session.get('logged_in'):
-            session_key = f'login_attempts_{ip}_{user_agent}'
-            timestamp_key = f'login_timestamp_{ip}_{user_agent}'
-            request.session.pop(session_key, None)
-            request.session.pop(timestamp_key, None)
-        
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        if request.method in ("GET", "HEAD") and request.path.startswith(self.prefix):
+            static_file = self.files().get(request.path[len(self.prefix):])
+            if static_file is not None:
+                return self.serve(request, static_file)
+        return self.get_response(request)
+
+    def files(self):
+        if self._files is None:
+            with self._lock:
+                if self._files is None:
+                    self._files = self.scan(settings.STATIC_ROOT)
+        return self._files
+
+    def scan(self, root):
+        """Индекс {имя относительно STATIC_URL: StaticFile} для всех файлов root."""
+        hashed = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+        immutable = f"public, max-age={settings.STATIC_MAX_AGE}, immutable"
+        files = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, root).replace(os.sep, "/")
+                stat = os.stat(path)
+                variants = [(encoding, path + suffix) for encoding, suffix in ENCODINGS
+                            if os.path.isfile(path + suffix)]
+                content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+                    content_type += "; charset=utf-8"
+                files[name] = StaticFile(
+                    path, content_type, f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"',
+                    immutable if name in hashed else "no-cache", variants,
+                )
+        return files
+
+    def serve(self, request, static_file):
+        if request.headers.get("If-None-Match") == static_file.etag:
+            response = HttpResponseNotModified()
+        else:
+            path, encoding = static_file.path, None
+            if static_file.variants:
+                accepted = {value.split(";")[0].strip() for value in request.headers.get("Accept-Encoding", "").split(",")}
+                for variant_encoding, variant_path in static_file.variants:
+                    if variant_encoding in accepted:
+                        path, encoding = variant_path, variant_encoding
+                        break
+            response = FileResponse(open(path, "rb"), content_type=static_file.content_type)
+            if encoding is not None:
+                response["Content-Encoding"] = encoding
+        if static_file.variants:
+            response["Vary"] = "Accept-Encoding"
+        response["ETag"] = static_file.etag
+        response["Cache-Control"] = static_file.cache_control
+        return response
@@ -0,0 +1,126 @@
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from django.core.cache import caches
+
+# Длина дескриптора (base64 от 9 байт) и префикс его ключа в общем кэше
+HANDLE_LENGTH = 12
+STORE_PREFIX = "node:"
+
+
+def make_handle(path):
+    """
+    Короткий дескриптор узла для URL: 12 символов base64url от BLAKE2b
+    абсолютного пути. Зависит только от пути, поэтому одинаков во всех
+    процессах и после перезапуска; вероятность совпадения для двух путей
+    (64+ бит) пренебрежимо мала.
+    """
+    digest = hashlib.blake2b(os.fsencode(os.path.abspath(path)), digest_size=9, person=b"kod-node").digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii")
+
+
+class NodeHandles:
+    """
+    Таблица дескриптор -> абсолютный путь для узлов дерева файлов.
+
+    Заполняется построителем дерева (см. TreeCache в main/file_tree.py):
+    каждый собранный уровень регистрирует свой каталог и все элементы.
+    Представления, перемещающие и удаляющие файлы, обновляют таблицу
+    через move()/discard(). Разрешение дескриптора — одно обращение к словарю.
+
+    В памяти процесса хранится не больше max_entries последних использованных
+    дескрипторов (LRU). Если задан store_alias, новые дескрипторы записываются
+    ещё и в общий для процессов кэш Django: дескриптор, выданный другим
+    процессом, до перезапуска или вытесненный из памяти, находится одним
+    запросом к нему. Неизвестный дескриптор — это None, а не обход папки
+    с файлами. Дескриптор сам по себе прав не даёт — права проверяются по
+    найденному пути.
+    """
+
+    def __init__(self, root, max_entries=100000, store_alias=None):
+        self.root = os.path.abspath(root)
+        self.max_entries = max_entries
+        self.store_alias = store_alias
+        self._paths = OrderedDict()  # дескриптор -> путь, от давно использованных к недавним
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._paths)
+
+    def _store(self):
+        return caches[self.store_alias] if self.store_alias else None
+
+    def _remember(self, entries):
+        """Добавляет пары (дескриптор, путь) в память; возвращает те, которых там не было."""
+        paths = self._paths
+        added = {}
+        with self._lock:
+            for handle, path in entries:
+                if handle in paths:
+                    paths.move_to_end(handle)
+                else:
+                    added[handle] = path
+                paths[handle] = path
+            while len(paths) > self.max_entries:
+                paths.popitem(last=False)
+        return added
+
+    def _publish(self, added):
+        store = self._store()
+        if store is not None and added:
+            store.set_many({STORE_PREFIX + handle: path for handle, path in added.items()}, timeout=None)
+
+    def register(self, path):
+        """Регистрирует путь и возвращает его дескриптор."""
+        path = os.path.abspath(path)
+        handle = make_handle(path)
+        self._publish(self._remember([(handle, path)]))
+        return handle
+
+    def register_level(self, level):
+        """Регистрирует каталог уровня дерева (TreeLevel) и все его элементы."""
+        entries = [(make_handle(node.path), node.path) for node in level]
+        if level.path:
+            entries.append((make_handle(level.path), level.path))
+        self._publish(self._remember(entries))
+
+    def resolve(self, handle):
+        """Путь по дескриптору или None, если такой узел неизвестен."""
+        with self._lock:
+            path = self._paths.get(handle)
+            if path is not None:
+                self._paths.move_to_end(handle)
+                return path
+        store = self._store()
+        if store is None or len(handle) != HANDLE_LENGTH:
+            return None
+        path = store.get(STORE_PREFIX + handle)
+        if path is not None:
+            self._remember([(handle, path)])
+        return path
+
+    def move(self, old_path, new_path):
+        """Файл или папка перемещены: дескрипторы старых путей удаляются, новый путь регистрируется."""
+        self.discard(old_path)
+        return self.register(new_path)
+
+    def discard(self, path):
+        """
+        Забывает путь и, если это папка, всё, что было внутри неё. Записи общего
+        кэша остаются: дескриптор — функция пути, и устаревшая запись лишь
+        указывает на несуществующий путь, который представления и так проверяют.
+        """
+        path = os.path.abspath(path)
+        prefix = path + os.sep
+        with self._lock:
+            self._paths.pop(make_handle(path), None)
+            stale = [h for h, p in self._paths.items() if p.startswith(prefix)]
+            for handle in stale:
+                del self._paths[handle]
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
@@ -18,10 +18,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Статика отдаётся до сессий и проверки входа (см. STATIC_PIPELINE)
+    'main.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # Ваше новое middleware:
     'main.middleware.LoginRequiredMiddleware',
-    'main.middleware.ClearRateLimitMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -51,6 +52,26 @@ STATICFILES_DIRS = [
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Статика в продакшене: collectstatic даёт файлам имена с хэшем содержимого
+# (манифест staticfiles.json) и создаёт сжатые варианты .gz/.br (см.
+# main/static_storage.py), а StaticFilesMiddleware отдаёт их из STATIC_ROOT
+# с заголовком immutable на STATIC_MAX_AGE секунд. При разработке (DEBUG)
+# статику по-прежнему отдаёт runserver без хэшей
+STATIC_PIPELINE = not DEBUG
+# Оптимизированные варианты фонов и логотипов групп (manage.py optimize_assets)
+# лежат в static/images/optimized; base.html выбирает из них по этому манифесту
+ASSET_VARIANTS_MANIFEST = os.path.join(BASE_DIR, 'static', 'images', 'optimized', 'manifest.json')
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': ('main.static_storage.CompressedManifestStaticFilesStorage' if STATIC_PIPELINE
+                    else 'django.contrib.staticfiles.storage.StaticFilesStorage'),
+    },
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -66,17 +87,120 @@ SILENCED_SYSTEM_CHECKS=[
     ]
 
 # Cache configuration
+# Кэш (а с ним сессии и счётчики ограничения частоты) хранится в файле SQLite
+# и общий для всех WSGI-процессов (см. main/cache_backends.py)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
-    }
+        'BACKEND': 'main.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    # Дескрипторы узлов дерева (?node=...) -> пути, общие для всех процессов
+    # (см. main/node_handles.py); отдельный файл, чтобы их вытеснение не задевало сессии
+    'nodes': {
+        'BACKEND': 'main.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'nodes.sqlite3'),
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 500000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    # Кэш в памяти процесса для данных, которые не нужно делить между процессами;
+    # сейчас в нём хранятся отрисованные уровни дерева (пространство имён
+    # "fragments:", см. main/templatetags/file_tree_tags.py). Ограничен по байтам
+    # общим бюджетом и бюджетами пространств имён (префиксов ключей); статистика —
+    # на странице /cache-stats/ для суперадмина. Уровни хранятся без вложенных,
+    # поэтому полное дерево занимает в кэше примерно объём своей разметки: на
+    # дереве из 1500 папок и 13500 узлов (benchmarks/bench_tree_render.py) это
+    # 2.8 MiB для уровня доступа 1, 7.7 MiB для 2, 11 MiB для 3 и суперадмина.
+    # Бюджет рассчитан на суперадмина и два уровня доступа одновременно
+    'memory': {
+        'BACKEND': 'main.cache_backends.BoundedMemoryCache',
+        'LOCATION': 'kod-memory',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_BYTES': 32 * 1024 * 1024,
+            'NAMESPACES': {
+                'fragments:': 24 * 1024 * 1024,
+            },
+        },
+    },
 }
 
 # Session configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
 
+# Файловый менеджер: дерево отдаётся по одному уровню, вложенные папки
+# подгружаются через /file-tree-children/ при раскрытии
+FILE_TREE_LAZY = True
+# Число потоков для параллельного обхода корневых папок групп пользователя
+FILE_TREE_WORKERS = 4
+# Ссылки дерева передают короткие дескрипторы узлов (?node=...) вместо полных путей.
+# В памяти процесса хранится не больше NODE_HANDLE_MAX_ENTRIES дескрипторов; дескриптор,
+# выданный другим процессом или до перезапуска, ищется в кэше NODE_HANDLE_CACHE_ALIAS
+NODE_HANDLE_MAX_ENTRIES = 100000
+NODE_HANDLE_CACHE_ALIAS = 'nodes'
+
+# Просмотр файлов: файлы больше порога (в байтах) не встраиваются в страницу,
+# а подгружаются частями через /file-stream/ с поддержкой Range
+FILE_VIEW_STREAM_THRESHOLD = 1024 * 1024
+FILE_STREAM_CHUNK_SIZE = 64 * 1024
+# Число строк на странице постраничного просмотра (?page=N / ?line=N)
+FILE_VIEW_PAGE_LINES = 1000
+# Кэш содержимого файлов в памяти процесса: общий объём и предельный размер одного файла
+# (в байтах, по размеру файлов на диске — реальный объём в памяти больше)
+FILE_CONTENT_CACHE_BYTES = 32 * 1024 * 1024
+FILE_CONTENT_CACHE_MAX_ENTRY = FILE_VIEW_STREAM_THRESHOLD
+
+# Журнал событий (logs/logs.txt) пишется фоновым потоком: размер очереди,
+# сколько строк и через сколько секунд сбрасывать на диск, и что делать
+# при заполненной очереди: "block" — ждать, "drop" — отбросить, "sync" — записать сразу
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_INTERVAL = 1.0
+LOG_OVERFLOW = "block"
+# Журнал размером от LOG_MAX_BYTES переносится в сжатый сегмент logs.txt.NNNNNN.gz
+# с индексом logs.txt.NNNNNN.idx; хранится не больше LOG_MAX_SEGMENTS сегментов
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_MAX_SEGMENTS = 50
+# Структурированная копия журнала (SQLite) и размер страницы на странице аудита /audit/.
+# В базу попадают события, записанные после её появления; более старые события
+# из logs.txt и его сегментов переносятся командой manage.py import_audit_log
+EVENT_STORE_PATH = os.path.join(BASE_DIR, "logs", "events.sqlite3")
+AUDIT_PAGE_SIZE = 50
+# Наблюдение за журналом (/log-tail/): сколько последних событий отдавать сразу
+# и через сколько секунд страница /log-monitor/ запрашивает новые. Запрос без
+# новых событий отвечает сразу и не занимает синхронный WSGI-процесс дольше,
+# чем чтение конца журнала.
+# LOG_TAIL_WAIT включает long-poll и поток SSE (?stream=1): запрос ждёт событий
+# до LOG_TAIL_TIMEOUT секунд, проверяя журнал раз в LOG_TAIL_POLL_INTERVAL секунд,
+# поток живёт до LOG_TAIL_STREAM_LIFETIME секунд и переподключается через
+# LOG_TAIL_RETRY миллисекунд. Ожидающий запрос держит процесс целиком, поэтому
+# включайте это только при развёртывании с потоками или асинхронными воркерами
+LOG_TAIL_INITIAL = 100
+LOG_TAIL_POLL_EVERY = 3
+LOG_TAIL_WAIT = False
+LOG_TAIL_TIMEOUT = 10
+LOG_TAIL_POLL_INTERVAL = 0.5
+LOG_TAIL_STREAM_LIFETIME = 60
+LOG_TAIL_RETRY = 3000
+
+# Ограничение частоты запросов (main/decorators.py): политика -> (число запросов, окно в секундах).
+# Счётчики хранятся в кэше по IP и user agent, сессия не используется.
+# Неудачные входы считаются отдельно для каждого логина ("login", сбрасывается
+# успешным входом в этот логин) и для клиента в целом ("login_client", не сбрасывается)
+RATE_LIMITS = {
+    "login": (5, 300),
+    "login_client": (20, 300),
+    "move_file": (30, 60),
+    "glitch_state": (60, 60),
+}
+
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -0,0 +1,68 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него создаются только варианты .gz
+    brotli = None
+
+# Сжимаются только текстовые и несжатые форматы; GIF и PNG уже сжаты
+COMPRESSIBLE_EXTENSIONS = frozenset({".css", ".js", ".json", ".svg", ".txt", ".map", ".wav", ".ico"})
+# Сжатый вариант сохраняется, только если он хотя бы на 5% меньше исходного файла
+MIN_COMPRESSION_RATIO = 0.95
+
+# Расширения сжатых вариантов в порядке предпочтения при отдаче (см. StaticFilesMiddleware)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Хранилище статики для collectstatic: как ManifestStaticFilesStorage даёт
+    файлам имена с хэшем содержимого (манифест staticfiles.json), а затем кладёт
+    рядом с каждым сжимаемым файлом — и исходным, и хэшированным — варианты
+    .gz и, если установлен brotli, .br. Их отдаёт StaticFilesMiddleware.
+    """
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Файла нет среди собранной статики (например, у группы нет своего фона):
+            # ссылка остаётся без хэша, как и без конвейера, вместо ошибки 500
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            for variant in self.compress(name):
+                yield name, variant, True
+
+    def compress(self, name):
+        """Создаёт сжатые варианты файла name; возвращает имена созданных вариантов."""
+        path = self.path(name)
+        with open(path, "rb") as f:
+            data = f.read()
+        compressors = [("gzip", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            compressors.append(("br", lambda d: brotli.compress(d, quality=11)))
+        suffixes = dict(ENCODINGS)
+        created = []
+        for encoding, compress in compressors:
+            variant = path + suffixes[encoding]
+            compressed = compress(data)
+            if len(compressed) >= len(data) * MIN_COMPRESSION_RATIO:
+                # Не осталось ли варианта от прошлой сборки, когда файл сжимался лучше
+                if os.path.exists(variant):
+                    os.remove(variant)
+                continue
+            with open(variant, "wb") as f:
+                f.write(compressed)
+            created.append(name + suffixes[encoding])
+        return created
@@ -0,0 +1,63 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import escape, format_html
+from django.utils.safestring import mark_safe
+
+from ..asset_variants import get_asset_variants
+
+register = template.Library()
+
+
+def _image_set(variants):
+    """CSS image-set(): браузер берёт первый поддерживаемый формат, а варианты идут по возрастанию размера."""
+    candidates = ", ".join(
+        f"url('{escape(static(variant['path']))}') type('{variant['type']}')" for variant in variants
+    )
+    return f"image-set({candidates})"
+
+
+@register.simple_tag
+def background_image(name):
+    """
+    Значение CSS background-image для фона name (путь в статике) по манифесту
+    optimize_assets: анимация в самом маленьком поддерживаемом браузером
+    формате поверх кадра-заставки — заставка маленькая и видна, пока
+    анимация загружается. Без оптимизированных вариантов — url() самого файла.
+    Браузерам без image-set() с type() нужна запасная декларация
+    background-image: url(...) перед этой (см. background_fallback).
+    """
+    assets = get_asset_variants()
+    variants = assets.variants(name)
+    if len(variants) == 1 and not assets.poster(name):
+        return mark_safe(f"url('{escape(static(variants[0]['path']))}')")
+    layers = [_image_set(variants)]
+    if assets.poster(name):
+        layers.append(_image_set(assets.poster(name)))
+    return mark_safe(", ".join(layers))
+
+
+@register.simple_tag
+def background_fallback(name):
+    """url() самого маленького варианта фона name в формате, который понимает любой браузер."""
+    return mark_safe(f"url('{escape(static(get_asset_variants().fallback(name)['path']))}')")
+
+
+@register.simple_tag
+def picture(name, alt=""):
+    """
+    <picture> для изображения name: <source> для вариантов меньше запасного
+    (по возрастанию размера, браузер берёт первый поддерживаемый) и <img>
+    с самым маленьким вариантом в общеподдерживаемом формате.
+    """
+    assets = get_asset_variants()
+    fallback = assets.fallback(name)
+    sources = [
+        format_html('<source srcset="{}" type="{}">', static(variant["path"]), variant["type"])
+        for variant in assets.variants(name)
+        if variant["path"] != fallback["path"] and variant["type"] not in (None, fallback["type"])
+        and (fallback["bytes"] is None or variant["bytes"] < fallback["bytes"])
+    ]
+    img = format_html('<img src="{}" alt="{}">', static(fallback["path"]), alt)
+    if not sources:
+        return img
+    return mark_safe("<picture>" + "".join(sources) + img + "</picture>")
@@ -0,0 +1,190 @@
+from django import template
+from django.core.cache import caches
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from ..node_handles import make_handle
+
+register = template.Library()
+
+# Отрисованные уровни дерева хранятся в кэше в памяти процесса (BoundedMemoryCache)
+# в пространстве имён "fragments:" — с бюджетом в байтах и статистикой на /cache-stats/
+FRAGMENT_CACHE_ALIAS = "memory"
+
+
+def _field(node, name):
+    """
+    Поле узла дерева. Как и в шаблонах, отсутствующее поле даёт пустую строку,
+    а не исключение.
+    """
+    try:
+        return node[name]
+    except (KeyError, TypeError, IndexError):
+        return getattr(node, name, "")
+
+
+def _handle(node, path_field):
+    """Дескриптор узла для ссылок: у FileNode/DirNode — готовое поле, у словарей — по пути."""
+    handle = getattr(node, "handle", None)
+    return handle if isinstance(handle, str) else make_handle(_field(node, path_field))
+
+
+def _links():
+    """URL действий и иконок, общие для всех узлов дерева."""
+    return {
+        "toggle": reverse("toggle_folder_visibility"),
+        "create_file": reverse("create_file"),
+        "create_folder": reverse("create_folder"),
+        "delete_folder": reverse("delete_folder"),
+        "delete_file": reverse("delete_file"),
+        "file_view": reverse("file_view"),
+        "file_add": static("images/file_add.png"),
+        "folder_add": static("images/folder_add.png"),
+        "folder_delete": static("images/folder_delete.png"),
+        "move_dest": static("images/move_dest.png"),
+        "move_file": static("images/move_file.png"),
+        "file_delete": static("images/file_delete.png"),
+    }
+
+
+def _nested(node):
+    """Вложенный уровень, который отрисовывается внутри папки, или None (файл, ленивая или пустая папка)."""
+    if _field(node, "type") != "dir" or _field(node, "lazy"):
+        return None
+    return _field(node, "children") or None
+
+
+def _render_dir(node, access_level, is_superadmin, links):
+    """
+    Разметка папки без её вложенного уровня: (до вложенного уровня, после него).
+    Если вложенного уровня нет, вторая часть — пустая строка.
+    """
+    # Дескриптор состоит из символов base64url и в URL не кодируется
+    folder = _handle(node, "full_path")
+    parts = ['<li style="margin-bottom: 5px;">\n<div class="folder-header">\n']
+    color = ' style="color: red;"' if is_superadmin and _field(node, "is_hidden") else ""
+    parts.append(
+        f'<span class="folder" data-folder="{folder}"{color} '
+        f'onclick="toggleFolder(this); playSelectionSound();">{escape(_field(node, "name"))}</span>\n'
+    )
+    if is_superadmin:
+        parts.append(
+            f'<a href="{links["toggle"]}?node={folder}" title="Скрыть/Показать папку" '
+            f'style="color:#0F0; margin-left:5px;">[toggle]</a>\n'
+        )
+    if access_level >= 2:
+        parts.append(
+            f'<a href="{links["create_file"]}?node={folder}" title="Создать файл" style="color:#0F0; margin-left:5px;">'
+            f'<img src="{links["file_add"]}" alt="Создать файл" style="width:16px;height:16px; background-color: transparent;"></a>\n'
+            f'<a href="{links["create_folder"]}?node={folder}" title="Создать папку" style="color:#0F0; margin-left:5px;">'
+            f'<img src="{links["folder_add"]}" alt="Создать папку" style="width:16px;height:16px; background-color: transparent;"></a>\n'
+        )
+    if access_level >= 3:
+        parts.append(
+            f'<a href="{links["delete_folder"]}?node={folder}" title="Удалить папку" style="color:#F00; margin-left:5px;">'
+            f'<img src="{links["folder_delete"]}" alt="Удалить папку" style="width:16px;height:16px; background-color: transparent;"></a>\n'
+        )
+    if access_level >= 2:
+        parts.append(
+            f'<button class="move-dest-btn" data-folder-node="{folder}" title="Переместить сюда" '
+            f'style="display:none; margin-left:5px; background-color: transparent; border: none;">'
+            f'<img src="{links["move_dest"]}" alt="Переместить сюда" style="width:16px;height:16px; background-color: transparent;">'
+            f'</button>\n'
+        )
+    parts.append('</div>\n')
+    if _nested(node) is not None:
+        parts.append('<div class="children" style="display:none; margin-left:20px;">\n<ul>\n')
+        return "".join(parts), '</ul>\n</div>\n</li>\n'
+    if _field(node, "lazy"):
+        parts.append('<div class="children" data-lazy="true" style="display:none; margin-left:20px;"></div>\n')
+    parts.append('</li>\n')
+    return "".join(parts), ""
+
+
+def _render_file(node, access_level, links):
+    path = _handle(node, "path")
+    parts = [
+        '<li style="margin-bottom: 5px;">\n<div class="file-entry">\n'
+        f'<a href="{links["file_view"]}?node={path}" style="color:#0F0;" onclick="playSelectionSound();">'
+        f'{escape(_field(node, "name"))}</a>\n'
+    ]
+    if access_level >= 2:
+        parts.append(
+            f'<button class="move-file-btn" data-file-node="{path}" title="Переместить файл" '
+            f'style="margin-left:5px; background-color: transparent; border: none;">'
+            f'<img src="{links["move_file"]}" alt="Переместить файл" style="width:16px;height:16px; background-color: transparent;">'
+            f'</button>\n'
+        )
+    if access_level >= 3:
+        parts.append(
+            f'<a href="{links["delete_file"]}?node={path}" title="Удалить файл" style="color:#F00; margin-left:5px;">'
+            f'<img src="{links["file_delete"]}" alt="Удалить файл" style="width:16px;height:16px; background-color: transparent;"></a>\n'
+        )
+    parts.append('</div>\n</li>\n')
+    return "".join(parts)
+
+
+def _level_segments(tree, access_level, is_superadmin, links):
+    """
+    Собственная разметка уровня без вложенных уровней: кортеж из N + 1 строк,
+    между которыми вставляются N вложенных уровней (в порядке узлов).
+    """
+    segments = []
+    current = []
+    for node in tree:
+        if _field(node, "type") == "dir":
+            head, tail = _render_dir(node, access_level, is_superadmin, links)
+            current.append(head)
+            if _nested(node) is not None:
+                segments.append("".join(current))
+                current = [tail]
+        else:
+            current.append(_render_file(node, access_level, links))
+    segments.append("".join(current))
+    return tuple(segments)
+
+
+def _render_level(tree, access_level, is_superadmin, links, fragments, out):
+    """
+    Добавляет в out HTML элементов <li> уровня вместе с вложенными уровнями.
+    Уровни TreeLevel кэшируются по (generation, уровень доступа, флаг
+    суперадмина) без вложенных уровней: каждый кусок разметки хранится в
+    кэше один раз, а пересборка уровня не задевает записи его предков.
+    """
+    generation = getattr(tree, "generation", None)
+    segments = None
+    if generation is not None:
+        key = f"fragments:{generation}:{access_level}:{int(is_superadmin)}"
+        segments = fragments.get(key)
+    if segments is None:
+        segments = _level_segments(tree, access_level, is_superadmin, links)
+        if generation is not None:
+            fragments.set(key, segments, timeout=None)
+    out.append(segments[0])
+    if len(segments) > 1:
+        nested = [children for children in map(_nested, tree) if children is not None]
+        for children, segment in zip(nested, segments[1:]):
+            _render_level(children, access_level, is_superadmin, links, fragments, out)
+            out.append(segment)
+
+
+def render_tree_html(tree, access_level=None, is_superadmin=False, nested=False):
+    """
+    Отрисовывает дерево за один проход без вложенных {% include %}.
+    Разметка совпадает с прежним рекурсивным шаблоном file_tree.html.
+    nested=True — фрагмент для вставки внутрь дерева (без id="file-tree").
+    """
+    access_level = access_level or 1  # как access_level|default:1 в шаблоне
+    out = ["<ul>\n" if nested else '<ul id="file-tree">\n']
+    _render_level(tree, access_level, is_superadmin, _links(), caches[FRAGMENT_CACHE_ALIAS], out)
+    out.append("</ul>")
+    return mark_safe("".join(out))
+
+
+@register.simple_tag(takes_context=True)
+def render_file_tree(context, tree):
+    """{% render_file_tree tree %} — дерево с правами из контекста шаблона."""
+    is_superadmin = context.get("current_user") == context.get("superadmin")
+    return render_tree_html(tree or [], context.get("access_level"), is_superadmin)
@@ -1,19 +1,80 @@
 import os
 import django
 import json
-import configparser
+import datetime
+import gzip
+import io
+from collections import OrderedDict
+import shutil
+import sys
+import tempfile
+import time
+import unittest
 from django.test.utils import override_settings
-from django.test import TestCase, Client
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.template import Context, Template
+from django.test import TestCase, Client, RequestFactory
+from django.http import HttpResponse
 from django.urls import reverse
+from django.utils.http import http_date
 from unittest.mock import patch
-from main import views
-from main.views import BASE_DIR, get_group_folders  # get_group_folders теперь возвращает список
+from urllib.parse import urlencode
+from main import views, asset_variants, authorization, config, file_content, file_tree, hidden_folders
+from main.cache_backends import ENTRY_OVERHEAD, BoundedMemoryCache, SQLiteCache
+from main.config import ConfigSnapshot
+from main.decorators import RateLimitPolicy, rate_limit
+from main.event_store import EventStore, parse_line
+from main.file_content import (
+    ContentCache, RangeNotSatisfiable, build_line_index, get_line_index, is_blank, parse_range, read_lines,
+    tokenize_content,
+)
+from main.file_tree import TreeCache, TreeLevel, dedupe_roots, scan_tree
+from main.hidden_folders import HiddenFolders, get_hidden_folders, save_hidden_folders
+from main.log_rotation import LogReader, list_segments, read_index, rotate
+from main.log_writer import LogWriter
+from main.middleware import StaticFilesMiddleware
+from main.node_handles import NodeHandles, make_handle
+from main.templatetags import file_tree_tags
+from main.templatetags.file_tree_tags import render_tree_html
+from main.user_context import UserContext, get_user_context
+from main.views import BASE_DIR, get_group_folders, process_file_content  # get_group_folders теперь возвращает список
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
 django.setup()
 
 SILENCED_CHECKS = ["admin.E402", "admin.E404", "admin.E408", "admin.E409"]
 
+# Тесты не трогают общие файлы cache/*.sqlite3: на время всех тестов модуля
+# кэши "default" (и сессии) и "nodes" — в памяти. setUpModule вызывают и
+# manage.py test, и unittest, и pytest; SQLiteCache проверяется своими
+# тестами во временной папке
+TEST_CACHES = override_settings(CACHES={
+    **settings.CACHES,
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "test-default"},
+    "nodes": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "test-nodes"},
+})
+
+
+def setUpModule():
+    TEST_CACHES.enable()
+
+
+def tearDownModule():
+    TEST_CACHES.disable()
+
+
+def user_config(access_levels=None, superadmin=None, user_groups=None, group_folders=None,
+                restricted_files=(), restricted_folders=()):
+    """
+    Подменяет снимок config.ini, по которому строится request.user_context
+    и проверяются права на действия (см. main/user_context.py, views.authorize).
+    """
+    snapshot = ConfigSnapshot({}, access_levels or {}, restricted_files, restricted_folders, superadmin,
+                              user_groups or {}, group_folders or {})
+    return patch("main.user_context.get_config", new=lambda: snapshot)
+
 #####################
 # LoginViewTests
 #####################
@@ -116,6 +177,8 @@ class FileManagerTests(TestCase):
 # DeleteFolderTests
 #####################
 class DeleteFolderTests(TestCase):
+    TESTUSER_GROUPS = {"testuser": ["group1"]}
+
     def setUp(self):
         self.client = Client()
         session = self.client.session
@@ -147,6 +210,7 @@ class DeleteFolderTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("Доступ запрещён", response.content.decode())
 
+    @user_config(user_groups=TESTUSER_GROUPS)
     @patch("main.views.os.path.exists")
     @patch("main.views.os.path.isdir")
     def test_folder_not_found(self, mock_isdir, mock_exists):
@@ -160,27 +224,23 @@ class DeleteFolderTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("Папка не найдена", response.content.decode())
 
-    @patch("main.views.read_restrictions")
+    @user_config(user_groups=TESTUSER_GROUPS, restricted_folders=["TEST_FOLDER"])
     @patch("main.views.os.path.exists")
     @patch("main.views.os.path.isdir")
-    def test_folder_restricted(self, mock_isdir, mock_exists, mock_read_restrictions):
+    def test_folder_restricted(self, mock_isdir, mock_exists):
         mock_exists.return_value = True
         mock_isdir.return_value = True
-        mock_read_restrictions.return_value = (None, ["TEST_FOLDER"])
         response = self.client.get(reverse("delete_folder") + "?folder=" + self.test_folder)
         self.assertEqual(response.status_code, 200)
         self.assertIn("Удаление этой папки запрещено", response.content.decode())
 
-    @patch("main.views.read_access_levels")
+    @user_config(access_levels={"testuser": 2}, user_groups=TESTUSER_GROUPS)
     @patch("main.views.build_file_tree")
     @patch("main.views.os.path.exists")
     @patch("main.views.os.path.isdir")
-    @patch("main.views.read_restrictions")
-    def test_insufficient_access(self, mock_read_restrictions, mock_isdir, mock_exists, mock_build_file_tree, mock_read_access_levels):
+    def test_insufficient_access(self, mock_isdir, mock_exists, mock_build_file_tree):
         mock_exists.return_value = True
         mock_isdir.return_value = True
-        mock_read_restrictions.return_value = (None, [])
-        mock_read_access_levels.return_value = {"testuser": 2}
         mock_build_file_tree.return_value = "fake_tree"
         response = self.client.get(reverse("delete_folder") + "?folder=" + self.test_folder)
         self.assertEqual(response.status_code, 200)
@@ -189,14 +249,11 @@ class DeleteFolderTests(TestCase):
     @patch("main.views.os.listdir")
     @patch("main.views.os.path.exists")
     @patch("main.views.os.path.isdir")
-    @patch("main.views.read_restrictions")
-    @patch("main.views.read_access_levels")
-    def test_folder_not_empty(self, mock_read_access_levels, mock_read_restrictions, mock_isdir, mock_exists, mock_listdir):
+    @user_config(access_levels={"testuser": 3}, user_groups=TESTUSER_GROUPS)
+    def test_folder_not_empty(self, mock_isdir, mock_exists, mock_listdir):
         mock_exists.return_value = True
         mock_isdir.return_value = True
         mock_listdir.return_value = ["file.txt"]
-        mock_read_restrictions.return_value = (None, [])
-        mock_read_access_levels.return_value = {"testuser": 3}
         response = self.client.get(reverse("delete_folder") + "?folder=" + self.test_folder)
         self.assertEqual(response.status_code, 200)
         self.assertIn("Папка не пустая, удаление запрещено", response.content.decode())
@@ -205,16 +262,12 @@ class DeleteFolderTests(TestCase):
     @patch("main.views.os.listdir")
     @patch("main.views.os.path.exists")
     @patch("main.views.os.path.isdir")
-    @patch("main.views.read_restrictions")
-    @patch("main.views.read_access_levels")
+    @user_config(access_levels={"testuser": 3}, user_groups=TESTUSER_GROUPS)
     @patch("main.views.log_event")
-    def test_successful_deletion(self, mock_log_event, mock_read_access_levels, mock_read_restrictions,
-                                 mock_isdir, mock_exists, mock_listdir, mock_rmdir):
+    def test_successful_deletion(self, mock_log_event, mock_isdir, mock_exists, mock_listdir, mock_rmdir):
         mock_exists.return_value = True
         mock_isdir.return_value = True
         mock_listdir.return_value = []
-        mock_read_restrictions.return_value = (None, [])
-        mock_read_access_levels.return_value = {"testuser": 3}
         response = self.client.get(reverse("delete_folder") + "?folder=" + self.test_folder)
         self.assertEqual(response.status_code, 302)
         self.assertEqual(response.url, reverse("file_manager"))
@@ -226,15 +279,11 @@ class DeleteFolderTests(TestCase):
     @patch("main.views.os.listdir")
     @patch("main.views.os.path.exists")
     @patch("main.views.os.path.isdir")
-    @patch("main.views.read_restrictions")
-    @patch("main.views.read_access_levels")
-    def test_deletion_exception(self, mock_read_access_levels, mock_read_restrictions,
-                                  mock_isdir, mock_exists, mock_listdir, mock_build_file_tree, mock_rmdir):
+    @user_config(access_levels={"testuser": 3}, user_groups=TESTUSER_GROUPS)
+    def test_deletion_exception(self, mock_isdir, mock_exists, mock_listdir, mock_build_file_tree, mock_rmdir):
         mock_exists.return_value = True
         mock_isdir.return_value = True
         mock_listdir.return_value = []
-        mock_read_restrictions.return_value = (None, [])
-        mock_read_access_levels.return_value = {"testuser": 3}
         mock_build_file_tree.return_value = "fake_tree"
         response = self.client.get(reverse("delete_folder") + "?folder=" + self.test_folder)
         self.assertEqual(response.status_code, 200)
@@ -262,11 +311,8 @@ class FileManagerViewTests(TestCase):
         self.assertEqual(response.url, reverse("login"))
 
     @patch("main.views.build_file_tree")
-    @patch("main.views.read_folder_visibility_config")
-    @patch("main.views.read_access_levels")
-    def test_superadmin_sees_all_files(self, mock_read_access_levels, mock_read_folder_visibility_config, mock_build_file_tree):
-        mock_read_folder_visibility_config.return_value = "admin"
-        mock_read_access_levels.return_value = {"admin": 5}
+    @user_config(access_levels={"admin": 5}, superadmin="admin")
+    def test_superadmin_sees_all_files(self, mock_build_file_tree):
         mock_build_file_tree.return_value = "superadmin_tree"
         session = self.client.session
         session["logged_in"] = True
@@ -280,11 +326,8 @@ class FileManagerViewTests(TestCase):
         self.assertEqual(response.context.get("superadmin"), "admin")
         self.assertEqual(response.context.get("access_level"), 5)
 
-    @patch("main.views.get_user_groups")
-    @patch("main.views.read_access_levels")
-    def test_user_without_group_shows_error(self, mock_read_access_levels, mock_get_user_groups):
-        mock_get_user_groups.return_value = []
-        mock_read_access_levels.return_value = {"user1": 1}
+    @user_config(access_levels={"user1": 1})
+    def test_user_without_group_shows_error(self):
         session = self.client.session
         session["logged_in"] = True
         session["login"] = "user1"
@@ -296,16 +339,9 @@ class FileManagerViewTests(TestCase):
         self.assertEqual(response.context.get("tree"), [])
 
     @patch("main.views.build_file_tree")
-    @patch("main.views.get_group_folders")
-    @patch("main.views.get_user_groups")
-    @patch("main.views.read_access_levels")
-    @patch("main.views.read_folder_visibility_config")
-    def test_user_with_group_sees_allowed_folder(self, mock_read_folder_visibility_config, mock_read_access_levels,
-                                                 mock_get_user_groups, mock_get_group_folders, mock_build_file_tree):
-        mock_read_folder_visibility_config.return_value = "admin"
-        mock_get_user_groups.return_value = ["group1"]
-        mock_get_group_folders.return_value = ["group_folder"]
-        mock_read_access_levels.return_value = {"user2": 3}
+    @user_config(access_levels={"user2": 3}, superadmin="admin", user_groups={"user2": ["group1"]},
+                 group_folders={"group1": ["group_folder"]})
+    def test_user_with_group_sees_allowed_folder(self, mock_build_file_tree):
         # Возвращаем список объектов, а не строку:
         mock_build_file_tree.return_value = [{"name": "group_tree"}]
         session = self.client.session
@@ -330,37 +366,1967 @@ class FileManagerViewTests(TestCase):
 #####################
 # GetGroupFolderTests
 #####################
-class GetGroupFolderTests(TestCase):
-    @patch("main.views.configparser.ConfigParser")
-    def test_valid_group(self, mock_config_parser):
-        fake_config = mock_config_parser.return_value
-        fake_config.has_section.return_value = True
-        fake_config.has_option.return_value = True
-        fake_config.get.return_value = " folder1 "
-        result = get_group_folders("group1")
-        self.assertEqual(result, ["folder1"])
-        expected_config_path = os.path.join(BASE_DIR, "config.ini")
-        fake_config.read.assert_called_once_with(expected_config_path)
-
-    @patch("main.views.configparser.ConfigParser")
-    def test_no_group(self, mock_config_parser):
-        result = get_group_folders(None)
-        self.assertEqual(result, [])
-
-    @patch("main.views.configparser.ConfigParser")
-    def test_missing_section(self, mock_config_parser):
-        fake_config = mock_config_parser.return_value
-        fake_config.has_section.return_value = False
-        result = get_group_folders("group1")
-        self.assertEqual(result, [])
-
-    @patch("main.views.configparser.ConfigParser")
-    def test_missing_option(self, mock_config_parser):
-        fake_config = mock_config_parser.return_value
-        fake_config.has_section.return_value = True
-        fake_config.has_option.return_value = False
-        result = get_group_folders("group1")
-        self.assertEqual(result, [])
+TEST_CONFIG = """
+[accounts]
+user1 = pass1
+
+[access_levels]
+user1 = 3
+user2 = abc
+
+[restrictions]
+restricted_files = logs.txt, Snake
+restricted_folders = c, Logs
+
+[folder_visibility]
+superadmin = admin
+
+[groups]
+group1 = user1, user2
+group2 = user1
+
+[group_folders]
+group1 =  folder1 
+group2 = folder2, folder3
+"""
+
+
+class ConfigTestMixin:
+    """Подменяет config.ini временным файлом и сбрасывает кэшированный снимок."""
+    config_text = TEST_CONFIG
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, True)
+        self.config_path = os.path.join(tmp_dir, "config.ini")
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            f.write(self.config_text)
+        patcher = patch.object(config, "CONFIG_PATH", self.config_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(config, "_snapshot", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class GetGroupFolderTests(ConfigTestMixin, TestCase):
+    def test_valid_group(self):
+        self.assertEqual(get_group_folders("group1"), ["folder1"])
+        self.assertEqual(get_group_folders("GROUP2"), ["folder2", "folder3"])
+
+    def test_no_group(self):
+        self.assertEqual(get_group_folders(None), [])
+
+    def test_missing_option(self):
+        self.assertEqual(get_group_folders("unknown"), [])
+
+    def test_missing_section(self):
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            f.write("[groups]\ngroup1 = user1\n")
+        self.assertEqual(get_group_folders("group1"), [])
+
+
+#####################
+# ConfigSnapshotTests
+#####################
+class ConfigSnapshotTests(ConfigTestMixin, TestCase):
+    def test_snapshot_contents(self):
+        snapshot = config.get_config()
+        self.assertEqual(dict(snapshot.credentials), {"user1": "pass1"})
+        self.assertEqual(dict(snapshot.access_levels), {"user1": 3, "user2": 1})
+        self.assertEqual(snapshot.restricted_files, {"logs.txt", "snake"})
+        self.assertEqual(snapshot.restricted_folders, {"C", "LOGS"})
+        self.assertEqual(snapshot.superadmin, "admin")
+        self.assertEqual(views.get_user_groups("user1"), ["group1", "group2"])
+        self.assertEqual(views.get_user_groups("user2"), ["group1"])
+        self.assertEqual(views.get_user_groups("nobody"), [])
+
+    def test_parsed_once_while_file_unchanged(self):
+        with patch("main.config.parse_config", wraps=config.parse_config) as mock_parse:
+            views.read_access_levels()
+            views.read_restrictions()
+            views.get_user_groups("user1")
+            views.get_group_folders("group1")
+            self.assertEqual(mock_parse.call_count, 1)
+
+    def test_reparsed_when_file_changes(self):
+        first = config.get_config()
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            f.write(self.config_text.replace("superadmin = admin", "superadmin = root"))
+        second = config.get_config()
+        self.assertIsNot(first, second)
+        self.assertEqual(second.superadmin, "root")
+        self.assertEqual(second.generation, first.generation + 1)
+
+    def test_snapshot_is_immutable(self):
+        snapshot = config.get_config()
+        with self.assertRaises(AttributeError):
+            snapshot.superadmin = "other"
+        with self.assertRaises(TypeError):
+            snapshot.access_levels["user1"] = 1
+
+
+#####################
+# ScanTreeTests
+#####################
+class ScanTreeTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        for folder in ("beta", "Alpha", os.path.join("Alpha", "inner"), "secret"):
+            os.mkdir(os.path.join(self.root, folder))
+        for name in ("b.txt", "A.txt", os.path.join("Alpha", "inner", "deep.txt")):
+            with open(os.path.join(self.root, name), "w", encoding="utf-8") as f:
+                f.write("x")
+
+    def test_dirs_first_then_files_sorted(self):
+        tree = scan_tree(self.root, self.root)
+        self.assertEqual([n["name"] for n in tree], ["Alpha", "beta", "secret", "A.txt", "b.txt"])
+        inner = tree[0]["children"][0]
+        self.assertEqual(inner["full_path"], os.path.join(self.root, "Alpha", "inner"))
+        self.assertEqual([node.as_dict() for node in inner["children"]], [{
+            "name": "deep.txt", "type": "file", "path": os.path.join(self.root, "Alpha", "inner", "deep.txt"),
+        }])
+
+    def test_hidden_folders_filtered_for_regular_users(self):
+        hidden = {"secret", os.path.join("Alpha", "inner")}
+        tree = scan_tree(self.root, self.root, hidden, False)
+        self.assertEqual([n["name"] for n in tree if n["type"] == "dir"], ["Alpha", "beta"])
+        self.assertEqual(tree[0]["children"], [])
+        self.assertFalse(tree[0].is_hidden)
+
+    def test_hidden_folders_flagged_for_superadmin(self):
+        tree = scan_tree(self.root, self.root, {os.path.join("Alpha", "inner")}, True)
+        self.assertFalse(tree[0]["is_hidden"])
+        self.assertTrue(tree[0]["children"][0]["is_hidden"])
+
+    def test_paths_reconstructed_from_level(self):
+        tree = scan_tree(self.root, self.root)
+        alpha = tree[0]
+        self.assertEqual(alpha.full_path, os.path.join(self.root, "Alpha"))
+        self.assertEqual(alpha.children.path, alpha.full_path)
+        deep = alpha.children[0].children[0]
+        self.assertEqual(deep.path, os.path.join(self.root, "Alpha", "inner", "deep.txt"))
+        self.assertEqual(deep["path"], deep.path)
+        self.assertEqual(deep.type, "file")
+        with self.assertRaises(KeyError):
+            deep["children"]
+
+    def test_relative_paths_from_subfolder(self):
+        tree = scan_tree(os.path.join(self.root, "Alpha"), self.root, {os.path.join("Alpha", "inner")}, False)
+        self.assertEqual(tree, [])
+
+    def test_missing_folder_returns_empty_tree(self):
+        self.assertEqual(scan_tree(os.path.join(self.root, "missing"), self.root), [])
+
+
+#####################
+# TreeCacheTests
+#####################
+class TreeCacheTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+        for folder in ("a", os.path.join("a", "sub"), "b"):
+            os.mkdir(os.path.join(self.root, folder))
+        self.cache = TreeCache(validate_interval=3600)
+
+    def names(self, tree):
+        return [n["name"] for n in tree]
+
+    def test_repeated_requests_served_from_memory(self):
+        with patch("main.file_tree._list_dir", wraps=file_tree._list_dir) as mock_list_dir:
+            first = self.cache.get_tree(self.root, self.root)
+            self.assertEqual(mock_list_dir.call_count, 4)
+            second = self.cache.get_tree(self.root, self.root)
+            self.assertIs(first, second)
+            self.assertEqual(mock_list_dir.call_count, 4)
+
+    def test_invalidate_rescans_only_changed_directory(self):
+        self.cache.get_tree(self.root, self.root)
+        os.mkdir(os.path.join(self.root, "b", "new"))
+        with patch("main.file_tree._list_dir", wraps=file_tree._list_dir) as mock_list_dir:
+            self.cache.invalidate(os.path.join(self.root, "b"))
+            tree = self.cache.get_tree(self.root, self.root)
+            # перечитаны только изменённый каталог и новая папка внутри него
+            self.assertEqual(mock_list_dir.call_count, 2)
+        self.assertEqual(self.names(tree[1]["children"]), ["new"])
+
+    def test_unchanged_subtrees_keep_their_generation(self):
+        first = self.cache.get_tree(self.root, self.root)
+        self.cache.invalidate(os.path.join(self.root, "b"))
+        second = self.cache.get_tree(self.root, self.root)
+        self.assertNotEqual(first.generation, second.generation)
+        self.assertIs(first[0]["children"], second[0]["children"])
+        self.assertIsNot(first[1]["children"], second[1]["children"])
+
+    def test_forget_drops_removed_subtree(self):
+        self.cache.get_tree(self.root, self.root)
+        sub = os.path.join(self.root, "a", "sub")
+        os.rmdir(sub)
+        self.cache.forget(sub)
+        self.cache.invalidate(os.path.join(self.root, "a"))
+        self.assertEqual(self.cache.get_tree(self.root, self.root)[0]["children"], [])
+        self.assertNotIn(sub, self.cache._listings)
+
+    def test_mtime_fallback_detects_external_changes(self):
+        self.cache.validate_interval = 0
+        self.cache.get_tree(self.root, self.root)
+        os.mkdir(os.path.join(self.root, "c"))
+        self.assertEqual(self.names(self.cache.get_tree(self.root, self.root)), ["a", "b", "c"])
+
+    def test_visibility_classes_cached_separately(self):
+        hidden = {"a"}
+        regular = self.cache.get_tree(self.root, self.root, hidden, False)
+        admin = self.cache.get_tree(self.root, self.root, hidden, True)
+        self.assertEqual(self.names(regular), ["b"])
+        self.assertEqual(self.names(admin), ["a", "b"])
+        self.assertTrue(admin[0]["is_hidden"])
+        self.assertEqual(self.names(self.cache.get_tree(self.root, self.root, set(), False)), ["a", "b"])
+
+
+@override_settings(SILENCED_SYSTEM_CHECKS=SILENCED_CHECKS)
+class TreeCacheViewInvalidationTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.files_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files_folder, True)
+        for name, value in (("FILES_FOLDER", self.files_folder), ("TREE_CACHE", TreeCache(validate_interval=3600))):
+            patcher = patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = Client()
+        session = self.client.session
+        session["logged_in"] = True
+        session["login"] = "user1"
+        session.save()
+
+    @patch("main.views.log_event")
+    def test_create_folder_invalidates_cached_tree(self, mock_log_event):
+        folder = os.path.join(self.files_folder, "folder1")
+        os.mkdir(folder)
+        self.assertEqual(views.build_file_tree(folder, "user1"), [])
+        response = self.client.post(reverse("create_folder") + "?folder=" + folder, {"folder_name": "new"})
+        self.assertEqual(response.status_code, 302)
+        tree = views.build_file_tree(folder, "user1")
+        self.assertEqual([n["name"] for n in tree], ["new"])
+
+
+#####################
+# FileTreeChildrenTests
+#####################
+@override_settings(SILENCED_SYSTEM_CHECKS=SILENCED_CHECKS, FILE_TREE_LAZY=True)
+class FileTreeChildrenTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.files_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files_folder, True)
+        for folder in ("folder1", os.path.join("folder1", "sub"), os.path.join("folder1", "sub", "deep"),
+                       os.path.join("folder1", "secret"), "other"):
+            os.mkdir(os.path.join(self.files_folder, folder))
+        with open(os.path.join(self.files_folder, "folder1", "sub", "note.txt"), "w", encoding="utf-8") as f:
+            f.write("x")
+        for name, value in (("FILES_FOLDER", self.files_folder), ("TREE_CACHE", TreeCache())):
+            patcher = patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("main.views.get_hidden_folders",
+                        return_value=HiddenFolders({os.path.join("folder1", "secret")}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+        self.login("user2")
+
+    def login(self, user):
+        session = self.client.session
+        session["logged_in"] = True
+        session["login"] = user
+        session.save()
+
+    def children(self, *parts):
+        folder = os.path.join(self.files_folder, *parts)
+        return self.client.get(reverse("file_tree_children"), {"folder": folder})
+
+    def test_returns_single_level(self):
+        response = self.children("folder1", "sub")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([(i["name"], i["type"]) for i in data["items"]], [("deep", "dir"), ("note.txt", "file")])
+        self.assertIn('data-lazy="true"', data["html"])
+        self.assertNotIn('id="file-tree"', data["html"])
+
+    def test_folder_outside_user_roots_is_forbidden(self):
+        self.assertEqual(self.children("other").status_code, 403)
+        self.assertEqual(self.client.get(reverse("file_tree_children"), {"folder": "/etc"}).status_code, 403)
+
+    def test_hidden_folder_filtered_and_forbidden_for_regular_user(self):
+        names = [i["name"] for i in self.children("folder1").json()["items"]]
+        self.assertEqual(names, ["sub"])
+        self.assertEqual(self.children("folder1", "secret").status_code, 403)
+
+    def test_superadmin_sees_hidden_folders(self):
+        self.login("admin")
+        names = [i["name"] for i in self.children("folder1").json()["items"]]
+        self.assertEqual(names, ["secret", "sub"])
+        self.assertEqual(self.children("folder1", "secret").status_code, 200)
+
+    def test_file_manager_renders_only_first_level(self):
+        response = self.client.get(reverse("file_manager"))
+        content = response.content.decode()
+        self.assertIn("sub", content)
+        self.assertIn('data-lazy="true"', content)
+        self.assertNotIn("note.txt", content)
+
+
+#####################
+# RenderTreeHtmlTests
+#####################
+class RenderTreeHtmlTests(TestCase):
+    def setUp(self):
+        self.tree = TreeLevel([
+            {"name": "Docs & <b>", "type": "dir", "full_path": "/files/Docs & <b>", "is_hidden": True,
+             "children": TreeLevel([{"name": "a.txt", "type": "file", "path": "/files/Docs & <b>/a.txt"}])},
+            {"name": "b.txt", "type": "file", "path": "/files/b.txt"},
+        ])
+
+    def test_markup_depends_on_access_level(self):
+        basic = render_tree_html(self.tree, 1, False)
+        self.assertTrue(basic.startswith('<ul id="file-tree">'))
+        self.assertNotIn("move-file-btn", basic)
+        self.assertNotIn(reverse("delete_file"), basic)
+        full = render_tree_html(self.tree, 3, False)
+        self.assertIn("move-file-btn", full)
+        self.assertIn(reverse("delete_file") + "?node=" + make_handle("/files/b.txt"), full)
+        self.assertIn(reverse("delete_folder") + "?node=" + make_handle("/files/Docs & <b>"), full)
+        self.assertNotIn("/files/", full)
+
+    def test_names_are_escaped(self):
+        html = render_tree_html(self.tree, 1, False)
+        self.assertIn("Docs &amp; &lt;b&gt;", html)
+        self.assertNotIn("<b>", html)
+
+    def test_superadmin_sees_toggle_and_hidden_marker(self):
+        self.assertNotIn("[toggle]", render_tree_html(self.tree, 1, False))
+        html = render_tree_html(self.tree, 1, True)
+        self.assertIn("[toggle]", html)
+        self.assertIn('style="color: red;"', html)
+
+    def test_levels_rendered_once_per_generation(self):
+        with patch("main.templatetags.file_tree_tags._render_file",
+                   wraps=file_tree_tags._render_file) as mock_render_file:
+            first = render_tree_html(self.tree, 2, False)
+            second = render_tree_html(self.tree, 2, False)
+            self.assertEqual(first, second)
+            self.assertEqual(mock_render_file.call_count, 2)
+            self.tree[1] = {"name": "c.txt", "type": "file", "path": "/files/c.txt"}
+            self.tree.generation = TreeLevel().generation
+            third = render_tree_html(self.tree, 2, False)
+            self.assertIn("c.txt", third)
+            # вложенный уровень не изменился и взят из кэша
+            self.assertEqual(mock_render_file.call_count, 3)
+        fragments = caches[file_tree_tags.FRAGMENT_CACHE_ALIAS].stats()["namespaces"]["fragments:"]
+        self.assertGreater(fragments["hits"], 0)
+        self.assertGreater(fragments["bytes"], 0)
+
+    def test_second_render_is_cache_hit_and_levels_stored_once(self):
+        fragments = caches[file_tree_tags.FRAGMENT_CACHE_ALIAS]
+        fragments.clear()
+        before = fragments.stats()["namespaces"]["fragments:"]
+        first = render_tree_html(self.tree, 3, True)
+        cold = fragments.stats()["namespaces"]["fragments:"]
+        self.assertEqual(cold["misses"] - before["misses"], 2)
+        self.assertEqual(cold["entries"], 2)
+        second = render_tree_html(self.tree, 3, True)
+        warm = fragments.stats()["namespaces"]["fragments:"]
+        self.assertEqual(first, second)
+        self.assertEqual(warm["hits"] - cold["hits"], 2)
+        self.assertEqual(warm["misses"], cold["misses"])
+        # запись корневого уровня не содержит разметки вложенного
+        root = fragments.get(f"fragments:{self.tree.generation}:3:1")
+        self.assertNotIn("a.txt", "".join(root))
+
+
+#####################
+# MultiRootTreeTests
+#####################
+class MultiRootTreeTests(ConfigTestMixin, TestCase):
+    config_text = """
+[groups]
+g1 = user1
+g2 = user1
+g3 = user1
+
+[group_folders]
+g1 = Science
+g2 = Science, Merc
+g3 = Science/Sub
+"""
+
+    def setUp(self):
+        super().setUp()
+        self.files_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files_folder, True)
+        for folder in ("Science", os.path.join("Science", "Sub"), "Merc"):
+            os.mkdir(os.path.join(self.files_folder, folder))
+        for name, value in (("FILES_FOLDER", self.files_folder), ("TREE_CACHE", TreeCache())):
+            patcher = patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_dedupe_roots(self):
+        roots = [os.path.join(self.files_folder, p) for p in ("Science", "Merc", "Science", "Science/Sub", "Merc/")]
+        self.assertEqual(dedupe_roots(roots), [os.path.join(self.files_folder, "Science"),
+                                               os.path.join(self.files_folder, "Merc")])
+
+    @override_settings(FILE_TREE_LAZY=False)
+    def test_shared_and_nested_folders_walked_once(self):
+        client = Client()
+        session = client.session
+        session["logged_in"] = True
+        session["login"] = "user1"
+        session.save()
+        with patch("main.views.build_file_tree", wraps=views.build_file_tree) as mock_build:
+            response = client.get(reverse("file_manager"))
+        self.assertEqual(response.status_code, 200)
+        walked = sorted(call.args[0] for call in mock_build.call_args_list)
+        self.assertEqual(walked, [os.path.join(self.files_folder, "Merc"), os.path.join(self.files_folder, "Science")])
+        self.assertEqual([node.name for node in response.context["tree"]], ["Sub"])
+
+
+#####################
+# FileStreamTests
+#####################
+class ParseRangeTests(TestCase):
+    def test_absent_or_malformed_header_means_whole_file(self):
+        for header in (None, "", "items=0-1", "bytes=5-2", "bytes=-", "bytes=0-1,4-5"):
+            self.assertIsNone(parse_range(header, 10), header)
+
+    def test_ranges(self):
+        self.assertEqual(parse_range("bytes=0-3", 10), (0, 3))
+        self.assertEqual(parse_range("bytes=4-", 10), (4, 9))
+        self.assertEqual(parse_range("bytes=8-100", 10), (8, 9))
+        self.assertEqual(parse_range("bytes=-3", 10), (7, 9))
+        self.assertEqual(parse_range("bytes=-30", 10), (0, 9))
+
+    def test_unsatisfiable(self):
+        for header in ("bytes=10-", "bytes=-0"):
+            with self.assertRaises(RangeNotSatisfiable):
+                parse_range(header, 10)
+
+
+class FileStreamTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.files_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files_folder, True)
+        for folder in ("folder1", "other"):
+            os.mkdir(os.path.join(self.files_folder, folder))
+        self.text = "Строка номер {}\n".format
+        self.data = "".join(self.text(n) for n in range(200)).encode("utf-8")
+        self.file_path = os.path.join(self.files_folder, "folder1", "big.txt")
+        with open(self.file_path, "wb") as f:
+            f.write(self.data)
+        patcher = patch.object(views, "FILES_FOLDER", self.files_folder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("main.views.log_event")
+        self.mock_log = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+        session = self.client.session
+        session["logged_in"] = True
+        session["login"] = "user2"
+        session.save()
+
+    def stream(self, file_path=None, **headers):
+        return self.client.get(reverse("file_stream"), {"file": file_path or self.file_path}, headers=headers)
+
+    @override_settings(FILE_STREAM_CHUNK_SIZE=100)
+    def test_whole_file_streamed_in_chunks(self):
+        response = self.stream()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        self.assertEqual(b"".join(chunks), self.data)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertEqual(response["Content-Length"], str(len(self.data)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_partial_content(self):
+        response = self.stream(Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.data[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.data)}")
+        response = self.stream(Range="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.data[-5:])
+
+    def test_range_not_satisfiable(self):
+        response = self.stream(Range=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.data)}")
+
+    def test_access_checks_match_file_view(self):
+        other = os.path.join(self.files_folder, "other", "x.txt")
+        with open(other, "w", encoding="utf-8") as f:
+            f.write("x")
+        self.assertEqual(self.stream(other).status_code, 403)
+        self.assertEqual(self.stream("/etc/passwd").status_code, 403)
+        self.assertEqual(self.client.get(reverse("file_stream")).status_code, 400)
+
+    @override_settings(FILE_VIEW_STREAM_THRESHOLD=1024)
+    def test_file_view_switches_to_streaming_for_large_files(self):
+        response = self.client.get(reverse("file_view"), {"file": self.file_path})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["chunks"], ())
+        self.assertEqual(response.context["file_size"], len(self.data))
+        self.assertIn("data-stream-url=", response.content.decode())
+        self.assertNotIn(self.text(0), response.content.decode())
+        self.mock_log.assert_called_once()
+
+    def test_file_view_embeds_small_files(self):
+        response = self.client.get(reverse("file_view"), {"file": self.file_path})
+        self.assertNotIn("data-stream-url=", response.content.decode())
+        self.assertTrue(response.context["chunks"][0].startswith(self.text(0)))
+
+
+#####################
+# PagedFileViewTests
+#####################
+class LineIndexTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.path = os.path.join(self.tmp_dir, "log.txt")
+        patcher = patch.object(file_content, "_line_indexes", OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, data):
+        with open(self.path, "wb") as f:
+            f.write(data)
+
+    def test_offsets(self):
+        self.write(b"a\nbb\n\nccc")
+        self.assertEqual(list(build_line_index(self.path).offsets), [0, 2, 5, 6])
+        self.write(b"a\nbb\n")
+        self.assertEqual(list(build_line_index(self.path).offsets), [0, 2])
+        self.write(b"")
+        self.assertEqual(build_line_index(self.path).line_count, 0)
+
+    def test_read_lines(self):
+        self.write("".join(f"строка {n}\n" for n in range(100)).encode("utf-8"))
+        self.assertEqual(read_lines(self.path, 10, 2), ("строка 10\nстрока 11\n", 100))
+        self.assertEqual(read_lines(self.path, 99, 5), ("строка 99\n", 100))
+        self.assertEqual(read_lines(self.path, 200, 5), ("", 100))
+
+    def test_index_cached_until_file_changes(self):
+        self.write(b"a\nb\n")
+        index = get_line_index(self.path)
+        self.assertIs(get_line_index(self.path), index)
+        self.write(b"a\nb\nc\n")
+        self.assertEqual(get_line_index(self.path).line_count, 3)
+
+
+@override_settings(FILE_VIEW_PAGE_LINES=10)
+class PagedFileViewTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.files_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files_folder, True)
+        os.mkdir(os.path.join(self.files_folder, "folder1"))
+        self.file_path = os.path.join(self.files_folder, "folder1", "log.txt")
+        with open(self.file_path, "w", encoding="utf-8") as f:
+            f.writelines(f"line {n}\n" for n in range(1, 26))
+        patcher = patch.object(views, "FILES_FOLDER", self.files_folder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch("main.views.log_event")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+        session = self.client.session
+        session["logged_in"] = True
+        session["login"] = "user2"
+        session.save()
+
+    def view(self, **params):
+        return self.client.get(reverse("file_view"), {"file": self.file_path, **params})
+
+    def test_page(self):
+        response = self.view(page=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["chunks"], ("".join(f"line {n}\n" for n in range(11, 21)),))
+        page = response.context["page"]
+        self.assertEqual((page["first_line"], page["last_line"], page["total_lines"]), (11, 20, 25))
+        self.assertIn("line=1", page["prev_url"])
+        self.assertIn("line=21", page["next_url"])
+
+    def test_line_window(self):
+        page = self.view(line=20).context["page"]
+        self.assertEqual((page["first_line"], page["last_line"]), (20, 25))
+        self.assertIsNone(page["next_url"])
+
+    def test_window_past_end_shows_last_page(self):
+        response = self.view(page=50)
+        self.assertEqual(response.context["page"]["first_line"], 21)
+        self.assertTrue(response.context["chunks"][0].startswith("line 21\n"))
+
+    def test_invalid_page(self):
+        self.assertEqual(self.view(page="abc").status_code, 400)
+
+    def test_access_denied(self):
+        session = self.client.session
+        session["login"] = "nobody"
+        session.save()
+        self.assertEqual(self.view(page=1).content.decode(), "Доступ запрещён")
+
+
+#####################
+# ContentCacheTests
+#####################
+class ContentCacheTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_hit_and_validation_by_size(self):
+        cache = ContentCache(1000, 100)
+        path = self.write("a.txt", "one")
+        self.assertEqual(cache.read(path), "one")
+        self.assertEqual(cache.read(path), "one")
+        self.write("a.txt", "three")
+        self.assertEqual(cache.read(path), "three")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"], stats["bytes"]), (1, 2, 1, 5))
+
+    def test_lru_eviction_by_byte_budget(self):
+        cache = ContentCache(25, 100)
+        paths = [self.write(f"{n}.txt", "x" * 10) for n in range(3)]
+        cache.read(paths[0])
+        cache.read(paths[1])
+        cache.read(paths[0])  # paths[1] становится самым старым
+        cache.read(paths[2])
+        self.assertEqual(cache.stats()["evictions"], 1)
+        cache.read(paths[0])
+        self.assertEqual(cache.stats()["hits"], 2)
+        cache.read(paths[1])
+        self.assertEqual(cache.stats()["misses"], 4)
+
+    def test_large_files_not_cached(self):
+        cache = ContentCache(1000, 5)
+        path = self.write("big.txt", "x" * 10)
+        cache.read(path)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_invalidate(self):
+        cache = ContentCache(1000, 100)
+        path = self.write("a.txt", "one")
+        cache.read(path)
+        cache.invalidate(path)
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 1, "evictions": 0, "entries": 0, "bytes": 0})
+
+
+class TokenizeContentTests(ConfigTestMixin, TestCase):
+    def test_text_and_images(self):
+        text = "см. http://example.com/a.PNG?x=1&y=2 и <b>жирный</b>\\nдалее \\u0041"
+        self.assertEqual(tokenize_content(text), (
+            "см. ", {"img": "http://example.com/a.PNG?x=1&y=2"}, " и <b>жирный</b>\nдалее A",
+        ))
+        self.assertEqual(tokenize_content(""), ())
+
+    def test_html_is_escaped(self):
+        html = process_file_content("<script>x</script> http://e.com/i.gif")
+        self.assertEqual(html, '&lt;script&gt;x&lt;/script&gt; '
+                               '<img src="http://e.com/i.gif" alt="Image" style="max-width:100%; margin:5px 0;">')
+
+    def test_blank(self):
+        self.assertTrue(is_blank(tokenize_content(" \n\t")))
+        self.assertFalse(is_blank(tokenize_content(" http://e.com/i.gif ")))
+
+    def test_file_view_renders_chunks_as_json(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, True)
+        cache = ContentCache(1024, 1024, render=tokenize_content)
+        path = os.path.join(tmp_dir, "a.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("<b>x</b>")
+        self.assertIs(cache.read(path), cache.read(path))
+        client = Client()
+        session = client.session
+        session["logged_in"] = True
+        session["login"] = "admin"
+        session.save()
+        with patch.object(views, "FILES_FOLDER", tmp_dir), patch.object(views, "CONTENT_CACHE", cache), \
+                patch("main.views.log_event"):
+            response = client.get(reverse("file_view"), {"file": path})
+        content = response.content.decode()
+        self.assertIn('<script id="fileContent" type="application/json">["\\u003Cb\\u003Ex\\u003C/b\\u003E"]</script>',
+                      content)
+
+
+class ContentCacheViewTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.files_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files_folder, True)
+        os.mkdir(os.path.join(self.files_folder, "folder1"))
+        self.file_path = os.path.join(self.files_folder, "folder1", "note.txt")
+        with open(self.file_path, "w", encoding="utf-8") as f:
+            f.write("hello")
+        self.cache = ContentCache(1024, 1024, render=tokenize_content)
+        for name, value in (("FILES_FOLDER", self.files_folder), ("CONTENT_CACHE", self.cache),
+                            ("TREE_CACHE", TreeCache())):
+            patcher = patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("main.views.log_event")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+        session = self.client.session
+        session["logged_in"] = True
+        session["login"] = "user1"
+        session.save()
+
+    def view(self):
+        return self.client.get(reverse("file_view"), {"file": self.file_path})
+
+    def test_repeated_views_served_from_cache(self):
+        self.view()
+        self.assertEqual(self.view().context["chunks"], ("hello",))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_edit_invalidates(self):
+        self.view()
+        response = self.client.post(reverse("edit_file") + "?" + urlencode({"file": self.file_path}),
+                                    {"content": "HELLO"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.assertEqual(self.view().context["chunks"], ("HELLO",))
+
+    def test_delete_invalidates(self):
+        self.view()
+        self.client.get(reverse("delete_file"), {"file": self.file_path})
+        self.assertFalse(os.path.exists(self.file_path))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+
+#####################
+# LogWriterTests
+#####################
+class LogWriterTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.path = os.path.join(self.tmp_dir, "logs.txt")
+
+    def read(self):
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_log_event_keeps_line_format(self):
+        writer = LogWriter(self.path, flush_interval=0.01)
+        self.addCleanup(writer.close)
+        with patch.object(views, "LOG_WRITER", writer), \
+                patch("main.views.get_adjusted_time", return_value="2013-05-01 10:00:00"):
+            views.log_event("OPENED", "user='user1', file='\\u0444.txt'")
+        writer.flush()
+        self.assertEqual(self.read(), "[2013-05-01 10:00:00] OPENED: user='user1', file='ф.txt'\n")
+
+    def test_adjusted_time_is_twelve_years_back(self):
+        year = int(views.get_adjusted_time()[:4])
+        self.assertIn(datetime.datetime.now().year - year, (12, 13))
+
+    def test_batches_and_close_flushes(self):
+        writer = LogWriter(self.path, batch_size=10, flush_interval=60)
+        for n in range(25):
+            writer.write(f"line {n}\n")
+        writer.close()
+        self.assertEqual(self.read(), "".join(f"line {n}\n" for n in range(25)))
+
+    def test_overflow_policies(self):
+        for policy, expected in (("drop", "a\n"), ("sync", "a\nb\n")):
+            with open(self.path, "w", encoding="utf-8"):
+                pass
+            writer = LogWriter(self.path, max_queue=1, overflow=policy)
+            # Фоновый поток не запускаем, чтобы очередь оставалась заполненной
+            with patch.object(writer, "_ensure_thread"):
+                writer.write("a\n")
+                writer.write("b\n")
+            self.assertEqual(writer.dropped, 1 if policy == "drop" else 0)
+            writer._write_batch([writer._queue.get_nowait()])
+            self.assertEqual(sorted(self.read().splitlines()), sorted(expected.splitlines()))
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            LogWriter(self.path, overflow="wait")
+
+
+class LogRotationTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.path = os.path.join(self.tmp_dir, "logs.txt")
+
+    def write_events(self, *minutes):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for minute in minutes:
+                f.write(f"[2013-05-01 10:{minute:02d}:00] OPENED: n={minute}\n")
+
+    def test_rotate_writes_segment_and_index(self):
+        self.write_events(1, 2)
+        segment = rotate(self.path)
+        self.assertFalse(os.path.exists(self.path))
+        with gzip.open(segment, "rt", encoding="utf-8") as f:
+            self.assertIn("n=2", f.read())
+        self.write_events(3)
+        second = rotate(self.path)
+        index = read_index(second)
+        self.assertEqual((index["first"], index["last"], index["events"]), ("2013-05-01 10:03:00",) * 2 + (1,))
+        self.assertEqual(index["offset"], read_index(segment)["size"])
+        self.assertEqual(list_segments(self.path), [1, 2])
+
+    def test_old_segments_removed(self):
+        for minute in range(4):
+            self.write_events(minute)
+            rotate(self.path, max_segments=2)
+        self.assertEqual(list_segments(self.path), [3, 4])
+        self.assertEqual(len(os.listdir(self.tmp_dir)), 4)
+
+    def test_reader_touches_only_relevant_segments(self):
+        for minutes in ((1, 2), (3, 4), (5, 6)):
+            self.write_events(*minutes)
+            rotate(self.path)
+        self.write_events(7)
+        reader = LogReader(self.path)
+        with patch.object(reader, "_segment_events", wraps=reader._segment_events) as opened:
+            events = reader.read_range("2013-05-01 10:03:30", "2013-05-01 10:05:00")
+        self.assertEqual([e[-3:] for e in events], ["n=4", "n=5"])
+        self.assertEqual(opened.call_count, 2)
+        with patch.object(reader, "_segment_events", wraps=reader._segment_events) as opened:
+            self.assertEqual([e[-3:] for e in reader.tail(3)], ["n=5", "n=6", "n=7"])
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(len(reader.tail(100)), 7)
+
+    def test_multiline_events(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("[2013-05-01 10:00:00] EDITED: a\nb\n[2013-05-01 10:01:00] OPENED: c\n")
+        self.assertEqual(LogReader(self.path).tail(2), ["[2013-05-01 10:00:00] EDITED: a\nb",
+                                                        "[2013-05-01 10:01:00] OPENED: c"])
+
+    def test_writer_rotates_at_size(self):
+        writer = LogWriter(self.path, max_bytes=100, flush_interval=0.01)
+        for minute in range(5):
+            writer.write(f"[2013-05-01 10:{minute:02d}:00] OPENED: n={minute}\n")
+            writer.flush()
+        writer.close()
+        self.assertEqual(len(list_segments(self.path)), 1)
+        self.assertEqual(len(LogReader(self.path).read_range()), 5)
+
+
+class LogTailTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.path = os.path.join(self.tmp_dir, "logs.txt")
+        self.reader = LogReader(self.path)
+        patcher = patch.object(views, "LOG_READER", self.reader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+        session = self.client.session
+        session["logged_in"] = True
+        session["login"] = "admin"
+        session.save()
+
+    def write_events(self, *names):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for name in names:
+                f.write(f"[2013-05-01 10:00:00] OPENED: file='{name}'\n")
+
+    def names(self, events):
+        return [event.split("'")[1] for event in events]
+
+    def test_cursor_survives_rotation(self):
+        self.write_events("a")
+        cursor = self.reader.end_cursor()
+        self.write_events("b")
+        rotate(self.path)
+        self.write_events("c")
+        events, cursor = self.reader.read_from(cursor)
+        self.assertEqual(self.names(events), ["b", "c"])
+        self.assertEqual(cursor, self.reader.end_cursor())
+        self.assertEqual(self.reader.read_from(cursor), ([], cursor))
+
+    def test_partial_line_not_returned(self):
+        self.write_events("a")
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("[2013-05-01 10:00:00] OPE")
+        events, cursor = self.reader.read_from(0)
+        self.assertEqual(self.names(events), ["a"])
+        self.assertLess(cursor, self.reader.end_cursor())
+
+    def test_truncated_log_restarts_from_beginning(self):
+        self.write_events("a", "b", "c")
+        cursor = self.reader.end_cursor()
+        with open(self.path, "w", encoding="utf-8"):
+            pass
+        self.write_events("d")
+        events, _ = self.reader.read_from(cursor)
+        self.assertEqual(self.names(events), ["d"])
+
+    @override_settings(LOG_TAIL_WAIT=False, LOG_TAIL_TIMEOUT=30)
+    def test_request_without_new_events_returns_at_once(self):
+        self.write_events("a")
+        cursor = self.client.get(reverse("log_tail")).json()["cursor"]
+        with patch("main.views.time.sleep") as mock_sleep:
+            started = time.monotonic()
+            data = self.client.get(reverse("log_tail"), {"cursor": cursor}).json()
+            self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(data, {"events": [], "cursor": cursor})
+        mock_sleep.assert_not_called()
+        self.assertEqual(self.client.get(reverse("log_tail"), {"stream": 1}).status_code, 404)
+        self.assertContains(self.client.get(reverse("log_monitor")), 'data-poll-delay="3000"')
+
+    @override_settings(LOG_TAIL_WAIT=True, LOG_TAIL_TIMEOUT=0)
+    def test_long_poll(self):
+        self.write_events("a", "b")
+        data = self.client.get(reverse("log_tail")).json()
+        self.assertEqual(self.names(data["events"]), ["a", "b"])
+        empty = self.client.get(reverse("log_tail"), {"cursor": data["cursor"]}).json()
+        self.assertEqual(empty, {"events": [], "cursor": data["cursor"]})
+        self.write_events("c")
+        data = self.client.get(reverse("log_tail"), {"cursor": data["cursor"]}).json()
+        self.assertEqual(self.names(data["events"]), ["c"])
+
+    @override_settings(LOG_TAIL_WAIT=True)
+    def test_server_sent_events(self):
+        self.write_events("a")
+        response = self.client.get(reverse("log_tail"), {"stream": 1, "cursor": 0})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        message = next(iter(response.streaming_content)).decode()
+        self.assertEqual(message, f"id: {self.reader.end_cursor()}\ndata: [2013-05-01 10:00:00] OPENED: file='a'\n\n")
+        response.close()
+
+    @override_settings(LOG_TAIL_WAIT=True, LOG_TAIL_STREAM_LIFETIME=0, LOG_TAIL_RETRY=1500)
+    def test_server_sent_events_stream_ends(self):
+        self.write_events("a")
+        response = self.client.get(reverse("log_tail"), {"stream": 1, "cursor": 0})
+        messages = [chunk.decode() for chunk in response.streaming_content]
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[-1], "retry: 1500\n\n")
+
+    def test_superadmin_only(self):
+        session = self.client.session
+        session["login"] = "user1"
+        session.save()
+        self.assertEqual(self.client.get(reverse("log_tail")).status_code, 403)
+        self.assertEqual(self.client.get(reverse("log_monitor")).status_code, 403)
+        session["login"] = "admin"
+        session.save()
+        self.assertEqual(self.client.get(reverse("log_tail"), {"cursor": "x"}).status_code, 400)
+
+
+#####################
+# EventStoreTests
+#####################
+class EventStoreTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.store = EventStore(os.path.join(self.tmp_dir, "events.sqlite3"))
+        self.store.append_lines([
+            "[2013-05-01 10:00:00] SUCCESS: login='user1'\n",
+            "[2013-05-01 10:01:00] OPENED: user='user1', file='a.txt'\n",
+            "[2013-05-01 10:02:00] OPENED: user='user2', file='b.txt'\n",
+            "[2013-05-02 09:00:00] EDITED: user='user1', file='a.txt'\n",
+            "не событие\n",
+        ])
+
+    def test_parse_line(self):
+        self.assertEqual(parse_line("[2013-05-01 10:01:00] MOVED: user='u', file='f', from='x', to='y'\n"),
+                         ("2013-05-01 10:01:00", "MOVED", "u", "user='u', file='f', from='x', to='y'",
+                          {"user": "u", "file": "f", "from": "x", "to": "y"}))
+        self.assertIsNone(parse_line("garbage"))
+
+    def test_filters(self):
+        events, cursor = self.store.query(user="user1")
+        self.assertEqual([e["event_type"] for e in events], ["EDITED", "OPENED", "SUCCESS"])
+        self.assertIsNone(cursor)
+        events, _ = self.store.query(event_type="OPENED", since="2013-05-01 10:01:30")
+        self.assertEqual([e["fields"]["file"] for e in events], ["b.txt"])
+        events, _ = self.store.query(until="2013-05-01 10:00:59")
+        self.assertEqual(len(events), 1)
+
+    def test_keyset_pagination(self):
+        events, cursor = self.store.query(limit=3)
+        self.assertEqual(len(events), 3)
+        more, cursor = self.store.query(limit=3, before=cursor)
+        self.assertEqual([e["event_type"] for e in more], ["SUCCESS"])
+        self.assertIsNone(cursor)
+
+    def test_reconnects_after_fork(self):
+        conn = self.store._connection()
+        self.assertIs(self.store._connection(), conn)
+        with patch("main.event_store.os.getpid", return_value=os.getpid() + 1):
+            child = self.store._connection()
+            self.assertIsNot(child, conn)
+            self.assertEqual(len(self.store.query(user="user1")[0]), 3)
+
+    def test_writer_feeds_store(self):
+        writer = LogWriter(os.path.join(self.tmp_dir, "logs.txt"), sinks=(self.store.append_lines,))
+        writer.write("[2013-05-03 10:00:00] DELETED: user='user2', file='\\u0444.txt'\n")
+        writer.close()
+        events, _ = self.store.query(event_type="DELETED")
+        self.assertEqual(events[0]["fields"], {"user": "user2", "file": "ф.txt"})
+
+    def test_import_lines_skips_existing_events(self):
+        lines = [
+            "[2013-04-30 09:00:00] OPENED: user='user2', file='old.txt'\n",
+            "[2013-04-30 09:00:00] OPENED: user='user2', file='old.txt'\n",
+            "[2013-05-01 10:01:00] OPENED: user='user1', file='a.txt'\n",
+        ]
+        self.assertEqual(self.store.import_lines(lines), 2)
+        self.assertEqual(self.store.import_lines(lines), 0)
+        events, _ = self.store.query(user="user2", until="2013-04-30 23:59:59")
+        self.assertEqual(len(events), 2)
+        self.assertEqual(len(self.store.query(user="user1")[0]), 3)
+
+    def test_import_audit_log_command(self):
+        path = os.path.join(self.tmp_dir, "logs.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[2013-04-01 08:00:00] DELETED: user='user1', file='x.txt'\n")
+        rotate(path)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("[2013-05-01 10:00:00] SUCCESS: login='user1'\n")
+            f.write("[2013-05-03 10:00:00] EDITED: user='user1', file='b.txt'\n")
+        out = io.StringIO()
+        with override_settings(EVENT_STORE_PATH=self.store.path):
+            call_command("import_audit_log", log=path, stdout=out)
+        self.assertIn("Всего добавлено: 2", out.getvalue())
+        events, _ = self.store.query(user="user1")
+        self.assertEqual([e["event_type"] for e in events], ["EDITED", "EDITED", "OPENED", "SUCCESS", "DELETED"])
+
+    @override_settings(AUDIT_PAGE_SIZE=2)
+    def test_audit_view(self):
+        client = Client()
+        session = client.session
+        session["logged_in"] = True
+        session["login"] = "user1"
+        session.save()
+        with patch.object(views, "EVENT_STORE", self.store):
+            self.assertEqual(client.get(reverse("audit_log")).status_code, 403)
+            session["login"] = "admin"
+            session.save()
+            response = client.get(reverse("audit_log"), {"user": "user1", "until": "2013-05-01"})
+            self.assertEqual([e["event_type"] for e in response.context["events"]], ["OPENED", "SUCCESS"])
+            self.assertIsNone(response.context["next_url"])
+            response = client.get(reverse("audit_log"))
+            self.assertEqual(len(response.context["events"]), 2)
+            response = client.get(response.context["next_url"])
+            self.assertEqual([e["ts"] for e in response.context["events"]],
+                             ["2013-05-01 10:01:00", "2013-05-01 10:00:00"])
+            self.assertEqual(client.get(reverse("audit_log"), {"before": "x"}).status_code, 400)
+
+
+#####################
+# HiddenFoldersTests
+#####################
+class HiddenFoldersTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.path = os.path.join(self.tmp_dir, "hidden_folders.json")
+        for name, value in (("HIDDEN_FOLDERS_PATH", self.path), ("_index", None)):
+            patcher = patch.object(hidden_folders, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_ancestor_lookup(self):
+        index = HiddenFolders([os.path.join("Science", "Secret"), "Merc"])
+        self.assertTrue(index.is_hidden("Merc"))
+        self.assertTrue(index.is_hidden(os.path.join("Science", "Secret", "deep", "er")))
+        self.assertFalse(index.is_hidden("Science"))
+        self.assertFalse(index.is_hidden(os.path.join("Science", "Secrets")))
+        self.assertIn("Merc", index)
+        self.assertNotIn(os.path.join("Merc", "sub"), index)
+
+    def test_cached_until_file_replaced(self):
+        self.assertEqual(len(get_hidden_folders()), 0)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(["a"], f)
+        index = get_hidden_folders()
+        self.assertEqual(index.paths, {"a"})
+        self.assertIs(get_hidden_folders(), index)
+
+    def test_atomic_save(self):
+        saved = save_hidden_folders({"b", "a"})
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), ["a", "b"])
+        self.assertIs(get_hidden_folders(), saved)
+        self.assertEqual(os.listdir(self.tmp_dir), ["hidden_folders.json"])
+        with patch("main.hidden_folders.os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                save_hidden_folders({"c"})
+        self.assertEqual(os.listdir(self.tmp_dir), ["hidden_folders.json"])
+        self.assertEqual(get_hidden_folders().paths, {"a", "b"})
+
+    def test_view_helpers_round_trip(self):
+        views.write_hidden_folders({"x"})
+        self.assertEqual(views.read_hidden_folders(), {"x"})
+
+
+#####################
+# PathAuthorizerTests
+#####################
+class PathAuthorizerTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = os.path.join(tempfile.gettempdir(), "files")
+        self.auth = authorization.PathAuthorizer(self.root, config.get_config(),
+                                                 HiddenFolders({os.path.join("folder1", "secret")}))
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def test_locate(self):
+        self.assertEqual(self.auth.locate(self.path("a", "..", "b", "c.txt")), ("b", "c.txt"))
+        self.assertEqual(self.auth.locate(self.root), ())
+        self.assertIsNone(self.auth.locate(self.root + "_other"))
+        self.assertIsNone(self.auth.locate(self.path("..", "x")))
+        self.assertIsNone(self.auth.locate(""))
+
+    def test_group_roots_and_hidden(self):
+        check = self.auth.check
+        self.assertEqual(check("user2", authorization.VIEW, self.path("folder1", "a.txt")), authorization.ALLOWED)
+        self.assertEqual(check("user2", authorization.VIEW, self.path("folder2", "a.txt")), authorization.FORBIDDEN)
+        self.assertEqual(check("user1", authorization.VIEW, self.path("folder3", "x", "a.txt")), authorization.ALLOWED)
+        self.assertEqual(check("user1", authorization.VIEW, self.path("folder1", "secret", "a.txt")),
+                         authorization.FORBIDDEN)
+        self.assertEqual(check("admin", authorization.VIEW, self.path("folder1", "secret", "a.txt")),
+                         authorization.ALLOWED)
+        self.assertEqual(check("nobody", authorization.VIEW, self.path("folder1", "a.txt")), authorization.FORBIDDEN)
+        self.assertEqual(check("admin", authorization.VIEW, "/etc/passwd"), authorization.OUTSIDE)
+
+    def test_levels_and_restrictions(self):
+        check = self.auth.check
+        self.assertEqual(check("user1", authorization.DELETE, self.path("folder1", "a.txt")), authorization.ALLOWED)
+        self.assertEqual(check("user2", authorization.DELETE, self.path("folder1", "a.txt")), authorization.LEVEL)
+        self.assertEqual(check("user1", authorization.EDIT, self.path("folder1", "Logs.txt")),
+                         authorization.RESTRICTED)
+        self.assertEqual(check("user1", authorization.DELETE_FOLDER, self.path("folder1", "logs")),
+                         authorization.RESTRICTED)
+        self.assertTrue(self.auth.may("user1", authorization.CREATE, self.path("folder2")))
+
+    def test_rebuilt_per_config_generation(self):
+        hidden = HiddenFolders()
+        first = authorization.get_authorizer(self.root, config.get_config(), hidden)
+        self.assertIs(authorization.get_authorizer(self.root, config.get_config(), hidden), first)
+        with open(self.config_path, "a", encoding="utf-8") as f:
+            f.write("\n[extra]\nkey = value\n")
+        self.assertIsNot(authorization.get_authorizer(self.root, config.get_config(), hidden), first)
+
+
+@override_settings(SILENCED_SYSTEM_CHECKS=SILENCED_CHECKS)
+class MutatingViewAuthorizationTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.files_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files_folder, True)
+        for folder in ("folder1", "folder2", "other"):
+            os.mkdir(os.path.join(self.files_folder, folder))
+        for folder in ("folder1", "other"):
+            with open(os.path.join(self.files_folder, folder, "a.txt"), "w", encoding="utf-8") as f:
+                f.write("a")
+        patcher = patch.object(views, "FILES_FOLDER", self.files_folder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+
+    def login(self, user):
+        session = self.client.session
+        session["logged_in"] = True
+        session["login"] = user
+        session.save()
+
+    def path(self, *parts):
+        return os.path.join(self.files_folder, *parts)
+
+    def test_outside_group_folders_forbidden(self):
+        self.login("user1")
+        response = self.client.get(reverse("delete_file") + "?file=" + self.path("other", "a.txt"))
+        self.assertIn("Доступ запрещён", response.content.decode())
+        self.assertTrue(os.path.exists(self.path("other", "a.txt")))
+        response = self.client.get(reverse("create_folder") + "?folder=" + self.path("other"))
+        self.assertIn("Доступ запрещён или папка не найдена", response.content.decode())
+
+    def test_level_checked_for_ajax_move(self):
+        self.login("user2")
+        response = self.client.post(reverse("move_file_ajax"), json.dumps({
+            "file": self.path("folder1", "a.txt"), "folder": self.path("folder1"),
+        }), content_type="application/json")
+        self.assertEqual(response.json()["error"], "У вас нет прав на перемещение файлов.")
+
+    def test_view_checks_use_request_snapshot(self):
+        self.login("user1")
+        # config.ini перечитан посреди запроса: проверки прав всё равно идут по снимку из request.user_context
+        reloaded = ConfigSnapshot({}, {}, (), (), None, {}, {})
+        with patch("main.views.get_config", return_value=reloaded):
+            response = self.client.get(reverse("file_stream"), {"file": self.path("folder1", "a.txt")})
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(reverse("file_tree_children"), {"folder": self.path("folder1")})
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(reverse("file_view"), {"file": self.path("other", "a.txt")})
+            self.assertContains(response, "Доступ запрещён")
+
+    @patch("main.views.log_event")
+    def test_move_into_other_group_folder_rejected(self, mock_log_event):
+        self.login("user1")
+        response = self.client.post(reverse("move_file") + "?file=" + self.path("folder1", "a.txt"),
+                                    {"destination": self.path("other")})
+        self.assertIn("Целевая папка не найдена или доступ запрещён.", response.content.decode())
+        response = self.client.post(reverse("move_file") + "?file=" + self.path("folder1", "a.txt"),
+                                    {"destination": self.path("folder2")})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(os.path.exists(self.path("folder2", "a.txt")))
+
+
+#####################
+# NodeHandlesTests
+#####################
+class NodeHandlesTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.files_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files_folder, True)
+        self.folder = os.path.join(self.files_folder, "folder1")
+        os.makedirs(os.path.join(self.folder, "sub"))
+        self.file_path = os.path.join(self.folder, "note.txt")
+        with open(self.file_path, "w", encoding="utf-8") as f:
+            f.write("hello")
+        caches["nodes"].clear()
+        self.handles = NodeHandles(self.files_folder, store_alias="nodes")
+        for name, value in (("FILES_FOLDER", self.files_folder), ("NODE_HANDLES", self.handles),
+                            ("TREE_CACHE", TreeCache(handles=self.handles)),
+                            ("CONTENT_CACHE", ContentCache(1024, 1024, render=tokenize_content))):
+            patcher = patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("main.views.log_event")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = Client()
+        session = self.client.session
+        session["logged_in"] = True
+        session["login"] = "user1"
+        session.save()
+
+    def test_handles_are_short_and_stable(self):
+        handle = make_handle(self.file_path)
+        self.assertEqual(len(handle), 12)
+        self.assertEqual(handle, make_handle(os.path.join(self.folder, "sub", "..", "note.txt")))
+        self.assertNotEqual(handle, make_handle(self.folder))
+
+    def test_tree_builder_registers_nodes(self):
+        level = views.TREE_CACHE.get_level(self.folder, self.files_folder)
+        self.assertEqual([node.handle for node in level],
+                         [make_handle(os.path.join(self.folder, "sub")), make_handle(self.file_path)])
+        self.assertEqual(self.handles.resolve(make_handle(self.file_path)), self.file_path)
+        self.assertEqual(self.handles.resolve(make_handle(self.folder)), self.folder)
+
+    def test_other_process_resolves_through_shared_store(self):
+        views.TREE_CACHE.get_level(self.folder, self.files_folder)
+        other = NodeHandles(self.files_folder, store_alias="nodes")
+        with patch("main.node_handles.os.walk") as mock_walk:
+            self.assertEqual(other.resolve(make_handle(self.file_path)), self.file_path)
+            self.assertIsNone(other.resolve("AAAAAAAAAAAA"))
+            self.assertIsNone(other.resolve("x" * 1000))
+            mock_walk.assert_not_called()
+        self.assertIsNone(NodeHandles(self.files_folder).resolve(make_handle(self.file_path)))
+
+    def test_memory_table_is_bounded(self):
+        handles = NodeHandles(self.files_folder, max_entries=2, store_alias="nodes")
+        paths = [os.path.join(self.folder, f"{n}.txt") for n in range(3)]
+        for path in paths:
+            handles.register(path)
+        self.assertEqual(len(handles), 2)
+        self.assertNotIn(make_handle(paths[0]), handles._paths)
+        self.assertEqual(handles.resolve(make_handle(paths[0])), paths[0])
+        self.assertEqual(len(handles), 2)
+
+    def test_move_and_discard(self):
+        target = os.path.join(self.folder, "sub", "note.txt")
+        self.handles.register(self.file_path)
+        self.handles.register(self.folder)
+        self.handles.move(self.file_path, target)
+        self.assertEqual(self.handles.resolve(make_handle(target)), target)
+        self.handles.discard(self.folder)
+        self.assertEqual(len(self.handles), 0)
+
+    def test_views_accept_handles_and_legacy_paths(self):
+        self.handles.register(self.file_path)
+        self.handles.register(self.folder)
+        response = self.client.get(reverse("file_view"), {"node": make_handle(self.file_path)})
+        self.assertEqual(response.context["chunks"], ("hello",))
+        self.assertContains(response, reverse("edit_file") + "?node=" + make_handle(self.file_path))
+        response = self.client.get(reverse("file_view"), {"file": self.file_path})
+        self.assertEqual(response.context["chunks"], ("hello",))
+        response = self.client.get(reverse("file_tree_children"), {"node": make_handle(self.folder)})
+        self.assertEqual([i["node"] for i in response.json()["items"]],
+                         [make_handle(os.path.join(self.folder, "sub")), make_handle(self.file_path)])
+        self.assertNotIn(self.files_folder, response.content.decode())
+
+    def test_move_file_ajax_with_handles(self):
+        self.handles.register(self.file_path)
+        self.handles.register(os.path.join(self.folder, "sub"))
+        target = os.path.join(self.folder, "sub", "note.txt")
+        response = self.client.post(reverse("move_file_ajax"), json.dumps({
+            "file_node": make_handle(self.file_path),
+            "folder_node": make_handle(os.path.join(self.folder, "sub")),
+        }), content_type="application/json")
+        self.assertTrue(response.json()["success"])
+        self.assertTrue(os.path.exists(target))
+        self.assertEqual(self.handles.resolve(make_handle(target)), target)
+        self.assertNotIn(make_handle(self.file_path), self.handles._paths)
+
+
+#####################
+# UserContextTests
+#####################
+class UserContextTests(ConfigTestMixin, TestCase):
+    def test_fields_from_config(self):
+        user = get_user_context({"logged_in": True, "login": "user1"})
+        self.assertEqual(user.groups, ("group1", "group2"))
+        self.assertEqual(user.group, "group1")
+        self.assertEqual(user.access_level, 3)
+        self.assertFalse(user.is_superadmin)
+        self.assertEqual(user.allowed_roots("/files"), ["/files/folder1", "/files/folder2", "/files/folder3"])
+        self.assertEqual(user.background, "images/background_group1.gif")
+        admin = get_user_context({"logged_in": True, "login": "admin"})
+        self.assertTrue(admin.is_superadmin)
+        self.assertEqual(admin.allowed_roots("/files"), ["/files"])
+        self.assertEqual(admin.background, "images/background_default.gif")
+        nobody = get_user_context({})
+        self.assertFalse(nobody.logged_in)
+        self.assertEqual(nobody.allowed_roots("/files"), [])
+
+    def test_reused_until_config_changes(self):
+        session = {"logged_in": True, "login": "user2"}
+        first = get_user_context(session)
+        self.assertIs(get_user_context(session), first)
+        with open(self.config_path, "a", encoding="utf-8") as f:
+            f.write("\n[extra]\nkey = value\n")
+        self.assertIsNot(get_user_context(session), first)
+
+    def test_views_do_not_read_config_per_request(self):
+        client = Client()
+        session = client.session
+        session["logged_in"] = True
+        session["login"] = "user1"
+        session.save()
+        with patch("main.views.build_multi_root_tree", return_value=[]), \
+                patch("main.views.read_access_levels", side_effect=AssertionError), \
+                patch("main.views.get_user_groups", side_effect=AssertionError), \
+                patch("main.user_context.UserContext", wraps=UserContext) as mock_context:
+            response = client.get(reverse("file_manager"))
+            client.get(reverse("file_manager"))
+        self.assertEqual(response.context["access_level"], 3)
+        self.assertEqual(response.context["background_path"], "images/background_group1.gif")
+        self.assertContains(response, "logo_group1.png")
+        self.assertEqual(mock_context.call_count, 1)
+
+
+#####################
+# RateLimitTests
+#####################
+@override_settings(RATE_LIMITS={"login": (3, 60), "glitch_state": (2, 60)})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_USER_AGENT="agent-1")
+        patcher = patch("main.views.log_event")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, ip="10.0.0.1", agent="agent-1"):
+        return RequestFactory().get("/", REMOTE_ADDR=ip, HTTP_USER_AGENT=agent)
+
+    def test_sliding_window_weights_previous_window(self):
+        policy = RateLimitPolicy("test", 4, 60)
+        request = self.request()
+        for _ in range(4):
+            policy.hit(request, now=119)
+        self.assertTrue(policy.is_limited(request, now=119))
+        # Четверть следующего окна прошла — от прошлого окна учитываются 3/4 попаданий
+        self.assertEqual(policy.count(request, now=135), 3)
+        self.assertFalse(policy.is_limited(request, now=135))
+        self.assertEqual(policy.count(request, now=240), 0)
+
+    def test_clients_keyed_by_ip_and_user_agent(self):
+        policy = RateLimitPolicy("test", 1, 60)
+        policy.hit(self.request())
+        self.assertTrue(policy.is_limited(self.request()))
+        self.assertFalse(policy.is_limited(self.request(agent="agent-2")))
+        self.assertFalse(policy.is_limited(self.request(ip="10.0.0.2")))
+
+    def test_failed_logins_blocked_without_session(self):
+        for _ in range(3):
+            self.client.post(reverse("login"), {"login": "nobody", "password": "x"})
+        # Клиент без cookie (новая сессия) ограничение не обходит
+        response = Client(HTTP_USER_AGENT="agent-1").post(reverse("login"), {"login": "nobody", "password": "x"})
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    @patch("main.views.read_credentials", return_value={"owner": "secret"})
+    def test_successful_login_does_not_reset_other_logins(self, mock_read_credentials):
+        for _ in range(2):
+            self.client.post(reverse("login"), {"login": "victim", "password": "guess"})
+        response = Client(HTTP_USER_AGENT="agent-1").post(reverse("login"), {"login": "owner", "password": "secret"})
+        self.assertEqual(response.status_code, 302)
+        self.client.post(reverse("login"), {"login": "victim", "password": "guess"})
+        response = self.client.post(reverse("login"), {"login": "victim", "password": "guess"})
+        self.assertEqual(response.status_code, 403)
+        # Владелец аккаунта не заблокирован чужими ошибками
+        response = Client(HTTP_USER_AGENT="agent-1").post(reverse("login"), {"login": "owner", "password": "secret"})
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(RATE_LIMITS={"login": (3, 60), "login_client": (4, 60)})
+    def test_client_wide_limit_across_logins(self):
+        for n in range(4):
+            self.client.post(reverse("login"), {"login": f"user{n}", "password": "x"})
+        response = self.client.post(reverse("login"), {"login": "user9", "password": "x"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_interleaved_failed_attempts_cannot_pass_limit(self):
+        policy = RateLimitPolicy("interleave", 3, 60)
+        client_policy = RateLimitPolicy("interleave_client", 5, 60)
+        calls = []
+
+        def attempt(login):
+            request = RequestFactory().post("/", {"login": login}, REMOTE_ADDR="10.0.0.1", HTTP_USER_AGENT="agent-1")
+            request.session = {}
+            return view(request)
+
+        @rate_limit(policy, client_policy=client_policy)
+        def view(request):
+            calls.append(request.POST["login"])
+            # Следующие попытки начинаются, пока эта ещё не завершилась
+            if len(calls) < 10:
+                expected = 403 if len(calls) == 3 else 200
+                self.assertEqual(attempt("victim").status_code, expected)
+            return HttpResponse("Неверный логин или пароль")
+
+        self.assertEqual(attempt("victim").status_code, 200)
+        self.assertEqual(len(calls), 3)
+        # Заблокированная попытка возвращена в счётчики
+        request = self.request()
+        self.assertEqual(policy.count(request, subject="victim"), 3)
+        self.assertEqual(client_policy.count(request), 3)
+
+    @patch("main.views.read_credentials", return_value={"owner": "secret"})
+    def test_successful_login_not_counted_client_wide(self, mock_read_credentials):
+        for _ in range(3):
+            response = Client(HTTP_USER_AGENT="agent-1").post(reverse("login"), {"login": "owner", "password": "secret"})
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(views.LOGIN_CLIENT_POLICY.count(RequestFactory().get("/", HTTP_USER_AGENT="agent-1")), 0)
+
+    def test_login_page_views_are_not_counted(self):
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse("login")).status_code, 200)
+
+    def test_throttled_endpoint_returns_429(self):
+        session = self.client.session
+        session["logged_in"] = True
+        session.save()
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, True)
+        with patch.object(views, "BASE_DIR", tmp_dir):
+            for _ in range(2):
+                response = self.client.post(reverse("update_glitch_state"), "{}", content_type="application/json")
+                self.assertEqual(response.status_code, 200)
+            response = self.client.post(reverse("update_glitch_state"), "{}", content_type="application/json")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+
+
+#####################
+# SQLiteCacheTests
+#####################
+def _incr_many(path, count):
+    backend = SQLiteCache(path, {})
+    for _ in range(count):
+        backend.incr("counter")
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.path = os.path.join(self.tmp_dir, "cache", "cache.sqlite3")
+        self.cache = SQLiteCache(self.path, {"OPTIONS": {"MAX_ENTRIES": 10, "CULL_FREQUENCY": 2}})
+
+    def test_basic_operations(self):
+        self.cache.set("a", {"x": [1, 2]})
+        self.assertEqual(self.cache.get("a"), {"x": [1, 2]})
+        self.assertFalse(self.cache.add("a", 1))
+        self.assertTrue(self.cache.add("b", 1))
+        self.assertEqual(self.cache.incr("b", 5), 6)
+        self.assertEqual(self.cache.get_many(["a", "b", "c"]), {"a": {"x": [1, 2]}, "b": 6})
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+        self.assertTrue(self.cache.delete("a"))
+        self.cache.delete_many(["b"])
+        self.assertIsNone(self.cache.get("b"))
+
+    def test_tests_do_not_use_shared_cache_files(self):
+        for alias in ("default", "nodes"):
+            self.assertNotIsInstance(caches[alias], SQLiteCache)
+
+    def test_ttl(self):
+        with patch("main.cache_backends.time.time", return_value=1000.0), \
+                patch("django.core.cache.backends.base.time.time", return_value=1000.0):
+            self.cache.set("short", "v", timeout=10)
+            self.cache.set("forever", "v", timeout=None)
+        with patch("main.cache_backends.time.time", return_value=1011.0), \
+                patch("django.core.cache.backends.base.time.time", return_value=1011.0):
+            self.assertIsNone(self.cache.get("short"))
+            self.assertFalse(self.cache.has_key("short"))
+            self.assertFalse(self.cache.touch("short"))
+            # На месте просроченного ключа add срабатывает
+            self.assertTrue(self.cache.add("short", "new", timeout=10))
+            self.assertEqual(self.cache.get("forever"), "v")
+
+    def test_cull_keeps_size_bounded(self):
+        with patch("main.cache_backends.CULL_EVERY", 5):
+            for n in range(40):
+                self.cache.set(f"k{n}", n)
+        count = self.cache._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        self.assertLessEqual(count, 15)
+        self.assertEqual(self.cache.get("k39"), 39)
+
+    def test_incr_is_atomic_across_processes(self):
+        import multiprocessing
+        self.cache.set("counter", 0)
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=_incr_many, args=(self.path, 50)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get("counter"), 200)
+
+
+#####################
+# BoundedMemoryCacheTests
+#####################
+class BoundedMemoryCacheTests(TestCase):
+    def make_cache(self, max_bytes, namespaces=None):
+        location = f"test-{id(self)}-{max_bytes}"
+        backend = BoundedMemoryCache(location, {"OPTIONS": {"MAX_BYTES": max_bytes, "NAMESPACES": namespaces or {}}})
+        self.addCleanup(backend.clear)
+        return backend
+
+    def entry_size(self, backend, key, value):
+        import pickle
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) + len(backend.make_key(key)) + ENTRY_OVERHEAD
+
+    def test_basic_operations(self):
+        backend = self.make_cache(1024 * 1024)
+        backend.set("a", {"x": [1, 2]})
+        self.assertEqual(backend.get("a"), {"x": [1, 2]})
+        self.assertFalse(backend.add("a", 1))
+        self.assertTrue(backend.add("b", 1))
+        self.assertEqual(backend.incr("b", 5), 6)
+        self.assertEqual(backend.get_many(["a", "b", "c"]), {"a": {"x": [1, 2]}, "b": 6})
+        with self.assertRaises(ValueError):
+            backend.incr("missing")
+        self.assertTrue(backend.delete("a"))
+        self.assertFalse(backend.has_key("a"))
+        backend.clear()
+        self.assertEqual(backend.stats()["bytes"], 0)
+
+    def test_byte_accounting(self):
+        backend = self.make_cache(1024 * 1024)
+        backend.set("a", "x" * 100)
+        backend.set("b", "y" * 50)
+        expected = self.entry_size(backend, "a", "x" * 100) + self.entry_size(backend, "b", "y" * 50)
+        self.assertEqual(backend.stats()["bytes"], expected)
+        # Перезапись учитывается по новому размеру
+        backend.set("a", "x")
+        expected = self.entry_size(backend, "a", "x") + self.entry_size(backend, "b", "y" * 50)
+        self.assertEqual(backend.stats()["bytes"], expected)
+        backend.delete("b")
+        self.assertEqual(backend.stats()["bytes"], self.entry_size(backend, "a", "x"))
+
+    def test_lru_eviction_by_bytes(self):
+        size = self.entry_size(self.make_cache(1), "k0", "v" * 100)
+        backend = self.make_cache(size * 3)
+        for n in range(3):
+            backend.set(f"k{n}", "v" * 100)
+        # Чтение делает k0 самым свежим, вытесняется k1
+        backend.get("k0")
+        backend.set("k3", "v" * 100)
+        self.assertEqual(sorted(k for k in ("k0", "k1", "k2", "k3") if backend.has_key(k)), ["k0", "k2", "k3"])
+        stats = backend.stats()
+        self.assertEqual((stats["entries"], stats["evictions"]), (3, 1))
+        self.assertLessEqual(stats["bytes"], stats["max_bytes"])
+
+    def test_namespace_budgets(self):
+        size = self.entry_size(self.make_cache(1), "tree:0", "v" * 100)
+        backend = self.make_cache(1024 * 1024, {"tree:": size * 2, "content:": size * 10})
+        backend.set("content:a", "v" * 100)
+        for n in range(5):
+            backend.set(f"tree:{n}", "v" * 100)
+        stats = backend.stats()["namespaces"]
+        self.assertEqual((stats["tree:"]["entries"], stats["tree:"]["evictions"]), (2, 3))
+        # Вытеснение в одном пространстве имён не трогает другие
+        self.assertEqual(backend.get("content:a"), "v" * 100)
+        self.assertTrue(backend.has_key("tree:4"))
+        backend.set("other-key", 1)
+        self.assertEqual(backend.stats()["namespaces"]["other"]["entries"], 1)
+        # Запись больше бюджета не сохраняется
+        backend.set("tree:big", "v" * (size * 3))
+        self.assertIsNone(backend.get("tree:big"))
+        self.assertEqual(backend.stats()["namespaces"]["tree:"]["rejected"], 1)
+
+    def test_hits_misses_and_expiry(self):
+        backend = self.make_cache(1024 * 1024, {"tree:": 10000})
+        with patch("main.cache_backends.time.time", return_value=1000.0), \
+                patch("django.core.cache.backends.base.time.time", return_value=1000.0):
+            backend.set("tree:a", 1, timeout=10)
+            backend.get("tree:a")
+            backend.get("tree:missing")
+        with patch("main.cache_backends.time.time", return_value=1011.0), \
+                patch("django.core.cache.backends.base.time.time", return_value=1011.0):
+            self.assertIsNone(backend.get("tree:a"))
+        stats = backend.stats()["namespaces"]["tree:"]
+        self.assertEqual((stats["hits"], stats["misses"], stats["expired"], stats["bytes"]), (1, 2, 1, 0))
+
+    def test_shared_between_instances(self):
+        backend = self.make_cache(1024 * 1024)
+        other = BoundedMemoryCache(backend.location, {})
+        backend.set("a", 1)
+        self.assertEqual(other.get("a"), 1)
+
+    def test_stats_view(self):
+        client = Client()
+        session = client.session
+        session["logged_in"] = True
+        session["login"] = "user1"
+        session.save()
+        with user_config(superadmin="admin"):
+            self.assertEqual(client.get(reverse("cache_stats")).status_code, 403)
+            session["login"] = "admin"
+            session.save()
+            response = client.get(reverse("cache_stats"))
+            data = client.get(reverse("cache_stats"), {"format": "json"}).json()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("memory", response.context["caches"])
+        self.assertNotIn("default", response.context["caches"])
+        self.assertIn("fragments:", data["caches"]["memory"]["namespaces"])
+        self.assertIn("hits", data["file_content"])
+
+
+#####################
+# ConditionalGetTests
+#####################
+@override_settings(SILENCED_SYSTEM_CHECKS=SILENCED_CHECKS, FILE_TREE_LAZY=True)
+class ConditionalGetTests(ConfigTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.files_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files_folder, True)
+        for folder in ("folder1", "folder2", "folder3"):
+            os.mkdir(os.path.join(self.files_folder, folder))
+        self.file_path = os.path.join(self.files_folder, "folder1", "note.txt")
+        with open(self.file_path, "w", encoding="utf-8") as f:
+            f.write("hello")
+        self.cache = ContentCache(1024, 1024, render=tokenize_content)
+        for name, value in (("FILES_FOLDER", self.files_folder), ("CONTENT_CACHE", self.cache),
+                            ("TREE_CACHE", TreeCache())):
+            patcher = patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("main.views.log_event")
+        self.log_event = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = self.login("user1")
+
+    def login(self, login):
+        client = Client()
+        session = client.session
+        session["logged_in"] = True
+        session["login"] = login
+        session.save()
+        return client
+
+    def test_file_manager_not_modified(self):
+        response = self.client.get(reverse("file_manager"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        etag = response["ETag"]
+        with patch("main.views.build_multi_root_tree") as build:
+            response = self.client.get(reverse("file_manager"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        build.assert_not_called()
+
+    def test_file_manager_changes_with_tree_and_user(self):
+        etag = self.client.get(reverse("file_manager"))["ETag"]
+        os.mkdir(os.path.join(self.files_folder, "folder1", "new"))
+        # Отметка mtime может не смениться на грубой файловой системе
+        os.utime(os.path.join(self.files_folder, "folder1"), ns=(1, 1))
+        response = self.client.get(reverse("file_manager"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(reverse("file_manager"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Страница суперадмина та же по дереву, но с другими правами
+        admin = self.login("admin")
+        self.assertEqual(admin.get(reverse("file_manager"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_file_view_not_modified(self):
+        response = self.client.get(reverse("file_view"), {"file": self.file_path})
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        self.assertEqual(self.cache.stats()["misses"], 1)
+        response = self.client.get(reverse("file_view"), {"file": self.file_path}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(reverse("file_view"), {"file": self.file_path},
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        # Файл не читался, но открытия записаны в журнал
+        self.assertEqual(self.cache.stats()["hits"] + self.cache.stats()["misses"], 1)
+        self.assertEqual(self.log_event.call_count, 3)
+
+    def test_file_view_changes_with_file(self):
+        etag = self.client.get(reverse("file_view"), {"file": self.file_path})["ETag"]
+        with open(self.file_path, "w", encoding="utf-8") as f:
+            f.write("hello, world")
+        response = self.client.get(reverse("file_view"), {"file": self.file_path}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["chunks"], ("hello, world",))
+
+    def test_tree_cache_version(self):
+        root = os.path.join(self.files_folder, "folder1")
+        self.assertEqual(TreeCache().version([root]), (os.stat(root).st_mtime_ns,))
+        # Подпись полного дерева зависит от содержимого, а не от процесса и истории его кэша
+        first, second = TreeCache(validate_interval=0), TreeCache(validate_interval=0)
+        first.invalidate(root)
+        signature = first.signature([root], first.get_tree(root, self.files_folder))
+        self.assertEqual(second.signature([root], second.get_tree(root, self.files_folder)), signature)
+        os.mkdir(os.path.join(root, "sub"))
+        os.utime(os.path.join(root, "sub"), ns=(1, 1))
+        self.assertNotEqual(first.signature([root], first.get_tree(root, self.files_folder)), signature)
+
+    @override_settings(FILE_TREE_LAZY=False)
+    def test_full_tree_not_modified(self):
+        etag = self.client.get(reverse("file_manager"))["ETag"]
+        self.assertEqual(self.client.get(reverse("file_manager"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Другой процесс с пустым кэшем даёт тот же ETag
+        with patch.object(views, "TREE_CACHE", TreeCache()):
+            self.assertEqual(self.client.get(reverse("file_manager"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        os.mkdir(os.path.join(self.files_folder, "folder1", "new"))
+        os.utime(os.path.join(self.files_folder, "folder1"), ns=(1, 1))
+        with patch.object(views, "TREE_CACHE", TreeCache()):
+            self.assertEqual(self.client.get(reverse("file_manager"), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_static_deploy_changes_validators(self):
+        etag = self.client.get(reverse("file_view"), {"file": self.file_path})["ETag"]
+        with patch("main.views.asset_version", return_value=("new-manifest", None)):
+            response = self.client.get(reverse("file_view"), {"file": self.file_path}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        with patch("main.views.asset_modified", return_value=int(time.time()) + 60):
+            response = self.client.get(reverse("file_view"), {"file": self.file_path},
+                                       HTTP_IF_MODIFIED_SINCE=http_date(time.time()))
+        self.assertEqual(response.status_code, 200)
+
+
+#####################
+# StaticPipelineTests
+#####################
+class StaticPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        source = tempfile.mkdtemp()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, source, True)
+        cls.addClassCleanup(shutil.rmtree, cls.static_root, True)
+        for folder in ("css", "js", "images"):
+            os.mkdir(os.path.join(source, folder))
+        with open(os.path.join(source, "css", "site.css"), "w", encoding="utf-8") as f:
+            f.write('body { background: url("../images/pic.gif"); }\n' * 20)
+        cls.script = ("console.log('terminal');\n" * 100).encode()
+        with open(os.path.join(source, "js", "app.js"), "wb") as f:
+            f.write(cls.script)
+        with open(os.path.join(source, "images", "pic.gif"), "wb") as f:
+            f.write(os.urandom(512))
+        settings_override = override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=cls.static_root, STATIC_PIPELINE=True,
+            STORAGES={**settings.STORAGES,
+                      "staticfiles": {"BACKEND": "main.static_storage.CompressedManifestStaticFilesStorage"}},
+        )
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        # Статика приложений (admin) не нужна — собираются только файлы из source
+        with patch("django.contrib.staticfiles.finders.AppDirectoriesFinder.list", return_value=[]):
+            call_command("collectstatic", interactive=False, verbosity=0)
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        cls.storage = staticfiles_storage
+        cls.hashed_js = staticfiles_storage.stored_name("js/app.js")
+        cls.hashed_css = staticfiles_storage.stored_name("css/site.css")
+
+    def get(self, name, **headers):
+        response = Client().get(settings.STATIC_URL + name, **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_collectstatic_writes_hashed_names_and_variants(self):
+        self.assertRegex(self.hashed_js, r"^js/app\.[0-9a-f]{12}\.js$")
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, self.hashed_js + ".gz")))
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, "js", "app.js.gz")))
+        # GIF уже сжат — вариантов нет
+        self.assertFalse(os.path.exists(os.path.join(self.static_root, self.storage.stored_name("images/pic.gif") + ".gz")))
+        with open(os.path.join(self.static_root, self.hashed_css), encoding="utf-8") as f:
+            self.assertIn(os.path.basename(self.storage.stored_name("images/pic.gif")), f.read())
+        self.assertEqual(self.storage.url("js/app.js"), settings.STATIC_URL + self.hashed_js)
+        self.assertEqual(self.storage.url("images/missing.gif"), settings.STATIC_URL + "images/missing.gif")
+
+    def test_hashed_file_is_immutable_and_compressed(self):
+        response = self.get(self.hashed_js, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), self.script)
+        # Без Accept-Encoding отдаётся исходный файл, сессия не создаётся
+        response = self.get(self.hashed_js)
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(b"".join(response.streaming_content), self.script)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_unhashed_file_is_revalidated(self):
+        response = self.get("js/app.js")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        response = self.get("js/app.js", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_file_falls_through(self):
+        middleware = StaticFilesMiddleware(lambda request: "next")
+        self.assertEqual(middleware(RequestFactory().get(settings.STATIC_URL + "js/missing.js")), "next")
+        self.assertEqual(middleware(RequestFactory().post(settings.STATIC_URL + self.hashed_js)), "next")
+
+
+#####################
+# AssetVariantsTests
+#####################
+try:
+    import PIL
+except ImportError:
+    PIL = None
+
+MANIFEST = {
+    "images/background_x.gif": {
+        "variants": [
+            {"path": "images/optimized/background_x.webp", "type": "image/webp", "bytes": 100},
+            {"path": "images/optimized/background_x.gif", "type": "image/gif", "bytes": 300},
+            {"path": "images/background_x.gif", "type": "image/gif", "bytes": 1000},
+        ],
+        "poster": [
+            {"path": "images/optimized/background_x.poster.webp", "type": "image/webp", "bytes": 10},
+            {"path": "images/optimized/background_x.poster.png", "type": "image/png", "bytes": 30},
+        ],
+    },
+    "images/logo_x.png": {
+        "variants": [
+            {"path": "images/optimized/logo_x.webp", "type": "image/webp", "bytes": 50},
+            {"path": "images/optimized/logo_x.png", "type": "image/png", "bytes": 80},
+            {"path": "images/logo_x.png", "type": "image/png", "bytes": 90},
+        ],
+        "poster": [],
+    },
+}
+
+
+class AssetVariantsTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir, True)
+        self.manifest_path = os.path.join(self.tmp_dir, "manifest.json")
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(MANIFEST, f)
+        settings_override = override_settings(ASSET_VARIANTS_MANIFEST=self.manifest_path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = patch.object(asset_variants, "_index", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def render(self, text):
+        return Template("{% load asset_tags %}" + text).render(Context())
+
+    def test_background_prefers_smallest_variant_over_poster(self):
+        value = self.render("{% background_image 'images/background_x.gif' %}")
+        animation, poster = value.split("), image-set(")
+        self.assertLess(animation.index("background_x.webp"), animation.index("optimized/background_x.gif"))
+        self.assertIn("type('image/webp')", animation)
+        self.assertLess(poster.index("poster.webp"), poster.index("poster.png"))
+        self.assertEqual(self.render("{% background_fallback 'images/background_x.gif' %}"),
+                         "url('/static/images/optimized/background_x.gif')")
+
+    def test_picture(self):
+        html_ = self.render("{% picture 'images/logo_x.png' 'Логотип' %}")
+        self.assertEqual(html_, '<picture><source srcset="/static/images/optimized/logo_x.webp" type="image/webp">'
+                                '<img src="/static/images/optimized/logo_x.png" alt="Логотип"></picture>')
+
+    def test_without_manifest_entry(self):
+        self.assertEqual(self.render("{% background_image 'images/other.gif' %}"), "url('/static/images/other.gif')")
+        self.assertEqual(self.render("{% picture 'images/logo_y.png' %}"), '<img src="/static/images/logo_y.png" alt="">')
+
+    def test_manifest_reloaded_when_changed(self):
+        self.assertIn("images/logo_x.png", asset_variants.get_asset_variants().assets)
+        os.remove(self.manifest_path)
+        self.assertEqual(asset_variants.get_asset_variants().assets, {})
+
+    def test_command_requires_pillow(self):
+        with patch.dict(sys.modules, {"PIL": None}), self.assertRaises(CommandError):
+            call_command("optimize_assets", source=self.tmp_dir)
+
+    @unittest.skipUnless(PIL, "Pillow не установлен")
+    def test_optimize_assets(self):
+        from PIL import Image
+        source = os.path.join(self.tmp_dir, "images")
+        os.mkdir(source)
+        frames = [Image.new("RGB", (64, 48), (n * 40, 255 - n * 40, 0)) for n in range(4)]
+        for frame in frames:
+            for x in range(64):
+                frame.putpixel((x, x % 48), (x * 4, x * 2, 255 - x))
+        frames[0].save(os.path.join(source, "background_x.gif"), save_all=True, append_images=frames[1:],
+                       duration=100, loop=0)
+        Image.new("RGBA", (32, 32), (0, 255, 0, 128)).save(os.path.join(source, "logo_x.png"))
+        output = []
+        assets = asset_variants.optimize_assets(source, self.manifest_path, log=output.append)
+        entry = assets["images/background_x.gif"]
+        sizes = [variant["bytes"] for variant in entry["variants"]]
+        self.assertEqual(sizes, sorted(sizes))
+        self.assertIn("images/background_x.gif", [variant["path"] for variant in entry["variants"]])
+        self.assertEqual(entry["frames"], 4)
+        for variant in entry["variants"] + entry["poster"]:
+            self.assertTrue(os.path.exists(os.path.join(source, os.path.relpath(variant["path"], "images"))))
+        self.assertEqual(asset_variants.get_asset_variants().variants("images/background_x.gif"), entry["variants"])
+        # Повторный запуск не пересоздаёт варианты неизменившихся файлов
+        output.clear()
+        asset_variants.optimize_assets(source, self.manifest_path, log=output.append)
+        self.assertTrue(all(line.endswith("без изменений") for line in output))
 
 
 #####################
@@ -412,13 +2378,12 @@ class ToggleFolderVisibilityTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn("Доступ запрещён или папка не найдена", response.content.decode())
 
-    @patch("main.views.read_folder_visibility_config")
+    @user_config(superadmin="admin")
     @patch("main.views.os.path.abspath")
     @patch("main.views.os.path.isdir")
-    def test_non_superadmin_no_rights(self, mock_isdir, mock_abspath, mock_read_visibility):
+    def test_non_superadmin_no_rights(self, mock_isdir, mock_abspath):
         mock_abspath.side_effect = lambda path: path
         mock_isdir.return_value = True
-        mock_read_visibility.return_value = "admin"
         session = self.client.session
         session["logged_in"] = True
         session["login"] = "user1"
@@ -429,13 +2394,12 @@ class ToggleFolderVisibilityTests(TestCase):
 
     @patch("main.views.write_hidden_folders")
     @patch("main.views.read_hidden_folders")
-    @patch("main.views.read_folder_visibility_config")
+    @user_config(superadmin="admin")
     @patch("main.views.os.path.abspath")
     @patch("main.views.os.path.isdir")
-    def test_toggle_visibility_adds_folder(self, mock_isdir, mock_abspath, mock_read_visibility, mock_read_hidden, mock_write_hidden):
+    def test_toggle_visibility_adds_folder(self, mock_isdir, mock_abspath, mock_read_hidden, mock_write_hidden):
         mock_abspath.side_effect = lambda path: path
         mock_isdir.return_value = True
-        mock_read_visibility.return_value = "admin"
         mock_read_hidden.return_value = set()
         session = self.client.session
         session["logged_in"] = True
@@ -449,13 +2413,12 @@ class ToggleFolderVisibilityTests(TestCase):
 
     @patch("main.views.write_hidden_folders")
     @patch("main.views.read_hidden_folders")
-    @patch("main.views.read_folder_visibility_config")
+    @user_config(superadmin="admin")
     @patch("main.views.os.path.abspath")
     @patch("main.views.os.path.isdir")
-    def test_toggle_visibility_removes_folder(self, mock_isdir, mock_abspath, mock_read_visibility, mock_read_hidden, mock_write_hidden):
+    def test_toggle_visibility_removes_folder(self, mock_isdir, mock_abspath, mock_read_hidden, mock_write_hidden):
         mock_abspath.side_effect = lambda path: path
         mock_isdir.return_value = True
-        mock_read_visibility.return_value = "admin"
         rel_path = os.path.relpath(self.test_folder, self.fake_files_folder)
         hidden_set = {rel_path}
         mock_read_hidden.return_value = hidden_set.copy()
@@ -4,7 +4,9 @@ from . import views
 urlpatterns = [
     path('', views.login_view, name='login'),
     path('file-manager/', views.file_manager, name='file_manager'),
+    path('file-tree-children/', views.file_tree_children, name='file_tree_children'),
     path('file-view/', views.file_view, name='file_view'),
+    path('file-stream/', views.file_stream, name='file_stream'),
     path('create-file/', views.create_file, name='create_file'),
     path('delete-file/', views.delete_file, name='delete_file'),
     path('edit-file/', views.edit_file, name='edit_file'),
@@ -13,6 +15,10 @@ urlpatterns = [
     path('delete-folder/', views.delete_folder, name='delete_folder'),
     path('move-file/', views.move_file, name='move_file'),
     path('move-file-ajax/', views.move_file_ajax, name='move_file_ajax'),
+    path('audit/', views.audit_log, name='audit_log'),
+    path('log-monitor/', views.log_monitor, name='log_monitor'),
+    path('log-tail/', views.log_tail, name='log_tail'),
+    path('cache-stats/', views.cache_stats, name='cache_stats'),
     path('snake/', views.snake_game, name='snake_game'),
     path('pong/', views.pong_game, name='pong_game'),
     path('hacking/', views.hacking_game, name='hacking_game'),
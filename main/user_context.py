@@ -0,0 +1,81 @@
+import hashlib
+import os
+import threading
+
+from .config import get_config
+
+
+class UserContext:
+    """
+    Всё, что представлениям и base.html нужно знать о текущем пользователе:
+    логин, группы, уровень доступа, флаг суперадмина, разрешённые корневые
+    папки и фон. Строится один раз на пользователя и снимок config.ini
+    (см. get_user_context) и дальше только читается.
+
+    root_folders — папки групп относительно папки с файлами; пустая строка
+    означает всю папку с файлами, пустой кортеж — пользователю не назначена группа.
+    profile — короткий отпечаток всего, от чего зависят права и вид страниц
+    пользователя; входит в ETag страниц (см. conditional_response в views).
+    snapshot — снимок config.ini, из которого построен контекст; по нему же
+    views.authorize проверяет права на действия, чтобы запрос видел одну конфигурацию.
+    """
+    __slots__ = ("login", "logged_in", "groups", "access_level", "is_superadmin", "superadmin",
+                 "root_folders", "background", "profile", "snapshot")
+
+    def __init__(self, login, logged_in, snapshot):
+        self.snapshot = snapshot
+        self.login = login
+        self.logged_in = logged_in
+        self.groups = snapshot.groups_for(login)
+        self.access_level = snapshot.access_levels.get(login, 1)
+        self.superadmin = snapshot.superadmin
+        self.is_superadmin = login == snapshot.superadmin
+        if self.is_superadmin:
+            self.root_folders = ("",)
+        elif self.groups:
+            folders = tuple(folder for group in self.groups for folder in snapshot.folders_for(group))
+            self.root_folders = folders or ("",)
+        else:
+            self.root_folders = ()
+        self.background = "images/background_" + (self.group or "default") + ".gif"
+        profile = (login, logged_in, self.groups, self.access_level, self.is_superadmin, self.root_folders)
+        self.profile = hashlib.blake2b(repr(profile).encode(), digest_size=8).hexdigest()
+
+    @property
+    def group(self):
+        """Первая группа пользователя (по ней выбираются фон, логотип и значок) или None."""
+        return self.groups[0] if self.groups else None
+
+    def allowed_roots(self, files_root):
+        """Абсолютные пути разрешённых корневых папок (как в file_manager)."""
+        return [os.path.join(files_root, folder) if folder else files_root for folder in self.root_folders]
+
+    def __repr__(self):
+        return f"<UserContext {self.login!r} level={self.access_level}>"
+
+
+_contexts = (None, {})  # (снимок config.ini, {(логин, вошёл ли): UserContext})
+_lock = threading.Lock()
+
+
+def get_user_context(session):
+    """
+    Контекст пользователя сессии session. Контексты кэшируются для текущего
+    снимка config.ini и пересобираются, только когда файл изменился, —
+    на запрос остаётся проверка снимка и поиск в словаре.
+    """
+    global _contexts
+    login = session.get("login", "unknown")
+    logged_in = bool(session.get("logged_in"))
+    snapshot = get_config()
+    cached_snapshot, contexts = _contexts
+    if cached_snapshot is not snapshot:
+        with _lock:
+            if _contexts[0] is not snapshot:
+                _contexts = (snapshot, {})
+            contexts = _contexts[1]
+    key = (login, logged_in)
+    context = contexts.get(key)
+    if context is None:
+        context = contexts[key] = UserContext(login, logged_in, snapshot)
+    return context
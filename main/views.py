@@ -1,17 +1,41 @@
 import os
 import json
-import configparser
+import hashlib
 import datetime
 import random
-import codecs
-import re
-import html
+import time
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode, unquote
 from django.utils.safestring import mark_safe
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.shortcuts import render, redirect
-from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotFound,
+    JsonResponse, StreamingHttpResponse,
+)
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
-from .decorators import rate_limit
+from .decorators import (
+    GLITCH_STATE_POLICY, LOGIN_CLIENT_POLICY, LOGIN_POLICY, MOVE_FILE_POLICY, rate_limit, throttle,
+)
+from . import authorization
+from .asset_variants import get_asset_variants
+from .config import get_config
+from .event_store import EventStore
+from .file_content import (
+    ContentCache, RangeNotSatisfiable, chunks_to_html, is_blank, iter_file_range, parse_range, read_lines,
+    tokenize_content,
+)
+from .file_tree import TreeCache, dedupe_roots
+from .hidden_folders import HIDDEN_FOLDERS_PATH, get_hidden_folders, save_hidden_folders
+from .log_rotation import LogReader
+from .log_writer import LogWriter
+from .node_handles import NodeHandles
+from .templatetags.file_tree_tags import render_tree_html
 
 # Базовая директория проекта
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -22,74 +46,66 @@ LOG_DIR = os.path.join(BASE_DIR, "logs")
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
+# Структурированная копия журнала для запросов аудита (см. main/event_store.py)
+EVENT_STORE = EventStore(settings.EVENT_STORE_PATH)
+LOG_FILE = os.path.join(LOG_DIR, "logs.txt")
+# Журнал событий пишется фоновым потоком пачками (см. main/log_writer.py)
+LOG_WRITER = LogWriter(
+    LOG_FILE,
+    max_queue=settings.LOG_QUEUE_SIZE,
+    batch_size=settings.LOG_BATCH_SIZE,
+    flush_interval=settings.LOG_FLUSH_INTERVAL,
+    overflow=settings.LOG_OVERFLOW,
+    max_bytes=settings.LOG_MAX_BYTES,
+    max_segments=settings.LOG_MAX_SEGMENTS,
+    sinks=(EVENT_STORE.append_lines,),
+)
+# Чтение журнала вместе с архивными сегментами (см. main/log_rotation.py)
+LOG_READER = LogReader(LOG_FILE)
+
 # Файл для хранения скрытых папок (относительных путей относительно FILES_FOLDER)
-HIDDEN_FOLDERS_FILE = os.path.join(BASE_DIR, "hidden_folders.json")
+HIDDEN_FOLDERS_FILE = HIDDEN_FOLDERS_PATH
 if not os.path.exists(HIDDEN_FOLDERS_FILE):
     with open(HIDDEN_FOLDERS_FILE, "w", encoding="utf-8") as f:
         json.dump([], f)
 
+# Дескрипторы узлов дерева для ссылок ?node=... вместо полных путей (см. main/node_handles.py);
+# заполняются при построении дерева, обновляются при перемещении и удалении
+NODE_HANDLES = NodeHandles(FILES_FOLDER, settings.NODE_HANDLE_MAX_ENTRIES, settings.NODE_HANDLE_CACHE_ALIAS)
+# Кэш деревьев файлов; сбрасывается представлениями, изменяющими файлы и папки
+TREE_CACHE = TreeCache(handles=NODE_HANDLES)
+# Пул потоков для параллельного обхода нескольких корневых папок пользователя
+TREE_EXECUTOR = ThreadPoolExecutor(max_workers=settings.FILE_TREE_WORKERS, thread_name_prefix="file-tree")
+# Кэш содержимого файлов для file_view; сбрасывается при правке, перемещении и удалении файла
+# Хранит уже разобранные фрагменты (tokenize_content), поэтому повторный просмотр не разбирает текст заново
+CONTENT_CACHE = ContentCache(settings.FILE_CONTENT_CACHE_BYTES, settings.FILE_CONTENT_CACHE_MAX_ENTRY,
+                             render=tokenize_content)
+
 # ---------------------- Чтение конфигураций ----------------------
+# Все функции ниже берут данные из общего снимка config.ini (см. main/config.py),
+# который перечитывается только при изменении файла.
 
 def read_credentials():
-    config = configparser.ConfigParser()
-    config_path = os.path.join(BASE_DIR, "config.ini")
-    config.read(config_path)
-    if config.has_section("accounts"):
-        return dict(config.items("accounts"))
-    else:
-        login_value = config.get("credentials", "login", fallback="admin")
-        password_value = config.get("credentials", "password", fallback="secret")
-        return {login_value: password_value}
+    return get_config().credentials
 
 def read_access_levels():
-    config = configparser.ConfigParser()
-    config_path = os.path.join(BASE_DIR, "config.ini")
-    config.read(config_path)
-    levels = {}
-    if config.has_section("access_levels"):
-        for user, level in config.items("access_levels"):
-            try:
-                levels[user.strip()] = int(level.strip())
-            except ValueError:
-                levels[user.strip()] = 1
-    return levels
+    return get_config().access_levels
 
 def read_restrictions():
-    config = configparser.ConfigParser()
-    config_path = os.path.join(BASE_DIR, "config.ini")
-    config.read(config_path)
-    restricted_files = set()
-    restricted_folders = set()
-    if config.has_section("restrictions"):
-        if config.has_option("restrictions", "restricted_files"):
-            files_str = config.get("restrictions", "restricted_files")
-            restricted_files = set(x.strip().lower() for x in files_str.split(",") if x.strip())
-        if config.has_option("restrictions", "restricted_folders"):
-            folders_str = config.get("restrictions", "restricted_folders")
-            restricted_folders = set(x.strip().upper() for x in folders_str.split(",") if x.strip())
-    return restricted_files, restricted_folders
+    snapshot = get_config()
+    return snapshot.restricted_files, snapshot.restricted_folders
 
 def read_folder_visibility_config():
     """Возвращает логин суперадмина из секции [folder_visibility]."""
-    config = configparser.ConfigParser()
-    config_path = os.path.join(BASE_DIR, "config.ini")
-    config.read(config_path)
-    superadmin = None
-    if config.has_section("folder_visibility") and config.has_option("folder_visibility", "superadmin"):
-        superadmin = config.get("folder_visibility", "superadmin").strip()
-    return superadmin
+    return get_config().superadmin
 
 def read_hidden_folders():
-    try:
-        with open(HIDDEN_FOLDERS_FILE, "r", encoding="utf-8") as f:
-            return set(json.load(f))
-    except Exception:
-        return set()
+    """Изменяемая копия набора скрытых папок (для toggle_folder_visibility)."""
+    return set(get_hidden_folders().paths)
 
 def write_hidden_folders(hidden_set):
     try:
-        with open(HIDDEN_FOLDERS_FILE, "w", encoding="utf-8") as f:
-            json.dump(list(hidden_set), f)
+        save_hidden_folders(hidden_set)
     except Exception as e:
         print("Error writing hidden folders:", e)
 
@@ -102,37 +118,19 @@ def get_adjusted_time():
     return adjusted.strftime("%Y-%m-%d %H:%M:%S")
 
 def log_event(event_type, message):
-    log_file = os.path.join(LOG_DIR, "logs.txt")
+    # Время фиксируется в момент события; раскрытие escape-последовательностей
+    # и запись в файл выполняет фоновый поток LOG_WRITER
     timestamp = get_adjusted_time()
-    log_message = f"[{timestamp}] {event_type}: {message}\n"
-    try:
-        decoded = codecs.decode(log_message, 'unicode_escape')
-    except Exception:
-        decoded = log_message
-    try:
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(decoded)
-    except Exception as e:
-        print("Log write error:", e)
+    LOG_WRITER.write(f"[{timestamp}] {event_type}: {message}\n")
 
 def get_user_groups(user):
     """
     Возвращает список групп, в которые входит пользователь.
-    Читает секцию [groups] из config.ini.
+    Берётся из секции [groups] config.ini.
     Например, если пользователь test встречается в группах science и mercs,
     возвращается список ["science", "mercs"].
     """
-    config = configparser.ConfigParser()
-    config_path = os.path.join(BASE_DIR, "config.ini")
-    config.read(config_path)
-    groups = []
-    if config.has_section("groups"):
-        for group in config.options("groups"):
-            users_str = config.get("groups", group)
-            users = [u.strip() for u in users_str.split(",") if u.strip()]
-            if user in users:
-                groups.append(group)
-    return groups
+    return list(get_config().groups_for(user))
 
 def get_group_folders(user_group):
     """
@@ -141,17 +139,12 @@ def get_group_folders(user_group):
     Если группа не задана или не найдена, возвращается пустой список.
     Например, для группы clear_sky может вернуться ["Clear_sky", "Science"].
     """
-    config = configparser.ConfigParser()
-    config_path = os.path.join(BASE_DIR, "config.ini")
-    config.read(config_path)
-    if user_group and config.has_section("group_folders") and config.has_option("group_folders", user_group):
-        folders_str = config.get("group_folders", user_group)
-        return [f.strip() for f in folders_str.split(",") if f.strip()]
-    return []
+    return list(get_config().folders_for(user_group))
 
 # ---------------------- Представления ----------------------
 
-@rate_limit('login', max_attempts=5, timeout=300)  # 5 attempts per 5 minutes
+# 5 failed attempts per login and 20 per client in 5 minutes (settings.RATE_LIMITS)
+@rate_limit(LOGIN_POLICY, client_policy=LOGIN_CLIENT_POLICY)
 def login_view(request):
     credentials = read_credentials()
     if request.method == "POST":
@@ -173,136 +166,250 @@ def login_view(request):
             return render(request, "main/login.html", {"error": "Неверные учетные данные"})
     return render(request, "main/login.html")
 
-def build_file_tree(path, current_user=None):
+def build_file_tree(path, current_user=None, lazy=False):
     """
     Рекурсивно строит дерево файлов и папок из указанного пути.
     Сортирует элементы: сначала папки, затем файлы, оба списка по алфавиту.
     Если текущий пользователь не является суперадмином, скрытые папки (из hidden_folders.json) исключаются.
     Если текущий пользователь – суперадмин, то каждому узлу-папке добавляется флаг "is_hidden"
     для изменения цвета отображения.
+    Результат берётся из TREE_CACHE и перестраивается только для изменившихся каталогов.
+    При lazy=True возвращается только первый уровень, папки помечаются флагом "lazy".
     """
-    hidden = read_hidden_folders()  # набор скрытых папок (относительные пути)
+    hidden = get_hidden_folders().paths  # frozenset скрытых папок из кэшированного индекса, один раз на всё дерево
     superadmin = read_folder_visibility_config()  # логин суперадмина
+    if lazy:
+        return TREE_CACHE.get_level(path, FILES_FOLDER, hidden, current_user == superadmin)
+    return TREE_CACHE.get_tree(path, FILES_FOLDER, hidden, current_user == superadmin)
+
+def build_multi_root_tree(roots, current_user=None, lazy=False):
+    """
+    Строит объединённое дерево для нескольких корневых папок.
+    Повторяющиеся и вложенные корни отбрасываются (см. dedupe_roots),
+    оставшиеся обходятся параллельно в TREE_EXECUTOR. Узлы идут в порядке корней.
+    """
+    roots = dedupe_roots(roots)
+    if len(roots) == 1:
+        return list(build_file_tree(roots[0], current_user, lazy=lazy))
+    futures = [TREE_EXECUTOR.submit(build_file_tree, root, current_user, lazy=lazy) for root in roots]
     tree = []
-    try:
-        items = os.listdir(path)
-        items.sort(key=lambda x: (0 if os.path.isdir(os.path.join(path, x)) else 1, x.lower()))
-        for item in items:
-            full_path = os.path.join(path, item)
-            if os.path.isdir(full_path):
-                rel_path = os.path.relpath(full_path, FILES_FOLDER)
-                if current_user != superadmin and rel_path in hidden:
-                    continue  # обычные пользователи не видят скрытые папки
-                node = {
-                    "name": item,
-                    "type": "dir",
-                    "full_path": full_path,
-                    "children": build_file_tree(full_path, current_user)
-                }
-                if current_user == superadmin:
-                    node["is_hidden"] = rel_path in hidden
-                tree.append(node)
-            else:
-                tree.append({
-                    "name": item,
-                    "type": "file",
-                    "path": full_path
-                })
-    except Exception as e:
-        print("Ошибка при построении дерева:", e)
+    for future in futures:
+        tree.extend(future.result())
+    return tree
+
+def get_allowed_roots(user_context):
+    """
+    Возвращает список корневых папок, доступных пользователю в файловом менеджере:
+    суперадмин видит всю FILES_FOLDER, остальные — папки всех своих групп
+    (или всю FILES_FOLDER, если у групп нет папок).
+    Пользователь без групп получает пустой список.
+    """
+    return user_context.allowed_roots(FILES_FOLDER)
+
+def build_manager_tree(roots, current_user, lazy):
+    """
+    Дерево файлового менеджера: суперадмин и группы без папок видят всю
+    FILES_FOLDER одним деревом; папки нескольких групп объединяются и сортируются по имени.
+    """
+    if roots == [FILES_FOLDER]:
+        return build_file_tree(FILES_FOLDER, current_user, lazy=lazy)
+    tree = build_multi_root_tree(roots, current_user, lazy=lazy)
+    tree.sort(key=lambda node: node["name"].lower())
     return tree
 
 def file_manager(request):
-    if not request.session.get("logged_in"):
+    user = request.user_context
+    if not user.logged_in:
         return redirect("login")
-    current_user = request.session.get("login", "unknown")
-    superadmin = read_folder_visibility_config()  # Например, "admin"
-    # Если пользователь является суперадмином, показываем все файлы.
-    if current_user == superadmin:
-        folder_path = FILES_FOLDER
-        tree = build_file_tree(folder_path, current_user)
-    else:
-        # Получаем список групп, к которым принадлежит пользователь.
-        user_groups = get_user_groups(current_user)
-        if not user_groups:
-            error = "Вам не назначена группа доступа — файлы не отображаются."
-            return render(request, "main/file_manager.html", {
-                "tree": [],
-                "error": error,
-                "current_user": current_user,
-                "superadmin": superadmin,
-                "access_level": read_access_levels().get(current_user, 1),
-            })
-        # Для каждой группы получаем список разрешённых папок и объединяем их
-        allowed_folders = []
-        for group in user_groups:
-            allowed_folders.extend(get_group_folders(group))
-        # Если есть хотя бы одна разрешённая папка, строим дерево файлов для каждой из них и объединяем
-        if allowed_folders:
-            tree = []
-            for folder_name in allowed_folders:
-                folder_path_candidate = os.path.join(FILES_FOLDER, folder_name)
-                tree.extend(build_file_tree(folder_path_candidate, current_user))
-            # При необходимости можно отсортировать объединённое дерево:
-            tree.sort(key=lambda node: node["name"].lower())
-        else:
-            tree = build_file_tree(FILES_FOLDER, current_user)
-    # Определяем фон: используем фон для первой группы пользователя (вы можете изменить логику выбора)
-    user_groups = get_user_groups(current_user)
-    if user_groups:
-        background = "images/background_" + user_groups[0] + ".gif"
+    lazy = settings.FILE_TREE_LAZY
+    roots = get_allowed_roots(user)
+    if not roots:
+        error = "Вам не назначена группа доступа — файлы не отображаются."
+        return render(request, "main/file_manager.html", {
+            "tree": [],
+            "error": error,
+            "current_user": user.login,
+            "superadmin": user.superadmin,
+            "access_level": user.access_level,
+        })
+    # Неизменившаяся страница отдаётся ответом 304 без отрисовки. Валидатор —
+    # версия дерева, подпись файла скрытых папок, версия статики и права пользователя.
+    # Первый уровень (ленивый режим) версионируется по mtime корней без построения
+    # дерева; полное дерево берётся из TREE_CACHE, и версия — подпись всех его папок
+    # (см. TreeCache.version/signature): обе одинаковы во всех процессах
+    if lazy:
+        tree = None
+        version = TREE_CACHE.version(roots)
     else:
-        background = "images/background_default.gif"
-    error = request.GET.get("error", "")
-    access_levels = read_access_levels()
-    user_level = access_levels.get(current_user, 1)
-    return render(request, "main/file_manager.html", {
+        tree = build_manager_tree(roots, user.login, lazy)
+        version = TREE_CACHE.signature(roots, tree)
+    etag, not_modified = conditional_response(
+        request, ("tree", version, get_hidden_folders().signature))
+    if not_modified is not None:
+        return not_modified
+    if tree is None:
+        tree = build_manager_tree(roots, user.login, lazy)
+    return set_validators(render(request, "main/file_manager.html", {
         "tree": tree,
-        "error": error,
-        "current_user": current_user,
-        "superadmin": superadmin,
-        "access_level": user_level,
-        "background_path": background,
-    })
+        "error": request.GET.get("error", ""),
+        "current_user": user.login,
+        "superadmin": user.superadmin,
+        "access_level": user.access_level,
+        "background_path": user.background,
+    }), etag)
+
+def file_tree_children(request):
+    """
+    Возвращает один уровень дерева для папки ?node=... (или ?folder=...) в формате JSON:
+    список элементов и готовый HTML-фрагмент для вставки в дерево.
+    Права и скрытые папки проверяются так же, как при построении дерева в file_manager.
+    """
+    folder = node_path(request.GET, "folder")
+    if not folder:
+        return JsonResponse({"success": False, "error": "Папка не указана"}, status=400)
+    abs_folder = os.path.abspath(folder)
+    user = request.user_context
+    # Папка должна быть внутри папок групп пользователя; обычный пользователь
+    # не может раскрыть скрытую папку или папку внутри скрытой
+    if authorize(request, authorization.VIEW, abs_folder) != authorization.ALLOWED or not os.path.isdir(abs_folder):
+        return JsonResponse({"success": False, "error": "Доступ запрещён или папка не найдена"}, status=403)
+    level = build_file_tree(abs_folder, user.login, lazy=True)
+    html_fragment = render_tree_html(level, user.access_level, user.is_superadmin, nested=True)
+    items = [{"name": node.name, "type": node.type, "node": node.handle} for node in level]
+    return JsonResponse({"success": True, "items": items, "html": html_fragment})
+
+def node_path(params, legacy_name):
+    """
+    Путь узла из параметров запроса: ?node=<дескриптор> (см. main/node_handles.py)
+    или прежний ?file=/?folder= с полным путём — старые ссылки продолжают работать.
+    None, если узел не указан или дескриптор неизвестен.
+    """
+    handle = params.get("node")
+    if handle:
+        return NODE_HANDLES.resolve(handle)
+    return params.get(legacy_name)
+
+def node_url(name, path, **params):
+    """URL представления name для узла path: ?node=<дескриптор>&...."""
+    return reverse(name) + "?" + urlencode({"node": NODE_HANDLES.register(path), **params})
+
+def conditional_response(request, parts, last_modified=None):
+    """
+    Валидаторы страницы: слабый ETag из parts, профиля прав пользователя
+    (UserContext.profile) и версии статики (asset_version) и, если задано,
+    Last-Modified (время в секундах).
+    Возвращает (etag, ответ 304 или None): при совпадении If-None-Match
+    или If-Modified-Since страницу можно не строить.
+    """
+    digest = hashlib.blake2b(repr((request.user_context.profile, asset_version(), *parts)).encode(),
+                             digest_size=12).hexdigest()
+    etag = f'W/"{digest}"'
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return etag, response
+
+def asset_version():
+    """
+    Версия статики, на которую ссылаются страницы: хэш манифеста collectstatic
+    (имена файлов с хэшем содержимого, см. STATIC_PIPELINE) и подпись манифеста
+    optimize_assets. После выкладки новой статики ETag страниц меняются, и ответ
+    304 не оживит HTML со ссылками на уже удалённые файлы.
+    """
+    return getattr(staticfiles_storage, "manifest_hash", ""), get_asset_variants().signature
+
+def asset_modified():
+    """Время (в секундах) последнего изменения манифестов статики из asset_version."""
+    paths = [settings.ASSET_VARIANTS_MANIFEST]
+    manifest_name = getattr(staticfiles_storage, "manifest_name", None)
+    if manifest_name:
+        paths.append(staticfiles_storage.manifest_storage.path(manifest_name))
+    mtimes = [0]
+    for path in paths:
+        try:
+            mtimes.append(int(os.stat(path).st_mtime))
+        except OSError:
+            pass
+    return max(mtimes)
+
+def set_validators(response, etag, last_modified=None):
+    """Добавляет к ответу ETag, Last-Modified и Cache-Control для условных запросов."""
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    # Страница зависит от прав пользователя: общие кэши её не хранят, браузер перепроверяет при каждом открытии
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+def get_authorizer(snapshot):
+    """
+    Проверка прав по путям для снимка config.ini и hidden_folders.json
+    (см. main/authorization.py). Views берут её через authorize, чтобы все
+    проверки одного запроса шли по снимку request.user_context.
+    """
+    return authorization.get_authorizer(FILES_FOLDER, snapshot, get_hidden_folders())
+
+def authorize(request, action, path):
+    """
+    Может ли текущий пользователь выполнить действие над путём:
+    authorization.ALLOWED или причина отказа. Права берутся из того же снимка
+    config.ini, что и request.user_context.
+    """
+    context = request.user_context
+    return get_authorizer(context.snapshot).check(context.login, action, path)
+
+# Отказ из-за пути (вне папки с файлами, вне папок групп или в скрытой папке)
+DENIED = (authorization.OUTSIDE, authorization.FORBIDDEN)
+
+def file_stream(request):
+    """
+    Отдаёт содержимое файла потоком, частями по FILE_STREAM_CHUNK_SIZE байт.
+    Поддерживает заголовок Range (один диапазон): ответ 206 с Content-Range,
+    либо 416, если диапазон за пределами файла. Права те же, что у file_view.
+    """
+    file_path = node_path(request.GET, "file")
+    if not file_path:
+        return HttpResponseBadRequest("Файл не указан")
+    if authorize(request, authorization.VIEW, file_path) != authorization.ALLOWED:
+        return HttpResponseForbidden("Доступ запрещён")
+    if not os.path.isfile(file_path):
+        return HttpResponseNotFound("Файл не найден")
+    size = os.path.getsize(file_path)
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+    response = StreamingHttpResponse(
+        iter_file_range(file_path, start, end, settings.FILE_STREAM_CHUNK_SIZE),
+        status=status,
+        content_type="text/plain; charset=utf-8",
+    )
+    response["Content-Length"] = str(max(end - start + 1, 0))
+    response["Accept-Ranges"] = "bytes"
+    if status == 206:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
 
 def file_view(request):
-    if not request.session.get("logged_in"):
+    user = request.user_context
+    if not user.logged_in:
         return redirect("login")
-    file_path = request.GET.get("file")
+    file_path = node_path(request.GET, "file")
     if not file_path:
         return HttpResponse("Файл не указан")
 
-    abs_file_path = os.path.abspath(file_path)
-    abs_files_folder = os.path.abspath(FILES_FOLDER)
-    if not abs_file_path.startswith(abs_files_folder):
-        return HttpResponse("Доступ запрещён")
-
     filename = os.path.basename(file_path)
-    current_user = request.session.get("login", "unknown")
-    superadmin = read_folder_visibility_config()  # Значение из [folder_visibility], например, "admin"
-    # Получаем список групп пользователя
-    user_groups = get_user_groups(current_user)
-    user_group = user_groups[0] if user_groups else None
-
-    # Если пользователь не суперадмин, применяем групповые ограничения
-    if current_user != superadmin:
-        if user_group is None:
-            return HttpResponse("Доступ запрещён")
-        allowed_folders = get_group_folders(user_group)  # возвращает список, например, ["Clear_sky", "Science"]
-        if allowed_folders:
-            allowed = False
-            for folder_name in allowed_folders:
-                allowed_folder = os.path.join(FILES_FOLDER, folder_name)
-                abs_allowed_folder = os.path.abspath(allowed_folder)
-                if abs_file_path.startswith(abs_allowed_folder):
-                    allowed = True
-                    break
-            if not allowed:
-                return HttpResponse("Доступ запрещён")
-    if user_group:
-        background = "images/background_" + user_group + ".gif"
-    else:
-        background = "images/background_default.gif"
+    current_user = user.login
+    # Файл должен лежать в папках групп пользователя и не в скрытой папке (кроме суперадмина)
+    if authorize(request, authorization.VIEW, file_path) != authorization.ALLOWED:
+        return HttpResponse("Доступ запрещён")
+    background = user.background
 
     # Обработка разных мини-игр по имени файла
     lower_filename = filename.lower()
@@ -316,49 +423,131 @@ def file_view(request):
         return render(request, "main/blackjack.html", {"background_path": background})
 
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
+        stat = os.stat(file_path)
+    except OSError:
+        # Файл не читается — страница с ошибкой, без валидаторов
+        return file_view_content(request, file_path, filename, current_user, background, 0)
+    # Неизменившийся файл (те же mtime и размер) отдаётся ответом 304 без чтения и отрисовки;
+    # открытие всё равно попадает в журнал
+    # Last-Modified передаётся с точностью до секунды — с ней и сравнивается If-Modified-Since;
+    # страница не старше выкладки статики, на которую она ссылается
+    last_modified = max(int(stat.st_mtime), asset_modified())
+    etag, not_modified = conditional_response(request, ("file", file_path, stat.st_mtime_ns, stat.st_size),
+                                              last_modified)
+    if not_modified is not None:
+        log_event("OPENED", f"user='{current_user}', file='{filename}'")
+        return not_modified
+    response = file_view_content(request, file_path, filename, current_user, background, stat.st_size)
+    return set_validators(response, etag, last_modified)
+
+def file_view_content(request, file_path, filename, current_user, background, file_size):
+    """Страница просмотра файла: постранично, потоком для больших файлов или целиком."""
+    user = request.user_context
+    # Постраничный просмотр: ?page=N (страницы по FILE_VIEW_PAGE_LINES строк)
+    # или ?line=N (окно, начинающееся со строки N). Нужный кусок находится
+    # по кэшированному индексу строк, файл целиком не читается.
+    if request.GET.get("page") or request.GET.get("line"):
+        return file_view_page(request, file_path, filename, current_user, background)
+
+    # Большие файлы не читаются целиком: страница получает только адрес,
+    # а содержимое подгружается частями через file_stream
+    if file_size > settings.FILE_VIEW_STREAM_THRESHOLD:
+        log_event("OPENED", f"user='{current_user}', file='{filename}'")
+        return render(request, "main/file_view.html", {
+            "chunks": (),
+            "file": file_path,
+            "filename": filename,
+            "background_path": background,
+            "access_level": user.access_level,
+            "node": NODE_HANDLES.register(file_path),
+            "stream_url": node_url("file_stream", file_path),
+            "file_size": file_size,
+            "paged_url": node_url("file_view", file_path, page=1),
+        })
+
+    # Текст разбирается на фрагменты один раз и берётся из кэша;
+    # в браузер уходит готовый список фрагментов (см. tokenize_content)
+    try:
+        chunks = CONTENT_CACHE.read(file_path)
     except Exception as e:
-        content = "Ошибка при открытии файла: " + str(e)
+        chunks = ("Ошибка при открытии файла: " + str(e),)
 
-    if not content.strip():
+    if is_blank(chunks):
         error_code = random.randint(1000, 9999)
-        content = f"Ошибка {error_code}: Файл пустой или поврежден."
+        chunks = (f"Ошибка {error_code}: Файл пустой или поврежден.",)
 
     log_event("OPENED", f"user='{current_user}', file='{filename}'")
     return render(request, "main/file_view.html", {
-        "content": content,
+        "chunks": chunks,
+        "file": file_path,
+        "node": NODE_HANDLES.register(file_path),
+        "filename": filename,
+        "background_path": background,
+        "access_level": user.access_level,
+    })
+
+def file_view_page(request, file_path, filename, current_user, background):
+    """Окно из FILE_VIEW_PAGE_LINES строк файла со ссылками на соседние страницы."""
+    page_lines = settings.FILE_VIEW_PAGE_LINES
+    try:
+        if request.GET.get("line"):
+            first = max(int(request.GET["line"]), 1) - 1
+        else:
+            first = (max(int(request.GET["page"]), 1) - 1) * page_lines
+    except ValueError:
+        return HttpResponseBadRequest("Некорректный номер страницы или строки")
+    try:
+        content, total_lines = read_lines(file_path, first, page_lines)
+    except OSError as e:
+        content, total_lines = "Ошибка при открытии файла: " + str(e), 0
+    if first >= total_lines > 0:
+        # Окно за концом файла — показываем последнюю страницу
+        first = (total_lines - 1) // page_lines * page_lines
+        content, total_lines = read_lines(file_path, first, page_lines)
+    chunks = tokenize_content(content)
+    if is_blank(chunks):
+        error_code = random.randint(1000, 9999)
+        chunks = (f"Ошибка {error_code}: Файл пустой или поврежден.",)
+
+    def window_url(line):
+        return node_url("file_view", file_path, line=line + 1)
+
+    page = {
+        "first_line": first + 1,
+        "last_line": min(first + page_lines, total_lines),
+        "total_lines": total_lines,
+        "prev_url": window_url(max(first - page_lines, 0)) if first > 0 else None,
+        "next_url": window_url(first + page_lines) if first + page_lines < total_lines else None,
+    }
+    log_event("OPENED", f"user='{current_user}', file='{filename}', lines={page['first_line']}-{page['last_line']}")
+    return render(request, "main/file_view.html", {
+        "chunks": chunks,
         "file": file_path,
+        "node": NODE_HANDLES.register(file_path),
         "filename": filename,
         "background_path": background,
-        "access_level": read_access_levels().get(current_user, 1),
+        "access_level": request.user_context.access_level,
+        "page": page,
     })
 
 def process_file_content(content):
-    pattern = r'(https?://[^\s]+\.(?:jpg|jpeg|png|gif)(?:\?[^\s]+)?)(?=$|\s|[\'"<>])'
-    def repl(match):
-        url = match.group(1)
-        safe_url = url.replace("&", "&amp;")
-        return f'<img src="{safe_url}" alt="Image" style="max-width:100%; margin:5px 0;">'
-    processed = re.sub(pattern, repl, content, flags=re.IGNORECASE)
-    return mark_safe(processed)
+    """HTML содержимого файла: текст экранирован, ссылки на изображения заменены на <img>."""
+    return mark_safe(chunks_to_html(tokenize_content(content)))
 
 def create_file(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
-    folder = request.GET.get("folder")
+    folder = node_path(request.GET, "folder")
     if not folder:
         return HttpResponseBadRequest("Папка не указана")
     abs_folder = os.path.abspath(folder)
-    if not abs_folder.startswith(os.path.abspath(FILES_FOLDER)) or not os.path.isdir(abs_folder):
+    allowed = authorize(request, authorization.CREATE, abs_folder)
+    if allowed in DENIED or not os.path.isdir(abs_folder):
         return HttpResponse("Доступ запрещён или папка не найдена")
-    access = read_access_levels()
-    user = request.session.get("login", "unknown")
-    if access.get(user, 1) < 2:
+    user = request.user_context.login
+    if allowed == authorization.LEVEL:
         return redirect(f"/file-manager/?{urlencode({'error':'Нет прав на создание файлов.'})}")
-    _, restricted = read_restrictions()
-    folder_name = os.path.basename(abs_folder).strip().upper()
-    if folder_name in restricted:
+    if allowed == authorization.RESTRICTED:
         return redirect(f"/file-manager/?{urlencode({'error':'Нельзя создавать файлы в корневой папке этого диска.'})}")
     if request.method == "POST":
         filename = request.POST.get("filename", "").strip()
@@ -373,38 +562,35 @@ def create_file(request):
         try:
             with open(file_path, "w", encoding="utf-8") as f:
                 f.write(content)
+            TREE_CACHE.invalidate(folder)
             log_event("CREATED", f"user='{user}', file='{filename}'")
-            return redirect(f"/file-view/?file={file_path}")
+            return redirect(node_url("file_view", file_path))
         except Exception as e:
             return redirect(f"/file-manager/?{urlencode({'error':'Ошибка создания файла: ' + str(e)})}")
     return render(request, "main/create_file.html", {"folder": folder})
 
 def edit_file(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
-    file_path = request.GET.get("file")
+    file_path = node_path(request.GET, "file")
     if not file_path:
         return HttpResponseBadRequest("Файл не указан")
     abs_fp = os.path.abspath(file_path)
-    if not abs_fp.startswith(os.path.abspath(FILES_FOLDER)):
+    allowed = authorize(request, authorization.EDIT, abs_fp)
+    if allowed in DENIED:
         return HttpResponse("Доступ запрещён")
     filename = os.path.basename(file_path).strip().lower()
-    restricted_files, _ = read_restrictions()
-    if filename in restricted_files:
+    if allowed == authorization.RESTRICTED:
         return HttpResponse("Редактирование этого файла запрещено.")
-    current_user = request.session.get("login", "unknown")
-    user_group = get_user_groups(current_user)[0] if get_user_groups(current_user) else None
-    if user_group:
-        background = "images/background_"+user_group+".gif"
-    else:
-        background = "images/background_default.gif"
+    background = request.user_context.background
     if request.method == "POST":
         new_content = request.POST.get("content", "").rstrip()  # Remove trailing whitespace
         try:
             with open(file_path, "w", encoding="utf-8", newline='') as f:  # Use newline='' to prevent extra line endings
                 f.write(new_content)
-            log_event("EDITED", f"user='{request.session.get('login', 'unknown')}', file='{filename}'")
-            return redirect(f"/file-view/?file={file_path}")
+            CONTENT_CACHE.invalidate(file_path)
+            log_event("EDITED", f"user='{request.user_context.login}', file='{filename}'")
+            return redirect(node_url("file_view", file_path))
         except Exception as e:
             return HttpResponse("Ошибка сохранения файла: " + str(e))
     else:
@@ -415,23 +601,24 @@ def edit_file(request):
             content = "Ошибка открытия файла: " + str(e)
         return render(request, "main/edit_file.html", {
             "file": file_path,
+            "node": NODE_HANDLES.register(file_path),
             "filename": filename,
             "content": content,
             "background_path": background,
         })
 
 def create_folder(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
-    folder = request.GET.get("folder")
+    folder = node_path(request.GET, "folder")
     if not folder:
         return HttpResponseBadRequest("Папка не указана")
     abs_folder = os.path.abspath(folder)
-    if not abs_folder.startswith(os.path.abspath(FILES_FOLDER)) or not os.path.isdir(abs_folder):
+    allowed = authorize(request, authorization.CREATE_FOLDER, abs_folder)
+    if allowed in DENIED or not os.path.isdir(abs_folder):
         return HttpResponse("Доступ запрещён или папка не найдена")
-    access = read_access_levels()
-    user = request.session.get("login", "unknown")
-    if access.get(user, 1) < 2:
+    user = request.user_context.login
+    if allowed == authorization.LEVEL:
         return redirect(f"/file-manager/?{urlencode({'error':'Нет прав на создание папок.'})}")
     if request.method == "POST":
         folder_name = request.POST.get("folder_name", "").strip()
@@ -442,6 +629,8 @@ def create_folder(request):
             return render(request, "main/create_folder.html", {"error": "Папка с таким названием уже существует.", "folder": folder})
         try:
             os.makedirs(new_folder_path)
+            TREE_CACHE.invalidate(folder)
+            TREE_CACHE.invalidate(os.path.dirname(os.path.abspath(new_folder_path)))
             log_event("CREATED_FOLDER", f"user='{user}', folder='{folder_name}'")
             return redirect("file_manager")
         except Exception as e:
@@ -449,18 +638,16 @@ def create_folder(request):
     return render(request, "main/create_folder.html", {"folder": folder})
 
 def toggle_folder_visibility(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
-    folder = request.GET.get("folder")
+    folder = node_path(request.GET, "folder")
     if not folder:
         return HttpResponseBadRequest("Папка не указана")
     abs_folder = os.path.abspath(folder)
-    abs_files_folder = os.path.abspath(FILES_FOLDER)
-    if not abs_folder.startswith(abs_files_folder) or not os.path.isdir(abs_folder):
+    # Видимость меняет только суперадмин, а ему доступна вся папка с файлами
+    if authorize(request, authorization.VIEW, abs_folder) == authorization.OUTSIDE or not os.path.isdir(abs_folder):
         return HttpResponse("Доступ запрещён или папка не найдена")
-    superadmin = read_folder_visibility_config()
-    user = request.session.get("login", "unknown")
-    if user != superadmin:
+    if not request.user_context.is_superadmin:
         return HttpResponse("Нет прав для изменения видимости папок.")
     rel_path = os.path.relpath(abs_folder, FILES_FOLDER)
     hidden = read_hidden_folders()
@@ -469,33 +656,35 @@ def toggle_folder_visibility(request):
     else:
         hidden.add(rel_path)
     write_hidden_folders(hidden)
+    TREE_CACHE.invalidate_visibility(abs_folder)
     return redirect("file_manager")
 
 def delete_file(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
-    file_path = request.GET.get("file")
+    file_path = node_path(request.GET, "file")
     if not file_path:
         return HttpResponseBadRequest("Файл не указан")
     abs_fp = os.path.abspath(file_path)
-    if not abs_fp.startswith(os.path.abspath(FILES_FOLDER)):
+    allowed = authorize(request, authorization.DELETE, abs_fp)
+    if allowed in DENIED:
         return HttpResponse("Доступ запрещён")
     if not os.path.exists(file_path) or os.path.isdir(file_path):
         return HttpResponse("Файл не найден или это папка")
-    filename = os.path.basename(file_path).strip().lower()
-    restricted_files, _ = read_restrictions()
-    if filename in restricted_files:
+    if allowed == authorization.RESTRICTED:
         error_message = "Удаление этого файла запрещено."
-        tree = build_file_tree(FILES_FOLDER, request.session.get("login", "unknown"))
+        tree = build_file_tree(FILES_FOLDER, request.user_context.login)
         return render(request, "main/file_manager.html", {"tree": tree, "error": error_message})
-    access = read_access_levels()
-    user = request.session.get("login", "unknown")
-    if access.get(user, 1) < 3:
+    user = request.user_context.login
+    if allowed == authorization.LEVEL:
         error_message = "У вас нет прав на удаление файлов."
         tree = build_file_tree(FILES_FOLDER, user)
         return render(request, "main/file_manager.html", {"tree": tree, "error": error_message})
     try:
         os.remove(file_path)
+        NODE_HANDLES.discard(abs_fp)
+        CONTENT_CACHE.invalidate(abs_fp)
+        TREE_CACHE.invalidate(os.path.dirname(abs_fp))
         log_event("DELETED", f"user='{user}', file='{os.path.basename(file_path)}'")
     except Exception as e:
         error_message = "Ошибка удаления файла: " + str(e)
@@ -504,21 +693,23 @@ def delete_file(request):
     return redirect("file_manager")
 
 def move_file(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
-    access_levels = read_access_levels()
-    user = request.session.get("login", "unknown")
-    if access_levels.get(user, 1) < 2:
-        error_msg = "У вас нет прав на перемещение файлов."
-        return redirect(f"/file-manager/?{urlencode({'error': error_msg})}")
-    source_file = request.GET.get("file")
+    user = request.user_context.login
+    source_file = node_path(request.GET, "file")
     if not source_file:
         return HttpResponseBadRequest("Исходный файл не указан")
     abs_source = os.path.abspath(source_file)
-    if not abs_source.startswith(os.path.abspath(FILES_FOLDER)):
+    allowed = authorize(request, authorization.MOVE, abs_source)
+    if allowed == authorization.LEVEL:
+        error_msg = "У вас нет прав на перемещение файлов."
+        return redirect(f"/file-manager/?{urlencode({'error': error_msg})}")
+    if allowed in DENIED:
         return HttpResponse("Доступ запрещён")
     if not os.path.exists(source_file) or os.path.isdir(source_file):
         return HttpResponse("Исходный файл не найден или это папка")
+    if allowed == authorization.RESTRICTED:
+        return HttpResponse("Перемещение этого файла запрещено.")
     if request.method == "GET":
         return render(request, "main/move_file.html", {"file": source_file})
     elif request.method == "POST":
@@ -527,7 +718,8 @@ def move_file(request):
             error_msg = "Укажите целевую папку."
             return render(request, "main/move_file.html", {"error": error_msg, "file": source_file})
         abs_destination = os.path.abspath(destination)
-        if not abs_destination.startswith(os.path.abspath(FILES_FOLDER)) or not os.path.isdir(abs_destination):
+        if (authorize(request, authorization.MOVE_TO, abs_destination) != authorization.ALLOWED
+                or not os.path.isdir(abs_destination)):
             error_msg = "Целевая папка не найдена или доступ запрещён."
             return render(request, "main/move_file.html", {"error": error_msg, "file": source_file})
         filename = os.path.basename(source_file)
@@ -537,57 +729,73 @@ def move_file(request):
             return render(request, "main/move_file.html", {"error": error_msg, "file": source_file})
         try:
             os.rename(source_file, target_file)
+            NODE_HANDLES.move(abs_source, target_file)
+            CONTENT_CACHE.invalidate(abs_source)
+            CONTENT_CACHE.invalidate(target_file)
+            TREE_CACHE.invalidate(os.path.dirname(abs_source))
+            TREE_CACHE.invalidate(abs_destination)
             log_event("MOVED", f"user='{user}', file='{filename}', from='{source_file}', to='{target_file}'")
             return redirect("file_manager")
         except Exception as e:
             error_msg = "Ошибка перемещения файла: " + str(e)
             return render(request, "main/move_file.html", {"error": error_msg, "file": source_file})
 @csrf_exempt
+@throttle(MOVE_FILE_POLICY)
 def move_file_ajax(request):
     if request.method == "POST":
         try:
             data = json.loads(request.body)
-            file_path = unquote(data.get("file"))
-            dest_folder = unquote(data.get("folder"))
-            BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            ALLOWED_FOLDER = os.path.join(BASE_DIR, "KOD OS 1.5")
+            # Дерево присылает дескрипторы file_node/folder_node, прежние клиенты — пути file/folder
+            if "file_node" in data:
+                file_path = NODE_HANDLES.resolve(data.get("file_node") or "")
+                dest_folder = NODE_HANDLES.resolve(data.get("folder_node") or "")
+                if not file_path or not dest_folder:
+                    return JsonResponse({"success": False, "error": "Файл или папка не найдены."})
+            else:
+                file_path = unquote(data.get("file"))
+                dest_folder = unquote(data.get("folder"))
             abs_file_path = os.path.abspath(file_path)
             abs_dest_folder = os.path.abspath(dest_folder)
-            if not abs_file_path.startswith(ALLOWED_FOLDER) or not abs_dest_folder.startswith(ALLOWED_FOLDER):
+            allowed = authorize(request, authorization.MOVE, abs_file_path)
+            destination = authorize(request, authorization.MOVE_TO, abs_dest_folder)
+            if allowed in DENIED or destination in DENIED:
                 return JsonResponse({"success": False, "error": "Доступ запрещён."})
-            restricted_files, _ = read_restrictions()
-            filename = os.path.basename(file_path).strip().lower()
-            if filename in restricted_files:
+            if allowed == authorization.RESTRICTED:
                 return JsonResponse({"success": False, "error": "Перемещение этого файла запрещено."})
+            if authorization.LEVEL in (allowed, destination):
+                return JsonResponse({"success": False, "error": "У вас нет прав на перемещение файлов."})
+            filename = os.path.basename(file_path).strip().lower()
             target_path = os.path.join(dest_folder, filename)
             if not os.path.exists(abs_file_path):
                 return JsonResponse({"success": True})
             os.rename(file_path, target_path)
-            log_event("MOVED", f"user='{request.session.get('login', 'unknown')}', file='{filename}', from='{file_path}', to='{target_path}'")
+            NODE_HANDLES.move(abs_file_path, target_path)
+            CONTENT_CACHE.invalidate(abs_file_path)
+            CONTENT_CACHE.invalidate(target_path)
+            TREE_CACHE.invalidate(os.path.dirname(abs_file_path))
+            TREE_CACHE.invalidate(abs_dest_folder)
+            log_event("MOVED", f"user='{request.user_context.login}', file='{filename}', from='{file_path}', to='{target_path}'")
             return JsonResponse({"success": True})
         except Exception as e:
             return JsonResponse({"success": False, "error": str(e)})
     return JsonResponse({"success": False, "error": "Неверный метод запроса."})
 
 def delete_folder(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
-    folder = request.GET.get("folder")
+    folder = node_path(request.GET, "folder")
     if not folder:
         return HttpResponseBadRequest("Папка не указана")
     abs_folder = os.path.abspath(folder)
-    abs_files_folder = os.path.abspath(FILES_FOLDER)
-    if not abs_folder.startswith(abs_files_folder):
+    allowed = authorize(request, authorization.DELETE_FOLDER, abs_folder)
+    if allowed in DENIED:
         return HttpResponse("Доступ запрещён")
     if not os.path.exists(folder) or not os.path.isdir(folder):
         return HttpResponse("Папка не найдена")
-    _, restricted_folders = read_restrictions()
-    folder_name = os.path.basename(abs_folder).strip().upper()
-    if folder_name in restricted_folders:
+    if allowed == authorization.RESTRICTED:
         return HttpResponse("Удаление этой папки запрещено.")
-    access = read_access_levels()
-    user = request.session.get("login", "unknown")
-    if access.get(user, 1) < 3:
+    user = request.user_context.login
+    if allowed == authorization.LEVEL:
         error_message = "У вас нет прав на удаление папок."
         tree = build_file_tree(FILES_FOLDER, user)
         return render(request, "main/file_manager.html", {"tree": tree, "error": error_message})
@@ -595,6 +803,9 @@ def delete_folder(request):
         return HttpResponse("Папка не пустая, удаление запрещено.")
     try:
         os.rmdir(folder)
+        NODE_HANDLES.discard(abs_folder)
+        TREE_CACHE.forget(abs_folder)
+        TREE_CACHE.invalidate(os.path.dirname(abs_folder))
         log_event("DELETED_FOLDER", f"user='{user}', folder='{os.path.basename(folder)}'")
         return redirect("file_manager")
     except Exception as e:
@@ -602,23 +813,172 @@ def delete_folder(request):
         tree = build_file_tree(FILES_FOLDER, user)
         return render(request, "main/file_manager.html", {"tree": tree, "error": error_message})
 
+# Типы событий, которые пишет log_event (для фильтра на странице аудита)
+AUDIT_EVENT_TYPES = ("SUCCESS", "FAILED", "OPENED", "CREATED", "EDITED", "MOVED", "DELETED",
+                     "CREATED_FOLDER", "DELETED_FOLDER")
+
+def audit_log(request):
+    """
+    Просмотр журнала событий для суперадмина: фильтры ?user=, ?event=,
+    ?since=, ?until= (время как в журнале, "ГГГГ-ММ-ДД ЧЧ:ММ:СС" или его начало)
+    и постраничный вывод по курсору ?before=ts|id.
+    """
+    if not request.user_context.logged_in:
+        return redirect("login")
+    if not request.user_context.is_superadmin:
+        return HttpResponseForbidden("Доступ запрещён")
+    filters = {name: request.GET.get(name, "").strip() for name in ("user", "event", "since", "until")}
+    before = None
+    if request.GET.get("before"):
+        ts, _, event_id = request.GET["before"].rpartition("|")
+        if not ts or not event_id.isdigit():
+            return HttpResponseBadRequest("Некорректный курсор страницы")
+        before = (ts, int(event_id))
+    # until без времени ("2013-05-01") должен включать весь день
+    until = filters["until"]
+    if until and len(until) < 19:
+        until += "\uffff"
+    events, cursor = EVENT_STORE.query(
+        user=filters["user"], event_type=filters["event"], since=filters["since"], until=until,
+        before=before, limit=settings.AUDIT_PAGE_SIZE,
+    )
+    next_url = None
+    if cursor:
+        params = {name: value for name, value in filters.items() if value}
+        params["before"] = f"{cursor[0]}|{cursor[1]}"
+        next_url = reverse("audit_log") + "?" + urlencode(params)
+    return render(request, "main/audit_log.html", {
+        "events": events,
+        "filters": filters,
+        "event_types": AUDIT_EVENT_TYPES,
+        "next_url": next_url,
+        "first_page_url": reverse("audit_log") + "?" + urlencode({k: v for k, v in filters.items() if v}),
+        "is_first_page": before is None,
+    })
+
+def log_monitor(request):
+    """Страница наблюдения за журналом для суперадмина; новые события приходят через log_tail."""
+    if not request.user_context.logged_in:
+        return redirect("login")
+    if not request.user_context.is_superadmin:
+        return HttpResponseForbidden("Доступ запрещён")
+    return render(request, "main/log_monitor.html", {
+        # Пауза между запросами страницы (мс); при LOG_TAIL_WAIT сервер сам ждёт событий
+        "poll_delay": 0 if settings.LOG_TAIL_WAIT else int(settings.LOG_TAIL_POLL_EVERY * 1000),
+    })
+
+def log_tail(request):
+    """
+    Новые события журнала для суперадмина.
+    Без ?cursor= возвращает последние LOG_TAIL_INITIAL событий и курсор конца
+    журнала. С курсором — события, дописанные после него, и новый курсор;
+    если новых событий нет, ответ пустой и отдаётся сразу, а страница
+    повторяет запрос через LOG_TAIL_POLL_EVERY секунд.
+    Только при LOG_TAIL_WAIT (развёртывание с потоками или асинхронными
+    воркерами) запрос без новых событий ждёт их до LOG_TAIL_TIMEOUT секунд
+    (long-poll), а с заголовком Accept: text/event-stream (или ?stream=1)
+    отдаётся поток Server-Sent Events: одно сообщение на событие, курсор в
+    поле id; поток живёт не дольше LOG_TAIL_STREAM_LIFETIME секунд.
+    """
+    if not request.user_context.logged_in:
+        return redirect("login")
+    if not request.user_context.is_superadmin:
+        return HttpResponseForbidden("Доступ запрещён")
+    # При переподключении EventSource присылает последний полученный id — он важнее исходного ?cursor=
+    cursor = request.headers.get("Last-Event-ID") or request.GET.get("cursor")
+    if cursor is not None and not cursor.isdigit():
+        return HttpResponseBadRequest("Некорректный курсор")
+    if request.GET.get("stream") or "text/event-stream" in request.headers.get("Accept", ""):
+        if not settings.LOG_TAIL_WAIT:
+            return HttpResponseNotFound("Поток событий отключён (LOG_TAIL_WAIT)")
+        start = int(cursor) if cursor is not None else LOG_READER.end_cursor()
+        response = StreamingHttpResponse(_log_tail_stream(start), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+    if cursor is None:
+        end = LOG_READER.end_cursor()
+        return JsonResponse({"events": LOG_READER.tail(settings.LOG_TAIL_INITIAL), "cursor": end})
+    cursor = int(cursor)
+    deadline = time.monotonic() + settings.LOG_TAIL_TIMEOUT
+    while True:
+        # Дешёвая проверка без чтения: сравниваем курсор с концом журнала
+        if LOG_READER.end_cursor() != cursor:
+            events, new_cursor = LOG_READER.read_from(cursor)
+            if events or new_cursor != cursor:
+                return JsonResponse({"events": events, "cursor": new_cursor})
+        if not settings.LOG_TAIL_WAIT or time.monotonic() >= deadline:
+            return JsonResponse({"events": [], "cursor": cursor})
+        time.sleep(settings.LOG_TAIL_POLL_INTERVAL)
+
+def _log_tail_stream(cursor):
+    """
+    Генератор Server-Sent Events для log_tail; раз в LOG_TAIL_TIMEOUT секунд шлёт
+    комментарий-пинг. Через LOG_TAIL_STREAM_LIFETIME секунд поток завершается:
+    EventSource переподключается через LOG_TAIL_RETRY миллисекунд с последним
+    id в Last-Event-ID, и между подключениями процесс свободен для других запросов.
+    """
+    started = last_sent = time.monotonic()
+    while True:
+        if LOG_READER.end_cursor() != cursor:
+            events, cursor = LOG_READER.read_from(cursor)
+            for number, event in enumerate(events, 1):
+                data = "\n".join("data: " + line for line in event.split("\n"))
+                # id только у последнего события пачки: при переподключении пачка придёт
+                # повторно целиком, но ничего не потеряется
+                event_id = f"id: {cursor}\n" if number == len(events) else ""
+                yield f"{event_id}{data}\n\n"
+                last_sent = time.monotonic()
+        if time.monotonic() - started >= settings.LOG_TAIL_STREAM_LIFETIME:
+            yield f"retry: {settings.LOG_TAIL_RETRY}\n\n"
+            return
+        if time.monotonic() - last_sent >= settings.LOG_TAIL_TIMEOUT:
+            yield ": ping\n\n"
+            last_sent = time.monotonic()
+        time.sleep(settings.LOG_TAIL_POLL_INTERVAL)
+
+def cache_stats(request):
+    """
+    Статистика кэшей процесса для суперадмина: каждого кэша из CACHES,
+    который её ведёт (BoundedMemoryCache), и кэша содержимого файлов.
+    С ?format=json отдаёт те же данные в JSON. Счётчики — только этого
+    WSGI-процесса.
+    """
+    if not request.user_context.logged_in:
+        return redirect("login")
+    if not request.user_context.is_superadmin:
+        return HttpResponseForbidden("Доступ запрещён")
+    backends = {}
+    for alias in settings.CACHES:
+        backend = caches[alias]
+        if hasattr(backend, "stats"):
+            backends[alias] = backend.stats()
+    content = CONTENT_CACHE.stats()
+    if request.GET.get("format") == "json":
+        return JsonResponse({"pid": os.getpid(), "caches": backends, "file_content": content})
+    return render(request, "main/cache_stats.html", {
+        "pid": os.getpid(),
+        "caches": backends,
+        "file_content": content,
+    })
+
 def snake_game(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
     return render(request, "main/snake.html")
 
 def pong_game(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
     return render(request, "main/pong.html")
 
 def hacking_game(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
     return render(request, "main/hacking.html")
 
 def blackjack_game(request):
-    if not request.session.get("logged_in"):
+    if not request.user_context.logged_in:
         return redirect("login")
     return render(request, "main/blackjack.html")
 
@@ -636,6 +996,7 @@ def get_glitch_state(request):
     return JsonResponse(state)
 
 @csrf_exempt
+@throttle(GLITCH_STATE_POLICY)
 def update_glitch_state(request):
     """
     Обновляет состояние глич-эффекта.
@@ -1,12 +1,59 @@
+// URL для подгрузки содержимого папки (один уровень дерева)
+var FILE_TREE_CHILDREN_URL = "/file-tree-children/";
+
+// Подгружает содержимое "ленивой" папки и вставляет его в контейнер children.
+// Повторные вызовы для той же папки используют один и тот же запрос.
+function loadFolderChildren(element, container) {
+    if (container._loading) {
+        return container._loading;
+    }
+    // data-folder — дескриптор папки (base64url), кодировать его не нужно
+    var url = FILE_TREE_CHILDREN_URL + "?node=" + element.getAttribute("data-folder");
+    container._loading = fetch(url, { credentials: "same-origin" })
+        .then(function(response) { return response.json(); })
+        .then(function(data) {
+            if (!data.success) {
+                throw new Error(data.error);
+            }
+            container.innerHTML = data.html;
+            container.removeAttribute("data-lazy");
+            // Если пользователь уже выбрал файл для перемещения, показываем приёмники и в новых папках
+            if (typeof fileToMove !== "undefined" && fileToMove) {
+                var destButtons = container.querySelectorAll('.move-dest-btn');
+                for (var i = 0; i < destButtons.length; i++) {
+                    destButtons[i].style.display = 'inline-block';
+                }
+            }
+            return container;
+        })
+        .catch(function(error) {
+            container._loading = null;
+            console.error("Ошибка загрузки содержимого папки:", error);
+            throw error;
+        });
+    return container._loading;
+}
+
+function expandFolder(element, container) {
+    container.style.display = "block";
+    element.classList.add('open');
+}
+
 // Функция для переключения раскрытия/сворачивания папок
 function toggleFolder(element) {
     var headerDiv = element.parentElement;
     var next = headerDiv.nextElementSibling;
     if (next && next.classList.contains('children')) {
         if (next.style.display === "none" || next.style.display === "") {
-            next.style.display = "block";
-            element.classList.add('open');
             localStorage.setItem("folder_" + element.getAttribute("data-folder"), "expanded");
+            if (next.hasAttribute("data-lazy")) {
+                loadFolderChildren(element, next).then(function(container) {
+                    expandFolder(element, container);
+                    restoreExpandedFolders(container);
+                }, function() {});
+            } else {
+                expandFolder(element, next);
+            }
         } else {
             next.style.display = "none";
             element.classList.remove('open');
@@ -27,19 +74,36 @@ function playSelectionSound() {
     }
 }
 
-// Восстанавливаем состояние раскрытых папок при загрузке страницы
-document.addEventListener("DOMContentLoaded", function() {
-    var folders = document.querySelectorAll(".folder");
+// Восстанавливает раскрытые папки внутри root. Для "ленивых" папок содержимое
+// запрашивается только у тех, что были раскрыты, и восстановление продолжается внутри них.
+function restoreExpandedFolders(root) {
+    var folders = root.querySelectorAll(".folder");
     folders.forEach(function(folder) {
         var folderId = folder.getAttribute("data-folder");
         var state = localStorage.getItem("folder_" + folderId);
-        if (state === "expanded") {
-            var headerDiv = folder.parentElement;
-            var next = headerDiv.nextElementSibling;
-            if (next && next.classList.contains('children')) {
-                next.style.display = "block";
-                folder.classList.add('open');
-            }
+        if (state !== "expanded") {
+            return;
+        }
+        var headerDiv = folder.parentElement;
+        var next = headerDiv.nextElementSibling;
+        if (!next || !next.classList.contains('children') || next.style.display === "block") {
+            return;
+        }
+        if (next.hasAttribute("data-lazy")) {
+            loadFolderChildren(folder, next).then(function(container) {
+                expandFolder(folder, container);
+                restoreExpandedFolders(container);
+            }, function() {});
+        } else {
+            expandFolder(folder, next);
         }
     });
-});
\ No newline at end of file
+}
+
+// Восстанавливаем состояние раскрытых папок при загрузке страницы
+document.addEventListener("DOMContentLoaded", function() {
+    var fileTree = document.getElementById("file-tree");
+    if (fileTree) {
+        restoreExpandedFolders(fileTree);
+    }
+});
@@ -1,57 +1,180 @@
 document.addEventListener("DOMContentLoaded", function(){
-    // Считываем исходный текст из скрытого элемента
-    var rawText = document.getElementById("fileContent").textContent;
+    var contentDiv = document.getElementById("content");
+    // Фрагменты содержимого, подготовленные сервером (main/file_content.py, tokenize_content):
+    // строка — обычный текст, {"img": url} — изображение
+    var chunks = JSON.parse(document.getElementById("fileContent").textContent);
+    // Адрес потоковой выдачи задан только для больших файлов
+    var streamUrl = contentDiv.getAttribute("data-stream-url");
+    var fileSize = parseInt(contentDiv.getAttribute("data-size") || "0", 10);
+    // Сколько байт запрашивать за раз и при каком остатке текста запрашивать следующую часть
+    var STREAM_CHUNK = 64 * 1024;
+    var LOW_WATER = 2048;
+    // Скорость печати прежняя — символ за 5 мс, но весь файл печатается не дольше MAX_TYPING_MS
+    var MS_PER_CHAR = 5;
+    var MAX_TYPING_MS = 15000;
+    // Текст печатается в текстовые узлы; новый узел начинается после TEXT_NODE_LIMIT символов
+    var TEXT_NODE_LIMIT = 4096;
+    // Используем кешированное воспроизведение звука (функция getCachedSound должна быть определена в sound_cache.js)
+    var typingSoundUrl = TYPING_SOUND_URL;
+
+    function queuedLength(from, offset) {
+        var length = 0;
+        for (var i = from; i < chunks.length; i++) {
+            length += typeof chunks[i] === "string" ? chunks[i].length : 1;
+        }
+        return length - offset;
+    }
+
+    var total = streamUrl ? fileSize : queuedLength(0, 0);
+    var charsPerMs = Math.max(1 / MS_PER_CHAR, total / MAX_TYPING_MS);
+
+    // ---------- Потоковый режим ----------
+    // Части файла приходят сырыми байтами, поэтому здесь повторяется разбор
+    // tokenize_content: \uXXXX, \n и ссылки на изображения
+    var IMAGE_URL_RE = /(https?:\/\/\S+\.(?:jpg|jpeg|png|gif)(?:\?\S+)?)(?=[\s'"<>]|$)/gi;
 
-    // Функция для декодирования Unicode-escape последовательностей
-    function decodeUnicode(str) {
-        return str.replace(/\\u([\d\w]{4})/gi, function(match, grp) {
+    function tokenizeText(text) {
+        text = text.replace(/\\u([0-9a-f]{4})/gi, function(match, grp) {
             return String.fromCharCode(parseInt(grp, 16));
-        });
+        }).replace(/\\n/g, "\n");
+        var result = [];
+        var pos = 0;
+        var match;
+        IMAGE_URL_RE.lastIndex = 0;
+        while ((match = IMAGE_URL_RE.exec(text)) !== null) {
+            if (match.index > pos) {
+                result.push(text.substring(pos, match.index));
+            }
+            result.push({ img: match[1] });
+            pos = match.index + match[0].length;
+        }
+        if (pos < text.length) {
+            result.push(text.substring(pos));
+        }
+        return result;
     }
-    var decodedText = decodeUnicode(rawText);
-    // Заменяем остаточные "\n" на реальные переносы строк
-    decodedText = decodedText.replace(/\\n/g, "\n");
-
-    // Обработка ссылок на изображения: ищем URL, заканчивающиеся на jpg, jpeg, png или gif (с необязательными параметрами)
-    var processedText = decodedText.replace(/(https?:\/\/\S+\.(?:jpg|jpeg|png|gif)(?:\?\S+)?)(?=[\s'"<>]|$)/gi, function(match) {
-        // Заменяем амперсанды на &amp; для корректного HTML
-        var safeUrl = match.replace(/&/g, "&amp;");
-        return '<img src="' + safeUrl + '" alt="Image" style="max-width:100%; margin:5px 0;">';
-    });
-    decodedText = processedText;
 
-    var contentDiv = document.getElementById("content");
-    var index = 0;
-    // Используем кешированное воспроизведение звука (функция getCachedSound должна быть определена в sound_cache.js)
-    var typingSoundUrl = TYPING_SOUND_URL;
+    var nextOffset = 0;
+    var pending = null;
+    var finished = !streamUrl;
+    var decoder = streamUrl ? new TextDecoder("utf-8") : null;
+    // Хвост после последнего пробельного символа: ссылка или escape-последовательность
+    // могут оказаться разрезаны границей части, поэтому он разбирается вместе со следующей частью
+    var carry = "";
+
+    // Запрашивает следующую часть файла заголовком Range и добавляет её фрагменты в очередь
+    function fetchNext() {
+        if (pending || finished) {
+            return;
+        }
+        var end = Math.min(nextOffset + STREAM_CHUNK, fileSize) - 1;
+        pending = fetch(streamUrl, {
+            credentials: "same-origin",
+            headers: { "Range": "bytes=" + nextOffset + "-" + end }
+        })
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error("HTTP " + response.status);
+                }
+                return response.arrayBuffer();
+            })
+            .then(function(buffer) {
+                nextOffset = end + 1;
+                finished = nextOffset >= fileSize || buffer.byteLength === 0;
+                var text = carry + decoder.decode(new Uint8Array(buffer), { stream: !finished });
+                var cut = finished ? text.length : Math.max(text.search(/\s\S*$/) + 1, 0);
+                carry = text.substring(cut);
+                enqueue(tokenizeText(text.substring(0, cut)));
+                pending = null;
+            })
+            .catch(function(error) {
+                enqueue([carry + "\nОшибка при загрузке файла: " + error.message]);
+                carry = "";
+                finished = true;
+                pending = null;
+            });
+    }
+
+    // ---------- Печать ----------
+    var chunkIndex = 0;   // текущий фрагмент
+    var offset = 0;       // сколько символов текущего фрагмента уже выведено
+    var textNode = null;  // текстовый узел, в который дописывается текст
+    var typed = 0;
+    var budget = 0;
+    var lastTime = null;
+
+    // Добавляет фрагменты в очередь, отбрасывая уже выведенные, чтобы очередь не росла вместе с файлом
+    function enqueue(newChunks) {
+        chunks = chunks.slice(chunkIndex).concat(newChunks);
+        chunkIndex = 0;
+    }
+
+    function appendText(text) {
+        if (!textNode || textNode.length >= TEXT_NODE_LIMIT) {
+            textNode = document.createTextNode("");
+            contentDiv.appendChild(textNode);
+        }
+        textNode.appendData(text);
+    }
 
-    // Функция, которая "печатает" содержимое с поддержкой HTML-тегов:
-    // Если встречается символ '<', ищем закрывающую '>' и выводим тег целиком.
-    function typeLetter() {
-        if (index < decodedText.length) {
-            if (decodedText[index] === '<') {
-                var closeIndex = decodedText.indexOf('>', index);
-                if (closeIndex === -1) {
-                    contentDiv.innerHTML += decodedText.substring(index);
-                    index = decodedText.length;
-                } else {
-                    var tag = decodedText.substring(index, closeIndex + 1);
-                    contentDiv.innerHTML += tag;
-                    index = closeIndex + 1;
+    function appendImage(url) {
+        var img = document.createElement("img");
+        img.src = url;
+        img.alt = "Image";
+        img.style.maxWidth = "100%";
+        img.style.margin = "5px 0";
+        contentDiv.appendChild(img);
+        textNode = null;
+    }
+
+    // Выводит за кадр столько символов, сколько положено по прошедшему времени
+    function step(now) {
+        if (lastTime === null) {
+            lastTime = now;
+        }
+        budget += (now - lastTime) * charsPerMs;
+        lastTime = now;
+        var count = Math.floor(budget);
+        budget -= count;
+        var typedBefore = typed;
+        while (count > 0 && chunkIndex < chunks.length) {
+            var chunk = chunks[chunkIndex];
+            if (typeof chunk === "string") {
+                var part = chunk.substring(offset, offset + count);
+                appendText(part);
+                offset += part.length;
+                count -= part.length;
+                typed += part.length;
+                if (offset >= chunk.length) {
+                    chunkIndex++;
+                    offset = 0;
                 }
             } else {
-                contentDiv.innerHTML += decodedText.charAt(index);
-                index++;
-            }
-            // Check if sound is enabled before playing
-            if (index % 9 === 0 && localStorage.getItem("soundEnabled") === "true") {
-                var clone = getCachedSound(typingSoundUrl);
-                clone.play();
+                appendImage(chunk.img);
+                chunkIndex++;
+                count--;
+                typed++;
             }
-            setTimeout(typeLetter, 5);
+        }
+        if (chunkIndex >= chunks.length) {
+            // Очередь пуста: бюджет не копим, пока ждём следующую часть файла
+            budget = 0;
+        }
+        // Звук — не чаще раза за кадр, как и раньше примерно на каждый девятый символ
+        if (Math.floor(typed / 9) > Math.floor(typedBefore / 9) && localStorage.getItem("soundEnabled") === "true") {
+            var clone = getCachedSound(typingSoundUrl);
+            clone.play();
+        }
+        if (!finished && queuedLength(chunkIndex, offset) < LOW_WATER) {
+            fetchNext();
+        }
+        if (chunkIndex < chunks.length || !finished) {
+            requestAnimationFrame(step);
         } else {
-            contentDiv.innerHTML += '<span class="blinking-cursor"></span>';
+            var cursor = document.createElement("span");
+            cursor.className = "blinking-cursor";
+            contentDiv.appendChild(cursor);
         }
     }
-    typeLetter();
-});
\ No newline at end of file
+    requestAnimationFrame(step);
+});
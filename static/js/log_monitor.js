@@ -0,0 +1,40 @@
+// Наблюдение за журналом: последние события загружаются один раз,
+// дальше новые запрашиваются начиная с полученного курсора. Сервер отвечает
+// сразу, а после пустого ответа страница ждёт data-poll-delay мс
+// (LOG_TAIL_POLL_EVERY; 0 — при LOG_TAIL_WAIT сервер сам ждёт событий)
+document.addEventListener("DOMContentLoaded", function() {
+    var container = document.getElementById("log-events");
+    var tailUrl = container.getAttribute("data-tail-url");
+    // Сколько строк держать на странице
+    var MAX_LINES = 1000;
+    // Пауза перед следующим запросом после пустого ответа и после ошибки (мс)
+    var IDLE_DELAY = parseInt(container.getAttribute("data-poll-delay"), 10) || 0;
+    var ERROR_DELAY = 10000;
+
+    function appendEvent(text) {
+        var atBottom = container.scrollTop + container.clientHeight >= container.scrollHeight - 5;
+        container.appendChild(document.createTextNode(text + "\n"));
+        while (container.childNodes.length > MAX_LINES) {
+            container.removeChild(container.firstChild);
+        }
+        if (atBottom) {
+            container.scrollTop = container.scrollHeight;
+        }
+    }
+
+    function poll(cursor) {
+        var url = cursor === undefined ? tailUrl : tailUrl + "?cursor=" + cursor;
+        fetch(url, { credentials: "same-origin" })
+            .then(function(response) { return response.json(); })
+            .then(function(data) {
+                data.events.forEach(appendEvent);
+                setTimeout(function() { poll(data.cursor); }, data.events.length ? 0 : IDLE_DELAY);
+            })
+            .catch(function(error) {
+                console.error("Ошибка загрузки журнала:", error);
+                setTimeout(function() { poll(cursor); }, ERROR_DELAY);
+            });
+    }
+
+    poll();
+});
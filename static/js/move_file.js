@@ -26,7 +26,7 @@ if (window.moveFileHandlersInitialized) {
         e.stopPropagation();
         // Если уже выбран файл, игнорируем повторное нажатие
         if (fileToMove) return;
-        fileToMove = this.getAttribute('data-file-path');
+        fileToMove = this.getAttribute('data-file-node');
         console.log("Файл для перемещения выбран:", fileToMove);
         // Показываем все кнопки-приёмники у папок
         var destButtons = document.querySelectorAll('.move-dest-btn');
@@ -43,7 +43,7 @@ if (window.moveFileHandlersInitialized) {
     function handleMoveDestClick(e) {
         e.preventDefault();
         e.stopPropagation();
-        var destFolder = this.getAttribute('data-folder-path');
+        var destFolder = this.getAttribute('data-folder-node');
         if (!fileToMove) {
             alert("Сначала выберите файл для перемещения!");
             return;
@@ -55,7 +55,7 @@ if (window.moveFileHandlersInitialized) {
                 "Content-Type": "application/json",
                 "X-CSRFToken": getCookie("csrftoken")
             },
-            body: JSON.stringify({ file: fileToMove, folder: destFolder })
+            body: JSON.stringify({ file_node: fileToMove, folder_node: destFolder })
         })
         .then(function(response) { return response.json(); })
         .then(function(data) {